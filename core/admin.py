@@ -1,5 +1,8 @@
-from django.contrib import admin
-from .models import Destino, Tour, SalidaTour, Reserva, Ticket, Resena, Pago, Galeria, UserProfile
+from django.contrib import admin, messages
+from django.db import transaction
+
+from . import cupos, tareas
+from .models import Destino, Tour, SalidaTour, MovimientoCupo, Reserva, Ticket, Resena, Pago, CorreoPendiente, Tarea, WebhookEvent, Galeria, UserProfile
 
 
 @admin.register(Destino)
@@ -16,6 +19,59 @@ class TourAdmin(admin.ModelAdmin):
 class SalidaTourAdmin(admin.ModelAdmin):
     list_display = ("tour", "fecha", "cupo_maximo")
 
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # Igual que editar_salida: los cupos van por el libro (cupos.ajustar) y el
+        # resto se guarda sin reescribir cupos_disponibles encima de compras concurrentes
+        with transaction.atomic():
+            if "cupos_disponibles" in form.changed_data:
+                cupos.ajustar(obj.id, obj.cupos_disponibles, motivo=f"Admin: {request.user.username}")
+            campos = [campo for campo in form.changed_data if campo != "cupos_disponibles"]
+            if campos:
+                obj.save(update_fields=campos)
+
+
+@admin.register(MovimientoCupo)
+class MovimientoCupoAdmin(admin.ModelAdmin):
+    list_display = ("id", "salida", "reserva", "tipo", "delta", "motivo", "creado_en")
+    list_filter = ("tipo",)
+
+
+@admin.register(CorreoPendiente)
+class CorreoPendienteAdmin(admin.ModelAdmin):
+    list_display = ("id", "asunto", "estado", "intentos", "proximo_intento", "enviado_en")
+    list_filter = ("estado",)
+
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ("id", "funcion", "estado", "intentos", "proximo_intento", "terminado_en")
+    list_filter = ("estado", "funcion")
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "proveedor", "tipo", "event_id", "estado", "resultado", "intentos", "duplicados", "duracion_ms", "recibido_en")
+    list_filter = ("proveedor", "estado", "tipo")
+    search_fields = ("event_id",)
+    actions = ("reprocesar",)
+
+    @admin.action(description="Reprocesar eventos seleccionados")
+    def reprocesar(self, request, queryset):
+        fallidos = 0
+        for evento in queryset:
+            evento.estado = "recibido"
+            evento.save(update_fields=["estado"])
+            try:
+                tareas.encolar("core.views.procesar_webhook", evento_id=evento.id)
+            except Exception:
+                # Sin worker se procesa en el momento; el detalle queda en el evento
+                fallidos += 1
+        self.message_user(request, f"{queryset.count()} eventos encolados.")
+        if fallidos:
+            self.message_user(request, f"{fallidos} eventos volvieron a fallar.", level=messages.ERROR)
+
 
 @admin.register(Reserva)
 class ReservaAdmin(admin.ModelAdmin):
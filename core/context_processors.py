@@ -1,5 +1,12 @@
 from django.conf import settings
 
+from . import roles
+
 
 def whatsapp_number(request):
     return {"WHATSAPP_NUMBER": getattr(settings, "WHATSAPP_NUMBER", "")}
+
+
+def roles_usuario(request):
+    user = getattr(request, "user", None)
+    return {"user_es_secretaria": bool(user) and roles.tiene_grupo(user, "secretaria")}
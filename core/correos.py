@@ -0,0 +1,134 @@
+"""Envio de correos a traves de la bandeja CorreoPendiente.
+
+Las vistas y webhooks solo insertan una fila con encolar(); el comando
+enviar_correos abre una conexion SMTP con get_connection() y manda los
+pendientes por lotes, reintentando con espera exponencial los que fallan.
+Requiere el proceso "manage.py enviar_correos --continuo" (o el comando desde
+cron). Con settings.CORREOS_EN_COLA = False se envian en el momento (desarrollo).
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import CorreoPendiente, EmpresaConfig
+from . import tickets
+
+logger = logging.getLogger(__name__)
+
+# Tiempo que un lote queda reservado para un worker antes de poder retomarse
+RESERVA_LOTE = timedelta(minutes=10)
+
+
+def encolar(asunto, para, texto="", html="", bcc=None, reserva=None, adjuntar_ticket=False, remitente=""):
+    """Guarda el correo para el worker; devuelve la fila o None si no hay destinatarios."""
+    para = [d for d in para if d]
+    if not para:
+        return None
+    correo = CorreoPendiente.objects.create(
+        asunto=asunto[:255],
+        texto=texto,
+        html=html,
+        remitente=remitente,
+        para=para,
+        bcc=[d for d in bcc or [] if d],
+        reserva=reserva,
+        adjuntar_ticket=adjuntar_ticket,
+    )
+    if not getattr(settings, "CORREOS_EN_COLA", True):
+        enviar([correo])
+    return correo
+
+
+def _mensaje(correo, connection, empresa):
+    mensaje = EmailMultiAlternatives(
+        subject=correo.asunto,
+        body=correo.texto or strip_tags(correo.html),
+        from_email=correo.remitente or settings.DEFAULT_FROM_EMAIL,
+        to=correo.para,
+        bcc=correo.bcc,
+        connection=connection,
+    )
+    if correo.html:
+        mensaje.attach_alternative(correo.html, "text/html")
+    if correo.adjuntar_ticket and correo.reserva is not None:
+        pdf = tickets.ticket_pdf(correo.reserva, empresa)
+        mensaje.attach(f"Ticket_TortugaTur_{correo.reserva_id}.pdf", pdf, "application/pdf")
+    return mensaje
+
+
+def _espera(intentos):
+    base = getattr(settings, "CORREOS_REINTENTO_SEGUNDOS", 60)
+    return timedelta(seconds=min(base * 2 ** (intentos - 1), 6 * 3600))
+
+
+def _fallo(correo, error, ahora):
+    correo.intentos += 1
+    correo.ultimo_error = str(error)[:2000]
+    if correo.intentos >= getattr(settings, "CORREOS_MAX_INTENTOS", 6):
+        correo.estado = "fallido"
+    else:
+        correo.estado = "pendiente"
+        correo.proximo_intento = ahora + _espera(correo.intentos)
+    correo.save(update_fields=["intentos", "ultimo_error", "estado", "proximo_intento"])
+
+
+def enviar(correos):
+    """Manda los correos dados por una sola conexion SMTP; devuelve (enviados, fallidos)."""
+    if not correos:
+        return 0, 0
+    empresa = EmpresaConfig.objects.filter(id=1).first()
+    enviados = fallidos = 0
+    ahora = timezone.now()
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning("No se pudo abrir la conexion de correo: %s", e)
+        for correo in correos:
+            _fallo(correo, e, ahora)
+        return 0, len(correos)
+    try:
+        for correo in correos:
+            try:
+                _mensaje(correo, connection, empresa).send()
+            except Exception as e:
+                logger.warning("Fallo el correo %s: %s", correo.id, e)
+                _fallo(correo, e, ahora)
+                fallidos += 1
+                continue
+            correo.estado = "enviado"
+            correo.enviado_en = timezone.now()
+            correo.ultimo_error = ""
+            correo.save(update_fields=["estado", "enviado_en", "ultimo_error"])
+            enviados += 1
+    finally:
+        connection.close()
+    return enviados, fallidos
+
+
+def tomar_lote(lote=50, ahora=None):
+    """Reserva hasta `lote` correos vencidos para este worker.
+
+    Tambien retoma los que quedaron en "enviando" de un worker que se cayo.
+    """
+    ahora = ahora or timezone.now()
+    vencidos = CorreoPendiente.objects.filter(
+        Q(estado="pendiente") | Q(estado="enviando"), proximo_intento__lte=ahora
+    )
+    ids = list(vencidos.order_by("proximo_intento", "id").values_list("id", flat=True)[:lote])
+    # El UPDATE condicional evita que dos workers tomen el mismo correo
+    vencidos.filter(id__in=ids).update(estado="enviando", proximo_intento=ahora + RESERVA_LOTE)
+    return list(
+        CorreoPendiente.objects.filter(id__in=ids, estado="enviando", proximo_intento=ahora + RESERVA_LOTE)
+        .select_related("reserva__salida__tour__destino")
+        .order_by("id")
+    )
+
+
+def enviar_pendientes(lote=50, ahora=None):
+    return enviar(tomar_lote(lote, ahora))
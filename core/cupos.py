@@ -0,0 +1,142 @@
+"""Asignacion de cupos por salida.
+
+Cada cambio de capacidad es un UPDATE condicional con F()
+(``... WHERE cupos_disponibles >= n``) en vez de leer, restar y guardar, asi
+que dos compras de la misma salida no se bloquean entre si ni pueden vender
+mas cupos de los que hay. Cada cambio deja ademas una fila en MovimientoCupo
+para poder auditar y reconstruir el saldo.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import SalidaTour, DisponibilidadSalida, MovimientoCupo, Reserva
+
+
+class CuposInsuficientes(ValueError):
+    pass
+
+
+def _aplicar(salida_id, delta, tipo, reserva=None, motivo=""):
+    filas = SalidaTour.objects.filter(id=salida_id)
+    if delta < 0:
+        filas = filas.filter(cupos_disponibles__gte=-delta)
+    with transaction.atomic():
+        if not filas.update(cupos_disponibles=F("cupos_disponibles") + delta):
+            raise CuposInsuficientes("No hay cupos suficientes para esta salida.")
+        DisponibilidadSalida.objects.filter(salida_id=salida_id).update(
+            cupos_disponibles=F("cupos_disponibles") + delta
+        )
+        return MovimientoCupo.objects.create(
+            salida_id=salida_id,
+            reserva=reserva,
+            tipo=tipo,
+            delta=delta,
+            motivo=motivo[:120],
+        )
+
+
+def retener(salida_id, cantidad, reserva=None, motivo=""):
+    """Descuenta `cantidad` cupos o lanza CuposInsuficientes sin tocar nada."""
+    if cantidad <= 0:
+        return None
+    return _aplicar(salida_id, -cantidad, "retencion", reserva, motivo)
+
+
+def liberar(salida_id, cantidad, reserva=None, motivo=""):
+    if cantidad <= 0:
+        return None
+    return _aplicar(salida_id, cantidad, "liberacion", reserva, motivo)
+
+
+def cupos_de_reserva(reserva):
+    """Cupos que la reserva tiene retenidos segun el libro."""
+    total = MovimientoCupo.objects.filter(reserva=reserva).aggregate(total=Sum("delta"))["total"] or 0
+    return max(-total, 0)
+
+
+def retener_reserva(reserva, motivo=""):
+    """Retiene los cupos que le falten a la reserva; devuelve cuantos se retuvieron.
+
+    Llamar con la reserva bloqueada (select_for_update) para que dos
+    confirmaciones de la misma reserva no retengan dos veces.
+    """
+    faltantes = reserva.adultos + reserva.ninos - cupos_de_reserva(reserva)
+    if faltantes > 0:
+        retener(reserva.salida_id, faltantes, reserva=reserva, motivo=motivo)
+    return max(faltantes, 0)
+
+
+def liberar_reserva(reserva, motivo=""):
+    """Devuelve a la salida todos los cupos retenidos por la reserva."""
+    retenidos = cupos_de_reserva(reserva)
+    if retenidos:
+        liberar(reserva.salida_id, retenidos, reserva=reserva, motivo=motivo)
+    return retenidos
+
+
+def retener_temporal(reserva, minutos=None):
+    """Retiene los cupos de una reserva pendiente hasta que pague o venza el plazo.
+
+    Si la reserva ya tiene sus cupos no se renueva el plazo.
+    """
+    if cupos_de_reserva(reserva) >= reserva.adultos + reserva.ninos:
+        return reserva.retencion_hasta
+    minutos = minutos if minutos is not None else getattr(settings, "RESERVA_RETENCION_MINUTOS", 15)
+    retener_reserva(reserva, motivo="Retencion web")
+    reserva.retencion_hasta = timezone.now() + timedelta(minutes=minutos)
+    reserva.save(update_fields=["retencion_hasta"])
+    return reserva.retencion_hasta
+
+
+def liberar_retenciones_vencidas(ahora=None):
+    """Libera los cupos de las reservas pendientes cuyo plazo ya vencio.
+
+    Las reservas siguen pendientes; si pagan despues vuelven a pedir cupos.
+    """
+    ahora = ahora or timezone.now()
+    vencidas = Reserva.objects.filter(estado="pendiente", retencion_hasta__lt=ahora)
+    liberadas = 0
+    for reserva_id in list(vencidas.values_list("id", flat=True)):
+        with transaction.atomic():
+            # Se vuelve a filtrar con el bloqueo por si se pago mientras tanto
+            reserva = vencidas.select_for_update().filter(id=reserva_id).first()
+            if reserva is None:
+                continue
+            liberar_reserva(reserva, motivo="Retencion vencida")
+            reserva.retencion_hasta = None
+            reserva.save(update_fields=["retencion_hasta"])
+            liberadas += 1
+    return liberadas
+
+
+def ajustar(salida_id, cupos_nuevos, motivo="Ajuste manual"):
+    """Fija cupos_disponibles a un valor dado registrando la diferencia."""
+    with transaction.atomic():
+        actuales = SalidaTour.objects.select_for_update().values_list("cupos_disponibles", flat=True).get(id=salida_id)
+        delta = cupos_nuevos - actuales
+        if delta:
+            return _aplicar(salida_id, delta, "ajuste", motivo=motivo)
+    return None
+
+
+def corregir(salida_id, delta, motivo="Ajuste manual"):
+    """Suma `delta` cupos (positivo o negativo) registrandolo como ajuste.
+
+    A diferencia de ajustar() no pisa lo vendido despues de leer el valor;
+    lanza CuposInsuficientes si ya no quedan los cupos a quitar.
+    """
+    if not delta:
+        return None
+    return _aplicar(salida_id, delta, "ajuste", motivo=motivo)
+
+
+def saldo_libro(salida_ids=None):
+    """Dict salida_id -> suma de movimientos."""
+    movimientos = MovimientoCupo.objects.all()
+    if salida_ids is not None:
+        movimientos = movimientos.filter(salida_id__in=salida_ids)
+    return dict(movimientos.values("salida_id").annotate(total=Sum("delta")).values_list("salida_id", "total"))
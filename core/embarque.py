@@ -0,0 +1,111 @@
+"""Manifiesto y tickets de una salida (o de todas las de un dia) para los guias.
+
+Una sola consulta trae las reservas que embarcan con su salida, tour, destino
+y el proveedor del pago exitoso; con esas filas se arman el manifiesto y los
+tickets. EmpresaConfig se lee una vez por lote y los colores y estilos de
+ReportLab son constantes de core.utils.
+
+Dos formatos: un PDF unico (manifiesto y tickets en un documento, asi las
+fuentes van una sola vez) o un ZIP con el manifiesto y un PDF por reserva. En
+el ZIP los tickets son independientes y, si son muchos, el comando
+tickets_embarque los genera en un pool de procesos (TICKETS_LOTE_PROCESOS,
+TICKETS_LOTE_MIN_PARALELO); la vista del panel pasa procesos=1 para no levantar
+procesos dentro de un worker web. Pasan por la cache de tickets.ticket_pdf, que
+queda lista para ver_ticket_pdf.
+"""
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+
+from . import procesos_tickets, tickets
+from .models import Pago, Reserva, SalidaTour
+from .utils import generar_tickets_embarque_pdf
+
+ESTADOS_EMBARQUE = ("pagada", "confirmada", "bloqueada_por_agencia")
+FORMATOS = ("pdf", "zip")
+
+
+def lote(salida_id=None, fecha=None):
+    """[(salida, [reservas])] ordenado por hora de salida; las reservas, por apellido.
+
+    Con `salida_id` la salida aparece aunque no tenga pasajeros (manifiesto
+    vacio); con `fecha` solo las salidas con alguien que embarca.
+    """
+    pagos_exitosos = Pago.objects.filter(reserva=OuterRef("pk"), estado="paid").order_by("-creado_en")
+    reservas = (
+        Reserva.objects.filter(estado__in=ESTADOS_EMBARQUE)
+        .select_related("salida__tour__destino")
+        .annotate(proveedor_pago_codigo=Subquery(pagos_exitosos.values("proveedor")[:1]))
+        .order_by("salida__fecha", "salida__hora", "salida_id", "apellidos", "nombre", "id")
+    )
+    if salida_id is not None:
+        reservas = reservas.filter(salida_id=salida_id)
+    else:
+        reservas = reservas.filter(salida__fecha=fecha)
+
+    nombres_proveedor = dict(Pago.PROVEEDORES)
+    grupos = []
+    for _, filas in groupby(reservas, key=lambda r: r.salida_id):
+        filas = list(filas)
+        for reserva in filas:
+            reserva.proveedor_pago = nombres_proveedor.get(reserva.proveedor_pago_codigo)
+        grupos.append((filas[0].salida, filas))
+    if not grupos and salida_id is not None:
+        salida = SalidaTour.objects.select_related("tour__destino").filter(id=salida_id).first()
+        if salida is not None:
+            grupos.append((salida, []))
+    return grupos
+
+
+def nombre_archivo(formato, salida_id=None, fecha=None):
+    sufijo = f"salida_{salida_id}" if salida_id is not None else f"dia_{fecha.strftime('%Y%m%d')}"
+    return f"embarque_{sufijo}.{formato}"
+
+
+def pdf(grupos, empresa=None):
+    return generar_tickets_embarque_pdf(grupos, empresa).getvalue()
+
+
+def _procesos(cantidad, procesos=None):
+    if procesos is None:
+        procesos = getattr(settings, "TICKETS_LOTE_PROCESOS", 0) or os.cpu_count() or 1
+    if cantidad < getattr(settings, "TICKETS_LOTE_MIN_PARALELO", 50):
+        return 1
+    return max(min(procesos, cantidad), 1)
+
+
+def _tickets(reservas, empresa, procesos):
+    tareas = [(reserva, tickets.huella(reserva, empresa)) for reserva in reservas]
+    if procesos <= 1:
+        return [tickets.ticket_pdf(reserva, empresa, clave=clave) for reserva, clave in tareas]
+    # spawn: los hijos no heredan conexiones abiertas ni hilos del servidor. Solo
+    # reciben valores primitivos (ver core.procesos_tickets)
+    tareas = [(procesos_tickets.datos_reserva(reserva), clave) for reserva, clave in tareas]
+    iniciar = (
+        None if empresa is None else procesos_tickets.campos(empresa),
+        str(getattr(settings, "TICKET_PDF_CACHE_DIR", "") or ""),
+    )
+    with ProcessPoolExecutor(
+        max_workers=procesos, mp_context=get_context("spawn"),
+        initializer=procesos_tickets.iniciar, initargs=iniciar,
+    ) as pool:
+        return list(pool.map(procesos_tickets.ticket, tareas, chunksize=max(len(tareas) // (procesos * 4), 1)))
+
+
+def zip_tickets(grupos, empresa=None, procesos=None):
+    """ZIP con manifiesto.pdf y salida_<id>/ticket_<reserva>.pdf."""
+    reservas = [reserva for _, filas in grupos for reserva in filas]
+    contenidos = _tickets(reservas, empresa, _procesos(len(reservas), procesos))
+    buffer = io.BytesIO()
+    # Los PDF ya van comprimidos por dentro
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archivo:
+        archivo.writestr("manifiesto.pdf", generar_tickets_embarque_pdf(grupos, empresa, con_tickets=False).getvalue())
+        for reserva, contenido in zip(reservas, contenidos):
+            archivo.writestr(f"salida_{reserva.salida_id}/ticket_{reserva.id:06d}.pdf", contenido)
+    return buffer.getvalue()
@@ -0,0 +1,309 @@
+"""Exporte de reservas y pagos para contabilidad, en CSV o XLSX y en streaming.
+
+Las filas salen de una sola consulta values_list(...).iterator(chunk_size):
+tour, destino, salida, secretaria y el pago exitoso vienen en el mismo SELECT,
+sin instanciar modelos, asi que la memoria no crece con el rango pedido. La
+vista (exportar_reservas) y el comando exportar_reservas comparten todo esto.
+
+El XLSX se arma a mano: un SpreadsheetML minimo con celdas inline dentro de un
+zip escrito en streaming. openpyxl necesita un archivo buscable para guardar y
+no esta entre las dependencias.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db.models import Exists, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Pago, Reserva
+
+TIPOS = ("reservas", "pagos")
+FORMATOS = ("csv", "xlsx")
+CHUNK_SIZE = 2000
+FILAS_POR_BLOQUE = 500
+# Limite de filas de una hoja de Excel (incluye el encabezado)
+MAX_FILAS_XLSX = 1048576
+
+# (encabezado, campo de values_list)
+COLUMNAS = {
+    "reservas": (
+        ("id", "id"),
+        ("fecha_reserva", "fecha_reserva"),
+        ("estado", "estado"),
+        ("destino", "salida__tour__destino__nombre"),
+        ("tour", "salida__tour__nombre"),
+        ("fecha_salida", "salida__fecha"),
+        ("hora_salida", "salida__hora"),
+        ("adultos", "adultos"),
+        ("ninos", "ninos"),
+        ("total", "total_pagar"),
+        ("nombre", "nombre"),
+        ("apellidos", "apellidos"),
+        ("identificacion", "identificacion"),
+        ("correo", "correo"),
+        ("telefono", "telefono"),
+        ("codigo_agencia", "codigo_agencia"),
+        ("creado_por", "creado_por__username"),
+        ("proveedor_pago", "pago_proveedor"),
+        ("monto_pagado", "pago_monto"),
+        ("id_externo_pago", "pago_external_id"),
+        ("fecha_pago", "pago_creado_en"),
+    ),
+    "pagos": (
+        ("id", "id"),
+        ("fecha", "creado_en"),
+        ("estado", "estado"),
+        ("proveedor", "proveedor"),
+        ("moneda", "moneda"),
+        ("monto", "monto"),
+        ("id_externo", "external_id"),
+        ("reserva", "reserva_id"),
+        ("estado_reserva", "reserva__estado"),
+        ("cliente", "reserva__nombre"),
+        ("apellidos", "reserva__apellidos"),
+        ("destino", "reserva__salida__tour__destino__nombre"),
+        ("tour", "reserva__salida__tour__nombre"),
+        ("fecha_salida", "reserva__salida__fecha"),
+        ("hora_salida", "reserva__salida__hora"),
+        ("creado_por", "reserva__creado_por__username"),
+    ),
+}
+
+
+def _fecha(valor, nombre):
+    valor = (valor or "").strip()
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"Fecha invalida en '{nombre}': {valor!r} (se espera AAAA-MM-DD).")
+
+
+def leer_filtros(datos):
+    """Valida los filtros de un QueryDict o de las opciones del comando.
+
+    Devuelve un dict con tipo, formato, desde, hasta, estado, proveedor y
+    secretaria; lanza ValueError con un mensaje para el usuario.
+    """
+    tipo = (datos.get("tipo") or "reservas").strip()
+    formato = (datos.get("formato") or "csv").strip().lower()
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de exporte invalido: {tipo!r}.")
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato invalido: {formato!r}.")
+    desde = _fecha(datos.get("desde"), "desde")
+    hasta = _fecha(datos.get("hasta"), "hasta")
+    if desde and hasta and hasta < desde:
+        raise ValueError("La fecha 'hasta' es anterior a 'desde'.")
+
+    estado = (datos.get("estado") or "").strip() or None
+    estados = Reserva.ESTADOS if tipo == "reservas" else Pago.ESTADOS
+    if estado and estado not in dict(estados):
+        raise ValueError(f"Estado invalido para {tipo}: {estado!r}.")
+    proveedor = (datos.get("proveedor") or "").strip() or None
+    if proveedor and proveedor not in dict(Pago.PROVEEDORES):
+        raise ValueError(f"Proveedor invalido: {proveedor!r}.")
+    secretaria = (str(datos.get("secretaria") or "")).strip() or None
+    return {
+        "tipo": tipo, "formato": formato, "desde": desde, "hasta": hasta,
+        "estado": estado, "proveedor": proveedor, "secretaria": secretaria,
+    }
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def consulta(tipo, desde=None, hasta=None, estado=None, proveedor=None, secretaria=None, **_):
+    """values_list ordenada por id con las columnas de COLUMNAS[tipo].
+
+    El rango es por fecha de la reserva (o del pago) en hora local, con ambos
+    extremos incluidos; secretaria acepta el id o el username de quien la creo.
+    """
+    if tipo == "reservas":
+        pagos_exitosos = Pago.objects.filter(reserva=OuterRef("pk"), estado="paid").order_by("-creado_en")
+        filas = Reserva.objects.annotate(
+            pago_proveedor=Subquery(pagos_exitosos.values("proveedor")[:1]),
+            pago_monto=Subquery(pagos_exitosos.values("monto")[:1]),
+            pago_external_id=Subquery(pagos_exitosos.values("external_id")[:1]),
+            pago_creado_en=Subquery(pagos_exitosos.values("creado_en")[:1]),
+        )
+        campo_fecha, prefijo = "fecha_reserva", ""
+        if proveedor:
+            filas = filas.filter(Exists(
+                Pago.objects.filter(reserva=OuterRef("pk"), estado="paid", proveedor=proveedor)
+            ))
+    else:
+        filas = Pago.objects.all()
+        campo_fecha, prefijo = "creado_en", "reserva__"
+        if proveedor:
+            filas = filas.filter(proveedor=proveedor)
+
+    if desde:
+        filas = filas.filter(**{f"{campo_fecha}__gte": _inicio_dia(desde)})
+    if hasta:
+        filas = filas.filter(**{f"{campo_fecha}__lt": _inicio_dia(hasta + timedelta(days=1))})
+    if estado:
+        filas = filas.filter(estado=estado)
+    if secretaria:
+        if secretaria.isdigit():
+            filas = filas.filter(**{f"{prefijo}creado_por_id": int(secretaria)})
+        else:
+            filas = filas.filter(**{f"{prefijo}creado_por__username": secretaria})
+    return filas.order_by("id").values_list(*(campo for _, campo in COLUMNAS[tipo]))
+
+
+def nombre_archivo(filtros):
+    partes = [filtros["tipo"]]
+    if filtros["desde"]:
+        partes.append(filtros["desde"].strftime("%Y%m%d"))
+    if filtros["hasta"]:
+        partes.append(filtros["hasta"].strftime("%Y%m%d"))
+    return f"{'_'.join(partes)}.{filtros['formato']}"
+
+
+def _texto(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, datetime):
+        if timezone.is_aware(valor):
+            valor = timezone.localtime(valor)
+        return valor.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(valor, time):
+        return valor.strftime("%H:%M")
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return str(valor)
+
+
+def filas_csv(encabezados, filas):
+    """Genera el CSV en bloques de texto; el BOM hace que Excel lo abra como UTF-8."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write("\ufeff")
+    escritor.writerow(encabezados)
+    for i, fila in enumerate(filas, 1):
+        escritor.writerow([_texto(v) for v in fila])
+        if i % FILAS_POR_BLOQUE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# Caracteres que XML 1.0 no admite ni escapados
+_NO_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{hoja}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+class _Sumidero:
+    """Destino sin tell()/seek(): zipfile escribe en streaming con descriptores de datos."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b"".join(self.partes)
+        self.partes.clear()
+        return datos
+
+
+def _celda(valor):
+    if isinstance(valor, bool) or valor is None:
+        valor = "" if valor is None else str(valor)
+    if isinstance(valor, (int, Decimal, float)):
+        return f"<c><v>{valor}</v></c>"
+    texto = escape(_NO_XML.sub("", _texto(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def filas_xlsx(encabezados, filas, hoja="Datos"):
+    """Genera un .xlsx de una hoja en bloques de bytes; numeros como numeros y el resto como texto."""
+    sumidero = _Sumidero()
+    with zipfile.ZipFile(sumidero, "w", compression=zipfile.ZIP_DEFLATED) as libro:
+        libro.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        libro.writestr("_rels/.rels", _RELS)
+        libro.writestr("xl/workbook.xml", _WORKBOOK.format(hoja=escape(hoja, {'"': "&quot;"})))
+        libro.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        yield sumidero.vaciar()
+        with libro.open("xl/worksheets/sheet1.xml", "w") as hoja_xml:
+            hoja_xml.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            bloque = ["<row>" + "".join(_celda(str(e)) for e in encabezados) + "</row>"]
+            for i, fila in enumerate(filas, 1):
+                bloque.append("<row>" + "".join(_celda(v) for v in fila) + "</row>")
+                if i % FILAS_POR_BLOQUE == 0:
+                    hoja_xml.write("".join(bloque).encode("utf-8"))
+                    bloque.clear()
+                    yield sumidero.vaciar()
+            bloque.append("</sheetData></worksheet>")
+            hoja_xml.write("".join(bloque).encode("utf-8"))
+    yield sumidero.vaciar()
+
+
+def generar(filtros, filas=None):
+    """Bloques (str para CSV, bytes para XLSX) del exporte descrito por `filtros`.
+
+    `filas` permite pasar una consulta ya atada a una base (p. ej. la replica).
+    El conteo para el limite de Excel se hace aqui, antes de empezar a escribir.
+    """
+    if filas is None:
+        filas = consulta(**filtros)
+    if filtros["formato"] == "xlsx" and filas.count() >= MAX_FILAS_XLSX:
+        raise ValueError(
+            f"El rango tiene mas de {MAX_FILAS_XLSX - 1} filas, el maximo de una hoja de Excel; exporte en CSV."
+        )
+    encabezados = [encabezado for encabezado, _ in COLUMNAS[filtros["tipo"]]]
+    filas = filas.iterator(chunk_size=CHUNK_SIZE)
+    if filtros["formato"] == "xlsx":
+        return filas_xlsx(encabezados, filas, hoja=filtros["tipo"].title())
+    return filas_csv(encabezados, filas)
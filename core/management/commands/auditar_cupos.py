@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.cupos import saldo_libro
+from core.models import SalidaTour, DisponibilidadSalida
+
+
+class Command(BaseCommand):
+    help = "Comparar cupos_disponibles de cada salida con el libro de movimientos y opcionalmente corregirlos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corregir", action="store_true", help="Reescribir cupos_disponibles con el saldo del libro")
+        parser.add_argument("--desde", default="", help="Solo salidas desde esta fecha (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        salidas = SalidaTour.objects.all()
+        if options["desde"]:
+            salidas = salidas.filter(fecha__gte=options["desde"])
+        actuales = dict(salidas.values_list("id", "cupos_disponibles"))
+        saldos = saldo_libro(list(actuales))
+
+        descuadres = {sid: saldos.get(sid, 0) for sid, cupos in actuales.items() if saldos.get(sid, 0) != cupos}
+        for sid, saldo in sorted(descuadres.items()):
+            self.stdout.write(f"  Salida {sid}: cupos_disponibles={actuales[sid]} libro={saldo}")
+
+        if descuadres and options["corregir"]:
+            with transaction.atomic():
+                for sid, saldo in descuadres.items():
+                    SalidaTour.objects.filter(id=sid).update(cupos_disponibles=max(saldo, 0))
+                    DisponibilidadSalida.objects.filter(salida_id=sid).update(cupos_disponibles=max(saldo, 0))
+            self.stdout.write(self.style.SUCCESS(f"Se corrigieron {len(descuadres)} salidas."))
+        elif descuadres:
+            self.stdout.write(self.style.WARNING(f"{len(descuadres)} de {len(actuales)} salidas no cuadran con el libro."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Las {len(actuales)} salidas cuadran con el libro."))
@@ -0,0 +1,88 @@
+import json
+import re
+import statistics
+import time as time_mod
+import tracemalloc
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.utils import generar_actividad_dia_pdf
+
+ESTADOS = ("pagada", "pendiente", "confirmada", "bloqueada_por_agencia")
+
+
+def _items(cantidad, fecha):
+    """Eventos sinteticos con la forma de los de _actividad_dia, generados al vuelo."""
+    inicio = timezone.make_aware(datetime.combine(fecha, time.max))
+    for i in range(cantidad):
+        dt = inicio - timedelta(seconds=i * 86400 // max(cantidad, 1) + 1)
+        if i % 20 == 0:
+            yield {
+                "tipo": "salida", "dt": dt, "id": i + 1, "titulo": f"Tour {i % 9}", "tour": f"Tour {i % 9}",
+                "estado": f"{i % 16}/16 cupos", "monto": None, "metodo_pago": "-", "usuario": "sistema",
+            }
+        else:
+            yield {
+                "tipo": "reserva", "dt": dt, "id": i + 1,
+                "titulo": f"Cliente {i} Apellido Bastante Largo Para Recortar",
+                "tour": f"Tour {i % 9} - Islas y bahias", "estado": ESTADOS[i % len(ESTADOS)],
+                "monto": Decimal(80 + (i % 5) * 70), "metodo_pago": "Efectivo",
+                "usuario": f"secretaria_{i % 7}",
+            }
+
+
+class Command(BaseCommand):
+    help = "Medir el tiempo, las paginas y la memoria del PDF de actividad diaria por cantidad de filas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filas", type=int, nargs="+", default=[1000, 5000, 20000])
+        parser.add_argument("--repeticiones", type=int, default=3)
+        parser.add_argument("--salida", default="", help="Escribir los resultados en este archivo JSON")
+        parser.add_argument("--pdf", default="", help="Guardar el PDF de la ultima medicion para revisarlo")
+
+    def handle(self, *args, **options):
+        fecha = timezone.localdate()
+        resultados = []
+        pdf = b""
+        for cantidad in options["filas"]:
+            resumen = {
+                "total_registros": cantidad,
+                "total_ventas": sum(
+                    (i["monto"] for i in _items(cantidad, fecha) if i["monto"] is not None), Decimal("0.00"),
+                ),
+            }
+            tiempos = []
+            for _ in range(options["repeticiones"]):
+                inicio = time_mod.perf_counter()
+                pdf = generar_actividad_dia_pdf("Benchmark", fecha, _items(cantidad, fecha), resumen).getvalue()
+                tiempos.append(time_mod.perf_counter() - inicio)
+            # La memoria se mide en una corrida aparte: tracemalloc multiplica el tiempo
+            tracemalloc.start()
+            generar_actividad_dia_pdf("Benchmark", fecha, _items(cantidad, fecha), resumen)
+            pico = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            mediana = statistics.median(tiempos)
+            resultado = {
+                "filas": cantidad,
+                "paginas": len(re.findall(rb"/Type /Page\b", pdf)),
+                "bytes": len(pdf),
+                "segundos_mediana": round(mediana, 4),
+                "ms_por_1000_filas": round(mediana * 1000 / cantidad * 1000, 2) if cantidad else 0.0,
+                "memoria_pico_mb": round(pico / 1e6, 2),
+            }
+            resultados.append(resultado)
+            self.stdout.write(
+                f"{cantidad:>7} filas  {resultado['paginas']:>5} pag  {mediana:>8.3f}s  "
+                f"{resultado['ms_por_1000_filas']:>8.1f} ms/1000 filas  pico {resultado['memoria_pico_mb']:.1f} MB"
+            )
+
+        if options["pdf"]:
+            with open(options["pdf"], "wb") as destino:
+                destino.write(pdf)
+        if options["salida"]:
+            with open(options["salida"], "w", encoding="utf-8") as destino:
+                json.dump({"repeticiones": options["repeticiones"], "resultados": resultados}, destino, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados escritos en {options['salida']}"))
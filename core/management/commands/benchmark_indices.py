@@ -0,0 +1,109 @@
+import statistics
+import time as time_mod
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from core.management.datos_prueba import base_de_datos_aislada, sembrar
+from core.models import SalidaTour, Reserva, Pago
+
+MODELOS_INDEXADOS = (SalidaTour, Reserva, Pago)
+
+
+class Command(BaseCommand):
+    help = (
+        "Sembrar una base aislada con muchas reservas y comparar planes y tiempos "
+        "de las consultas del panel y los webhooks sin y con los indices compuestos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reservas", type=int, default=1_000_000)
+        parser.add_argument("--dias", type=int, default=365, help="Dias de salidas a generar por tour")
+        parser.add_argument("--repeticiones", type=int, default=5)
+        parser.add_argument("--batch", type=int, default=5000)
+        parser.add_argument("--archivo", default="", help="Archivo SQLite para la base temporal (por defecto en memoria)")
+
+    def handle(self, *args, **options):
+        with base_de_datos_aislada(archivo=options["archivo"] or None):
+            self._indices(crear=False)
+            self.stdout.write(f"Sembrando {options['reservas']} reservas en {connection.vendor}...")
+            inicio = time_mod.perf_counter()
+            usuarios, tours, salidas = sembrar(
+                reservas=options["reservas"], dias=options["dias"], batch=options["batch"], stdout=self.stdout,
+            )
+            self.stdout.write(f"Siembra completada en {time_mod.perf_counter() - inicio:.1f}s")
+
+            consultas = self._consultas(usuarios, tours)
+            antes = self._medir("SIN indices compuestos", consultas, options["repeticiones"])
+
+            inicio = time_mod.perf_counter()
+            self._indices(crear=True)
+            self.stdout.write(f"\nIndices creados en {time_mod.perf_counter() - inicio:.1f}s")
+            despues = self._medir("CON indices compuestos", consultas, options["repeticiones"])
+
+        self.stdout.write("\nResumen (mediana en ms):")
+        for nombre, _ in consultas:
+            a, d = antes[nombre], despues[nombre]
+            mejora = f"x{a / d:.1f}" if d else "-"
+            self.stdout.write(f"  {nombre:<28} antes {a:>10.2f}  despues {d:>10.2f}  {mejora}")
+
+    def _indices(self, crear):
+        with connection.schema_editor() as editor:
+            for model in MODELOS_INDEXADOS:
+                for index in model._meta.indexes:
+                    if crear:
+                        editor.add_index(model, index)
+                    else:
+                        editor.remove_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def _consultas(self, usuarios, tours):
+        ahora = timezone.now()
+        hoy = timezone.localdate()
+        secretaria = usuarios["secretaria"][0]
+        turista = usuarios["turista"][0]
+        tour = tours[0]
+        inicio_dia = timezone.make_aware(datetime.combine(hoy - timedelta(days=30), time.min))
+        pago = Pago.objects.filter(estado="paid").order_by("id").first()
+        pago_creado = Pago.objects.filter(estado="created").order_by("id").first() or pago
+
+        return [
+            ("panel_secretaria_dia", lambda: Reserva.objects.filter(
+                creado_por=secretaria, fecha_reserva__gte=inicio_dia, fecha_reserva__lt=inicio_dia + timedelta(days=1),
+            )),
+            ("agencias_vencidas", lambda: Reserva.objects.filter(
+                estado="bloqueada_por_agencia", limite_pago_agencia__lt=ahora,
+            )),
+            ("mis_reservas", lambda: Reserva.objects.filter(usuario=turista).exclude(estado="pendiente")),
+            ("webhook_pago_external_id", lambda: Pago.objects.filter(
+                reserva_id=pago.reserva_id, proveedor=pago.proveedor, external_id=pago.external_id,
+            )),
+            ("webhook_pago_estado", lambda: Pago.objects.filter(
+                reserva_id=pago_creado.reserva_id, proveedor=pago_creado.proveedor, estado__in=["created", "approved"],
+            )),
+            ("salida_tour_fecha_hora", lambda: SalidaTour.objects.filter(
+                tour=tour, fecha=hoy + timedelta(days=10), hora=tour.hora_turno_1,
+            )),
+            ("salidas_futuras_con_cupo", lambda: SalidaTour.objects.filter(
+                fecha__gte=hoy + timedelta(days=300), cupos_disponibles__gt=0,
+            )),
+        ]
+
+    def _medir(self, titulo, consultas, repeticiones):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {titulo} =="))
+        resultados = {}
+        for nombre, fabrica in consultas:
+            plan = fabrica().explain()
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time_mod.perf_counter()
+                list(fabrica().values_list("pk", flat=True))
+                tiempos.append((time_mod.perf_counter() - inicio) * 1000)
+            resultados[nombre] = statistics.median(tiempos)
+            self.stdout.write(f"\n{nombre}: {resultados[nombre]:.2f} ms")
+            for linea in plan.splitlines():
+                self.stdout.write(f"    {linea}")
+        return resultados
@@ -0,0 +1,306 @@
+"""Benchmark de punta a punta de los flujos de reserva y del panel.
+
+Siembra una base aislada (destinos, tours con dos turnos diarios durante
+--dias, cientos de miles de reservas con sus pagos) y recorre con el Client
+de Django los flujos calientes: busqueda, detalle y reserva, checkout,
+webhook de pago, panel, listado de reservas y PDFs. Por flujo reporta
+throughput, latencias p50/p90/p99 y consultas SQL en JSON, para guardar el
+resultado de cada commit y compararlo con --comparar.
+
+    manage.py benchmark_reservas --reservas 300000 --salida bench/HEAD.json
+    manage.py benchmark_reservas --salida bench/nuevo.json --comparar bench/HEAD.json
+"""
+import hashlib
+import hmac
+import json
+import random
+import shutil
+import subprocess
+import tempfile
+import time as time_mod
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.management.datos_prueba import base_de_datos_aislada, percentil, sembrar
+from core.models import Reserva, SalidaTour
+
+FLUJOS = (
+    "lista_tours",
+    "tour_detalle_get",
+    "tour_detalle_post",
+    "checkout",
+    "webhook_pagado",
+    "admin_reservas",
+    "panel_admin",
+    "panel_secretaria",
+    "ticket_pdf",
+    "actividad_pdf",
+)
+SECRETO_WEBHOOK = "benchmark"
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+class Command(BaseCommand):
+    help = (
+        "Sembrar una base aislada y medir throughput, latencia p50/p99 y consultas "
+        "de los flujos de reserva, pago y panel; el resultado sale en JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reservas", type=int, default=200_000)
+        parser.add_argument("--dias", type=int, default=365, help="Dias de salidas a generar por tour")
+        parser.add_argument("--destinos", type=int, default=3)
+        parser.add_argument("--tours-por-destino", type=int, default=3)
+        parser.add_argument("--repeticiones", type=int, default=50, help="Peticiones medidas por flujo")
+        parser.add_argument("--calentamiento", type=int, default=5, help="Peticiones sin medir antes de cada flujo")
+        parser.add_argument("--flujos", default="", help=f"Subconjunto separado por comas de: {', '.join(FLUJOS)}")
+        parser.add_argument("--batch", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--archivo", default="", help="Archivo SQLite para la base temporal (por defecto en memoria)")
+        parser.add_argument("--salida", default="", help="Guardar el JSON en este archivo (por defecto se imprime)")
+        parser.add_argument("--comparar", default="", help="JSON de una corrida anterior para mostrar la diferencia")
+
+    def handle(self, *args, **options):
+        flujos = [f.strip() for f in options["flujos"].split(",") if f.strip()] or list(FLUJOS)
+        desconocidos = set(flujos) - set(FLUJOS)
+        if desconocidos:
+            raise CommandError(f"Flujos desconocidos: {', '.join(sorted(desconocidos))}")
+        # Los flujos encadenados usan las reservas que crea tour_detalle_post
+        if {"checkout", "webhook_pagado", "ticket_pdf"} & set(flujos) and "tour_detalle_post" not in flujos:
+            flujos.insert(0, "tour_detalle_post")
+        flujos = [f for f in FLUJOS if f in flujos]
+
+        anterior = None
+        if options["comparar"]:
+            with open(options["comparar"], encoding="utf-8") as fh:
+                anterior = json.load(fh)
+
+        log = self.stderr
+        self.rnd = random.Random(options["seed"])
+        cache_tickets = tempfile.mkdtemp(prefix="bench-tickets-")
+        ajustes = override_settings(
+            TAREAS_EN_SEGUNDO_PLANO=False,
+            CORREOS_EN_COLA=True,
+            LEMONSQUEEZY_WEBHOOK_SECRET=SECRETO_WEBHOOK,
+            TICKET_PDF_CACHE_DIR=cache_tickets,
+        )
+        try:
+            with base_de_datos_aislada(archivo=options["archivo"] or None), ajustes:
+                log.write(f"Sembrando {options['reservas']} reservas en {connection.vendor}...")
+                inicio = time_mod.perf_counter()
+                usuarios, tours, salidas = sembrar(
+                    reservas=options["reservas"], dias=options["dias"], destinos=options["destinos"],
+                    tours_por_destino=options["tours_por_destino"], batch=options["batch"],
+                    seed=options["seed"], stdout=log,
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+                siembra = time_mod.perf_counter() - inicio
+                log.write(f"Siembra completada en {siembra:.1f}s")
+
+                self._preparar(usuarios, tours)
+                resultados = {}
+                for nombre in flujos:
+                    resultados[nombre] = self._medir(
+                        nombre, getattr(self, f"_flujo_{nombre}"), options["repeticiones"], options["calentamiento"],
+                    )
+                    r = resultados[nombre]
+                    log.write(
+                        f"  {nombre:<20} {r['throughput_rps']:>8.1f} req/s  p50 {r['latencia_ms']['p50']:>8.2f} ms  "
+                        f"p99 {r['latencia_ms']['p99']:>8.2f} ms  {r['consultas']['media']:>6.1f} consultas"
+                        + (f"  {r['errores']} errores" if r["errores"] else "")
+                    )
+        finally:
+            shutil.rmtree(cache_tickets, ignore_errors=True)
+
+        informe = {
+            "commit": _commit(),
+            "fecha": timezone.now().isoformat(),
+            "motor": connection.vendor,
+            "parametros": {
+                clave: options[clave]
+                for clave in ("reservas", "dias", "destinos", "tours_por_destino", "repeticiones", "calentamiento", "seed")
+            },
+            "datos": {"tours": len(tours), "salidas": len(salidas), "reservas": options["reservas"]},
+            "siembra_s": round(siembra, 2),
+            "flujos": resultados,
+        }
+        texto = json.dumps(informe, indent=2, ensure_ascii=False)
+        if options["salida"]:
+            with open(options["salida"], "w", encoding="utf-8") as fh:
+                fh.write(texto + "\n")
+            log.write(f"Resultado guardado en {options['salida']}")
+        else:
+            self.stdout.write(texto)
+
+        if anterior:
+            self._comparar(anterior, informe)
+
+    # --- preparacion ---
+
+    def _preparar(self, usuarios, tours):
+        self.admin = User.objects.create_superuser("bench_admin", "admin@bench.local", None)
+        self.secretaria = usuarios["secretaria"][0]
+        self.anonimo = Client()
+        self.cliente_admin = Client()
+        self.cliente_admin.force_login(self.admin)
+        self.cliente_secretaria = Client()
+        self.cliente_secretaria.force_login(self.secretaria)
+
+        self.tours = tours
+        hoy = timezone.localdate()
+        self.destinos = sorted({t.destino_id for t in tours})
+        self.fechas = [hoy + timedelta(days=d) for d in range(1, 60)]
+        self.salidas_futuras = list(
+            SalidaTour.objects.filter(fecha__gt=hoy, cupos_disponibles__gte=2).values_list("id", "tour_id")
+        )
+        # Reservas creadas por tour_detalle_post, consumidas en orden por los flujos siguientes
+        self.creadas = []
+        self.cola = {"checkout": 0, "webhook_pagado": 0, "ticket_pdf": 0}
+        ids = Reserva.objects.order_by("-id").values_list("id", flat=True)
+        self.max_id = ids.first() or 0
+        self.pagadas = list(Reserva.objects.filter(estado="pagada").order_by("-id").values_list("id", flat=True)[:500])
+
+    def _siguiente(self, flujo):
+        """Siguiente reserva creada en el benchmark para `flujo`, o una pagada de la siembra."""
+        i = self.cola[flujo]
+        self.cola[flujo] += 1
+        if i < len(self.creadas):
+            return self.creadas[i]
+        return self.pagadas[i % len(self.pagadas)]
+
+    # --- flujos: cada uno hace una peticion y devuelve (response, estado esperado) ---
+
+    def _flujo_lista_tours(self):
+        return self.anonimo.get(reverse("lista_tours"), {
+            "destino": self.rnd.choice(self.destinos),
+            "fecha": self.rnd.choice(self.fechas).isoformat(),
+            "personas": self.rnd.randint(1, 4),
+        }), 200
+
+    def _flujo_tour_detalle_get(self):
+        return self.anonimo.get(reverse("tour_detalle", args=[self.rnd.choice(self.tours).id])), 200
+
+    def _flujo_tour_detalle_post(self):
+        salida_id, tour_id = self.rnd.choice(self.salidas_futuras)
+        response = self.anonimo.post(
+            reverse("tour_detalle", args=[tour_id]),
+            {"salida": salida_id, "adultos": 2, "ninos": 0},
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+        )
+        if response.status_code == 200:
+            self.creadas.append(response.json()["reserva_id"])
+        return response, 200
+
+    def _flujo_checkout(self):
+        return self.anonimo.get(reverse("checkout_reserva", args=[self._siguiente("checkout")])), 200
+
+    def _flujo_webhook_pagado(self):
+        reserva_id = self._siguiente("webhook_pagado")
+        cuerpo = json.dumps({
+            "meta": {"event_name": "order_created", "custom_data": {"reserva_id": str(reserva_id)}},
+            "data": {
+                "type": "orders",
+                "id": f"bench-{reserva_id}-{self.cola['webhook_pagado']}",
+                "attributes": {"status": "paid", "updated_at": timezone.now().isoformat()},
+            },
+        }).encode("utf-8")
+        firma = hmac.new(SECRETO_WEBHOOK.encode("utf-8"), cuerpo, hashlib.sha256).hexdigest()
+        return self.anonimo.post(
+            reverse("lemonsqueezy_webhook"), cuerpo, content_type="application/json", HTTP_X_SIGNATURE=firma,
+        ), 200
+
+    def _flujo_admin_reservas(self):
+        parametros = {}
+        if self.rnd.random() < 0.5:
+            parametros["antes"] = self.rnd.randint(1, self.max_id)
+        return self.cliente_admin.get(reverse("admin_reservas"), parametros), 200
+
+    def _flujo_panel_admin(self):
+        return self.cliente_admin.get(reverse("panel_admin")), 200
+
+    def _flujo_panel_secretaria(self):
+        return self.cliente_secretaria.get(reverse("panel_admin")), 200
+
+    def _flujo_ticket_pdf(self):
+        return self.anonimo.get(reverse("ver_ticket_pdf", args=[self._siguiente("ticket_pdf")])), 200
+
+    def _flujo_actividad_pdf(self):
+        fecha = timezone.localdate() - timedelta(days=self.rnd.randint(0, 30))
+        return self.cliente_admin.get(reverse("descargar_actividad_dia_pdf"), {"actividad_fecha": fecha.isoformat()}), 200
+
+    # --- medicion ---
+
+    def _medir(self, nombre, flujo, repeticiones, calentamiento):
+        for _ in range(calentamiento):
+            flujo()
+        tiempos, consultas, estados = [], [], {}
+        errores = 0
+        total = time_mod.perf_counter()
+        for _ in range(repeticiones):
+            with ExitStack() as stack:
+                # Todas las conexiones: los reportes pueden leer de la replica
+                capturas = [stack.enter_context(CaptureQueriesContext(conn)) for conn in connections.all()]
+                inicio = time_mod.perf_counter()
+                response, esperado = flujo()
+                tiempos.append((time_mod.perf_counter() - inicio) * 1000)
+            consultas.append(sum(len(c.captured_queries) for c in capturas))
+            estados[str(response.status_code)] = estados.get(str(response.status_code), 0) + 1
+            if response.status_code != esperado:
+                errores += 1
+        total = time_mod.perf_counter() - total
+        return {
+            "peticiones": repeticiones,
+            "errores": errores,
+            "estados": estados,
+            "segundos": round(total, 3),
+            "throughput_rps": round(repeticiones / total, 2) if total else 0.0,
+            "latencia_ms": {
+                "p50": round(percentil(tiempos, 50), 3),
+                "p90": round(percentil(tiempos, 90), 3),
+                "p99": round(percentil(tiempos, 99), 3),
+                "media": round(sum(tiempos) / len(tiempos), 3) if tiempos else 0.0,
+                "max": round(max(tiempos, default=0.0), 3),
+            },
+            "consultas": {
+                "media": round(sum(consultas) / len(consultas), 2) if consultas else 0.0,
+                "max": max(consultas, default=0),
+            },
+        }
+
+    def _comparar(self, anterior, actual):
+        self.stderr.write(self.style.MIGRATE_HEADING(
+            f"\nComparacion con {anterior.get('commit') or 'la corrida anterior'} (p50 / p99 / consultas):"
+        ))
+        for nombre, r in actual["flujos"].items():
+            a = anterior.get("flujos", {}).get(nombre)
+            if not a:
+                self.stderr.write(f"  {nombre:<20} sin datos previos")
+                continue
+            partes = []
+            for etiqueta, antes, ahora in (
+                ("p50", a["latencia_ms"]["p50"], r["latencia_ms"]["p50"]),
+                ("p99", a["latencia_ms"]["p99"], r["latencia_ms"]["p99"]),
+            ):
+                cambio = f"{(ahora - antes) / antes * 100:+.0f}%" if antes else "-"
+                partes.append(f"{etiqueta} {antes:.2f} -> {ahora:.2f} ms ({cambio})")
+            partes.append(f"consultas {a['consultas']['media']:.1f} -> {r['consultas']['media']:.1f}")
+            self.stderr.write(f"  {nombre:<20} " + "  ".join(partes))
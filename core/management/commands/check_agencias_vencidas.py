@@ -1,8 +1,7 @@
 import logging
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from django.core.mail import send_mail
-from django.conf import settings
+from core.correos import encolar
 from core.models import Reserva, SalidaTour
 
 logger = logging.getLogger(__name__)
@@ -35,15 +34,9 @@ class Command(BaseCommand):
                     "Por favor, inicie sesión y cancele el monto inmediatamente."
                 )
                 try:
-                    send_mail(
-                        subject=subject,
-                        message=mensaje,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[reserva.usuario.email],
-                        fail_silently=True
-                    )
+                    encolar(subject, [reserva.usuario.email], texto=mensaje)
                 except Exception as e:
-                    logger.error(f"Fallo enviando correo de incumplimiento a {reserva.usuario.email}: {e}")
+                    logger.error(f"Fallo encolando correo de incumplimiento a {reserva.usuario.email}: {e}")
             count += 1
 
         self.stdout.write(self.style.SUCCESS(f"Se procesaron {count} reservas de agencia vencidas."))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core import cupos, resumenes
+from core.models import ActividadDia, Reserva
+
+
+class Command(BaseCommand):
+    help = "Marcar como pagadas las reservas que tienen un pago exitoso pero otro estado"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Solo contar, sin actualizar")
+
+    def handle(self, *args, **options):
+        desfasadas = Reserva.objects.filter(pagos__estado="paid").exclude(estado="pagada").distinct()
+        if options["dry_run"]:
+            count = desfasadas.count()
+            self.stdout.write(f"{count} reservas con pago exitoso no estan marcadas como pagadas.")
+            return
+
+        count = 0
+        sin_cupos = []
+        for reserva_id in list(desfasadas.values_list("id", flat=True)):
+            # Una por una y por el libro: las canceladas ya devolvieron sus cupos
+            try:
+                with transaction.atomic():
+                    reserva = Reserva.objects.select_for_update().get(id=reserva_id)
+                    if reserva.estado == "pagada":
+                        continue
+                    proveedor = (
+                        reserva.pagos.filter(estado="paid").order_by("-creado_en").values_list("proveedor", flat=True).first()
+                    )
+                    estado_anterior = reserva.estado
+                    cupos.retener_reserva(reserva, motivo="Conciliacion de pagos")
+                    reserva.estado = "pagada"
+                    reserva.retencion_hasta = None
+                    reserva.save(update_fields=["estado", "retencion_hasta"])
+                    resumenes.registrar_cambio_estado(reserva, estado_anterior, "pagada")
+                    ActividadDia.registrar_pago(reserva, proveedor)
+            except cupos.CuposInsuficientes:
+                sin_cupos.append(reserva_id)
+                continue
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Se marcaron {count} reservas como pagadas."))
+        if sin_cupos:
+            self.stdout.write(self.style.WARNING(
+                f"{len(sin_cupos)} reservas no tienen cupos en su salida y quedan sin cambios: "
+                + ", ".join(f"#{i}" for i in sin_cupos)
+            ))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.correos import enviar_pendientes
+
+
+class Command(BaseCommand):
+    help = "Enviar los correos de la bandeja de salida por lotes con una sola conexion SMTP"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=50, help="Correos por conexion SMTP")
+        parser.add_argument("--continuo", action="store_true", help="Seguir revisando la bandeja hasta detenerlo")
+        parser.add_argument("--intervalo", type=float, default=5, help="Segundos de espera con la bandeja vacia (--continuo)")
+
+    def handle(self, *args, **options):
+        total_enviados = total_fallidos = 0
+        while True:
+            enviados, fallidos = enviar_pendientes(options["lote"])
+            total_enviados += enviados
+            total_fallidos += fallidos
+            if enviados or fallidos:
+                self.stdout.write(f"Lote: {enviados} enviados, {fallidos} con error.")
+            if enviados + fallidos >= options["lote"]:
+                continue
+            if not options["continuo"]:
+                break
+            time.sleep(options["intervalo"])
+
+        self.stdout.write(self.style.SUCCESS(f"Se enviaron {total_enviados} correos ({total_fallidos} con error)."))
@@ -0,0 +1,399 @@
+"""Prueba de estres de sobreventa sobre una sola salida.
+
+N hilos lanzan a la vez reservas y pagos contra la misma SalidaTour por los
+caminos reales:
+
+    web            tour_detalle (turista) y luego el webhook (_mark_reserva_paid)
+    agencia        bloqueo de agencia en tour_detalle y luego su pago
+    efectivo       tour_detalle y cobro de la secretaria en procesar_pago_efectivo
+    procesar_pago  tour_detalle y la vista procesar_pago (pago simulado)
+
+Al final se audita la salida: cupos_disponibles contra el libro de
+MovimientoCupo, DisponibilidadSalida y los pasajeros de las reservas que
+retienen cupos. Cualquier descuadre hace fallar el comando.
+
+La espera por bloqueos se aproxima con el tiempo de las sentencias que toman
+locks (BEGIN IMMEDIATE en SQLite, SELECT ... FOR UPDATE y los UPDATE de la
+salida), medido con un execute_wrapper por hilo.
+"""
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time as time_mod
+from collections import Counter, defaultdict
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.db.models import Count, Sum
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import cupos, views
+from core.management.datos_prueba import PREFIJO, base_de_datos_aislada, crear_usuarios, percentil
+from core.models import Destino, Tour, SalidaTour, DisponibilidadSalida, MovimientoCupo, Reserva, Pago
+
+CAMINOS = ("web", "agencia", "efectivo", "procesar_pago")
+ESTADOS_CON_CUPO = ("pagada", "bloqueada_por_agencia", "confirmada")
+
+
+def _clasificar(texto):
+    """Tipo de fallo segun el mensaje de la excepcion o de la vista."""
+    texto = str(texto).lower()
+    if "deadlock" in texto:
+        return "deadlock"
+    if "locked" in texto or "lock timeout" in texto or "could not obtain lock" in texto:
+        return "bd_bloqueada"
+    if "cupo" in texto:
+        return "sin_cupos"
+    return "error"
+
+
+class Medidor:
+    """execute_wrapper que acumula el tiempo de las sentencias que esperan locks."""
+
+    def __init__(self):
+        self.espera = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time_mod.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            inicial = sql.lstrip()[:40].upper()
+            if (
+                inicial.startswith("BEGIN")
+                or " FOR UPDATE" in sql.upper()
+                or (inicial.startswith("UPDATE") and "core_salidatour" in sql)
+            ):
+                self.espera += time_mod.perf_counter() - inicio
+
+
+class Command(BaseCommand):
+    help = "Lanzar reservas y pagos concurrentes sobre una misma salida y verificar que no haya sobreventa"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hilos", type=int, default=16)
+        parser.add_argument("--operaciones", type=int, default=400, help="Reservas a intentar en total")
+        parser.add_argument("--cupos", type=int, default=40, help="Cupo de la salida disputada")
+        parser.add_argument(
+            "--mezcla", default="web=4,agencia=2,efectivo=2,procesar_pago=2",
+            help=f"Peso de cada camino ({', '.join(CAMINOS)})",
+        )
+        parser.add_argument("--seed", type=int, default=7)
+        parser.add_argument(
+            "--archivo", default="",
+            help="Archivo SQLite para la base temporal (por defecto uno en /tmp: los hilos no comparten la base en memoria)",
+        )
+        parser.add_argument("--salida", default="", help="Guardar el resultado en JSON en este archivo")
+
+    def handle(self, *args, **options):
+        pesos = self._mezcla(options["mezcla"])
+        rnd = random.Random(options["seed"])
+        plan = rnd.choices(list(pesos), weights=list(pesos.values()), k=options["operaciones"])
+
+        archivo = options["archivo"]
+        temporal = None
+        if not archivo and connection.vendor == "sqlite":
+            temporal = tempfile.NamedTemporaryFile(prefix="estres-cupos-", suffix=".sqlite3", delete=False)
+            temporal.close()
+            archivo = temporal.name
+
+        ajustes = override_settings(CORREOS_EN_COLA=True, TAREAS_EN_SEGUNDO_PLANO=False)
+        try:
+            with base_de_datos_aislada(archivo=archivo or None), ajustes:
+                self._preparar(options["cupos"])
+                self.stdout.write(
+                    f"{options['operaciones']} reservas con {options['hilos']} hilos sobre la salida "
+                    f"{self.salida.id} ({options['cupos']} cupos) en {connection.vendor}..."
+                )
+                informe = self._correr(plan, options["hilos"], options["seed"])
+                informe["descuadres"] = self._auditar()
+        finally:
+            if temporal:
+                for sufijo in ("", "-wal", "-shm", "-journal"):
+                    if os.path.exists(archivo + sufijo):
+                        os.remove(archivo + sufijo)
+
+        informe["parametros"] = {
+            clave: options[clave] for clave in ("hilos", "operaciones", "cupos", "mezcla", "seed")
+        }
+        self._reportar(informe)
+        if options["salida"]:
+            with open(options["salida"], "w", encoding="utf-8") as fh:
+                json.dump(informe, fh, indent=2, ensure_ascii=False)
+                fh.write("\n")
+        if informe["descuadres"]:
+            raise CommandError(f"Se encontraron {len(informe['descuadres'])} descuadres de cupos.")
+
+    def _mezcla(self, texto):
+        pesos = {}
+        for parte in texto.split(","):
+            if not parte.strip():
+                continue
+            nombre, _, peso = parte.partition("=")
+            nombre = nombre.strip()
+            if nombre not in CAMINOS:
+                raise CommandError(f"Camino desconocido: {nombre}")
+            try:
+                pesos[nombre] = float(peso or 1)
+            except ValueError:
+                raise CommandError(f"Peso invalido para {nombre}: {peso}")
+        pesos = {nombre: peso for nombre, peso in pesos.items() if peso > 0}
+        if not pesos:
+            raise CommandError("La mezcla no tiene ningun camino.")
+        return pesos
+
+    # --- datos ---
+
+    def _preparar(self, cupo):
+        usuarios = crear_usuarios(secretarias=1, agencias=4, turistas=0)
+        self.secretaria = usuarios["secretaria"][0]
+        self.agencias = usuarios["agencia"]
+        User.objects.filter(id__in=[u.id for u in self.agencias]).update(email=f"agencia@{PREFIJO}.local")
+
+        destino = Destino.objects.create(nombre=f"{PREFIJO} estres", imagen_url="https://example.com/destino.jpg")
+        self.tour = Tour.objects.create(
+            nombre=f"{PREFIJO} tour disputado", destino=destino, descripcion="Prueba de estres de cupos.",
+            precio=Decimal("80.00"), precio_adulto=Decimal("80.00"), precio_nino=Decimal("70.00"),
+            cupo_maximo=cupo, cupos_disponibles=cupo, hora_turno_1=time(8, 0), hora_turno_2=time(14, 0),
+        )
+        # save() abre el libro de cupos y la fila de DisponibilidadSalida
+        self.salida = SalidaTour.objects.create(
+            tour=self.tour, fecha=timezone.localdate() + timedelta(days=1), hora=time(8, 0),
+            cupo_maximo=cupo, cupos_disponibles=cupo,
+        )
+
+    # --- caminos: devuelven "pagada" o "bloqueo_agencia", o lanzan el fallo ---
+
+    def _reservar(self, cliente, adultos, ninos, agencia=False):
+        datos = {"salida": self.salida.id, "adultos": adultos, "ninos": ninos}
+        if ninos:
+            datos["edades_ninos"] = [8] * ninos
+        if agencia:
+            datos.update({
+                "fecha_agencia": self.salida.fecha.isoformat(), "codigo_agencia": "V-1000",
+                "nombre": "Agencia", "telefono": "0990000000", "identificacion": "1790000000001",
+            })
+        response = cliente.post(
+            reverse("tour_detalle", args=[self.tour.id]), datos, HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+        )
+        datos = response.json()
+        if response.status_code != 200:
+            raise RuntimeError(datos.get("error", f"HTTP {response.status_code}"))
+        return datos["reserva_id"]
+
+    def _pagar(self, reserva_id, proveedor):
+        views._mark_reserva_paid(reserva_id, proveedor, external_id=f"estres-{reserva_id}")
+        return "pagada"
+
+    def _camino_web(self, contexto, adultos, ninos):
+        return self._pagar(self._reservar(contexto["anonimo"], adultos, ninos), "lemonsqueezy")
+
+    def _camino_agencia(self, contexto, adultos, ninos):
+        reserva_id = self._reservar(contexto["agencia"], adultos, ninos, agencia=True)
+        if contexto["rnd"].random() < 0.5:
+            return "bloqueo_agencia"
+        return self._pagar(reserva_id, "paypal")
+
+    def _camino_efectivo(self, contexto, adultos, ninos):
+        reserva_id = self._reservar(contexto["anonimo"], adultos, ninos)
+        response = contexto["secretaria"].post(reverse("procesar_pago_efectivo", args=[reserva_id]))
+        return self._verificar_pagada(reserva_id, response.wsgi_request)
+
+    def _camino_procesar_pago(self, contexto, adultos, ninos):
+        reserva_id = self._reservar(contexto["anonimo"], adultos, ninos)
+        request = contexto["factory"].post("/procesar-pago/", {"reserva_id": reserva_id, "email": "cliente@bench.local"})
+        request.user = AnonymousUser()
+        request._messages = CookieStorage(request)
+        views.procesar_pago(request)
+        return self._verificar_pagada(reserva_id, request)
+
+    def _verificar_pagada(self, reserva_id, request):
+        """Las vistas de pago informan los fallos solo con mensajes flash."""
+        estado = Reserva.objects.filter(id=reserva_id).values_list("estado", flat=True).first()
+        if estado != "pagada":
+            errores = [m.message for m in request._messages if m.level_tag == "error"]
+            raise RuntimeError(errores[0] if errores else f"reserva {estado}")
+        return "pagada"
+
+    # --- ejecucion ---
+
+    def _correr(self, plan, hilos, seed):
+        cola = list(enumerate(plan))
+        lock = threading.Lock()
+        resultados = defaultdict(lambda: {"latencias": [], "estados": Counter()})
+        espera = []
+        inicio_comun = threading.Barrier(hilos)
+
+        def trabajar(indice):
+            rnd = random.Random(seed * 1000 + indice)
+            medidor = Medidor()
+            contexto = {
+                "rnd": rnd,
+                "anonimo": Client(),
+                "agencia": Client(),
+                "secretaria": Client(),
+                "factory": RequestFactory(),
+            }
+            contexto["agencia"].force_login(self.agencias[indice % len(self.agencias)])
+            contexto["secretaria"].force_login(self.secretaria)
+            try:
+                with connection.execute_wrapper(medidor):
+                    inicio_comun.wait()
+                    while True:
+                        with lock:
+                            if not cola:
+                                break
+                            _, camino = cola.pop()
+                        adultos, ninos = rnd.randint(1, 3), rnd.choice((0, 0, 1))
+                        inicio = time_mod.perf_counter()
+                        try:
+                            estado = getattr(self, f"_camino_{camino}")(contexto, adultos, ninos)
+                        except (DatabaseError, RuntimeError, ValueError) as exc:
+                            estado = _clasificar(exc)
+                        duracion = time_mod.perf_counter() - inicio
+                        with lock:
+                            resultados[camino]["latencias"].append(duracion * 1000)
+                            resultados[camino]["estados"][estado] += 1
+            finally:
+                with lock:
+                    espera.append(medidor.espera)
+                connection.close()
+
+        trabajadores = [threading.Thread(target=trabajar, args=(i,), daemon=True) for i in range(hilos)]
+        # Los 400 por falta de cupos son esperados: no llenar la salida con "Bad Request"
+        registro = logging.getLogger("django.request")
+        nivel = registro.level
+        registro.setLevel(logging.ERROR)
+        inicio = time_mod.perf_counter()
+        try:
+            for t in trabajadores:
+                t.start()
+            for t in trabajadores:
+                t.join()
+        finally:
+            registro.setLevel(nivel)
+        total = time_mod.perf_counter() - inicio
+
+        caminos = {}
+        estados = Counter()
+        for camino, datos in sorted(resultados.items()):
+            estados.update(datos["estados"])
+            caminos[camino] = {
+                "operaciones": len(datos["latencias"]),
+                "estados": dict(datos["estados"]),
+                "latencia_ms": {
+                    "p50": round(percentil(datos["latencias"], 50), 2),
+                    "p99": round(percentil(datos["latencias"], 99), 2),
+                    "max": round(max(datos["latencias"], default=0.0), 2),
+                },
+            }
+        return {
+            "motor": connection.vendor,
+            "segundos": round(total, 3),
+            "throughput_ops": round(len(plan) / total, 2) if total else 0.0,
+            "espera_bloqueos_s": {
+                "total": round(sum(espera), 3),
+                "media_por_hilo": round(sum(espera) / len(espera), 3) if espera else 0.0,
+                "fraccion": round(sum(espera) / (total * hilos), 3) if total else 0.0,
+            },
+            "estados": dict(estados),
+            "caminos": caminos,
+        }
+
+    # --- auditoria final ---
+
+    def _auditar(self):
+        salida = SalidaTour.objects.get(id=self.salida.id)
+        descuadres = []
+
+        def descuadre(texto):
+            descuadres.append(texto)
+
+        if salida.cupos_disponibles < 0:
+            descuadre(f"cupos_disponibles negativo: {salida.cupos_disponibles}")
+        saldo = cupos.saldo_libro([salida.id]).get(salida.id, 0)
+        if saldo != salida.cupos_disponibles:
+            descuadre(f"cupos_disponibles={salida.cupos_disponibles} pero el libro suma {saldo}")
+        disponibilidad = DisponibilidadSalida.objects.filter(salida=salida).values_list("cupos_disponibles", flat=True).first()
+        if disponibilidad != salida.cupos_disponibles:
+            descuadre(f"DisponibilidadSalida={disponibilidad} distinto de cupos_disponibles={salida.cupos_disponibles}")
+
+        reservas = list(Reserva.objects.filter(salida=salida))
+        retenidos = dict(
+            MovimientoCupo.objects.filter(salida=salida, reserva__isnull=False)
+            .values("reserva_id").annotate(total=Sum("delta")).values_list("reserva_id", "total")
+        )
+        ocupados = 0
+        for reserva in reservas:
+            personas = reserva.adultos + reserva.ninos
+            tiene = -(retenidos.get(reserva.id) or 0)
+            if reserva.estado in ESTADOS_CON_CUPO and tiene != personas:
+                descuadre(f"reserva {reserva.id} ({reserva.estado}) retiene {tiene} cupos para {personas} personas")
+            elif reserva.estado == "pendiente" and tiene not in (0, personas):
+                descuadre(f"reserva {reserva.id} pendiente retiene {tiene} de {personas} cupos")
+            elif reserva.estado == "cancelada" and tiene:
+                descuadre(f"reserva {reserva.id} cancelada retiene {tiene} cupos")
+            ocupados += tiene
+        if salida.cupo_maximo - salida.cupos_disponibles != ocupados:
+            descuadre(
+                f"cupo_maximo - cupos_disponibles = {salida.cupo_maximo - salida.cupos_disponibles} "
+                f"pero las reservas retienen {ocupados}"
+            )
+        pagadas = sum(r.adultos + r.ninos for r in reservas if r.estado == "pagada")
+        if pagadas > salida.cupo_maximo:
+            descuadre(f"sobreventa: {pagadas} pasajeros pagados para {salida.cupo_maximo} cupos")
+        dobles = (
+            Pago.objects.filter(reserva__salida=salida, estado="paid")
+            .values("reserva_id").annotate(n=Count("id")).filter(n__gt=1).count()
+        )
+        if dobles:
+            descuadre(f"{dobles} reservas con mas de un pago confirmado")
+
+        self.auditoria = {
+            "cupo_maximo": salida.cupo_maximo,
+            "cupos_disponibles": salida.cupos_disponibles,
+            "pasajeros_pagados": pagadas,
+            "reservas": dict(Counter(r.estado for r in reservas)),
+        }
+        return descuadres
+
+    def _reportar(self, informe):
+        informe["auditoria"] = self.auditoria
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\n{sum(c['operaciones'] for c in informe['caminos'].values())} operaciones en {informe['segundos']:.2f}s "
+            f"({informe['throughput_ops']:.1f} op/s)"
+        ))
+        for camino, datos in informe["caminos"].items():
+            estados = ", ".join(f"{k}={v}" for k, v in sorted(datos["estados"].items()))
+            self.stdout.write(
+                f"  {camino:<14} p50 {datos['latencia_ms']['p50']:>8.2f} ms  p99 {datos['latencia_ms']['p99']:>8.2f} ms  {estados}"
+            )
+        espera = informe["espera_bloqueos_s"]
+        self.stdout.write(
+            f"Espera en sentencias con bloqueo: {espera['total']:.2f}s en total, "
+            f"{espera['fraccion'] * 100:.0f}% del tiempo de los hilos"
+        )
+        fallos = {k: v for k, v in informe["estados"].items() if k in ("bd_bloqueada", "deadlock", "error")}
+        if fallos:
+            self.stdout.write(self.style.WARNING(
+                "Errores de base de datos: " + ", ".join(f"{k}={v}" for k, v in sorted(fallos.items()))
+            ))
+        a = self.auditoria
+        self.stdout.write(
+            f"Salida: {a['cupo_maximo']} cupos, {a['cupos_disponibles']} libres, {a['pasajeros_pagados']} pasajeros pagados; "
+            + ", ".join(f"{k}={v}" for k, v in sorted(a["reservas"].items()))
+        )
+        if informe["descuadres"]:
+            for texto in informe["descuadres"]:
+                self.stdout.write(self.style.ERROR(f"  {texto}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Sin sobreventa: la salida cuadra con el libro y con las reservas."))
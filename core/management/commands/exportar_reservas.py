@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import exportes
+from core.models import Pago, Reserva
+
+
+class Command(BaseCommand):
+    help = "Exportar reservas o pagos a CSV/XLSX en streaming, con los mismos filtros que el panel"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tipo", choices=exportes.TIPOS, default="reservas")
+        parser.add_argument("--formato", choices=exportes.FORMATOS, default="csv")
+        parser.add_argument("--desde", help="Fecha inicial AAAA-MM-DD (de la reserva o del pago), incluida")
+        parser.add_argument("--hasta", help="Fecha final AAAA-MM-DD, incluida")
+        parser.add_argument(
+            "--estado",
+            help=f"Estado de la reserva ({', '.join(dict(Reserva.ESTADOS))}) "
+                 f"o del pago ({', '.join(dict(Pago.ESTADOS))})",
+        )
+        parser.add_argument("--proveedor", choices=list(dict(Pago.PROVEEDORES)))
+        parser.add_argument("--secretaria", help="Id o username de quien creo la reserva")
+        parser.add_argument("--salida", help="Archivo destino (por defecto stdout; obligatorio con --formato xlsx)")
+
+    def handle(self, *args, **options):
+        try:
+            filtros = exportes.leer_filtros(options)
+            if filtros["formato"] == "xlsx" and not options["salida"]:
+                raise ValueError("El formato xlsx necesita --salida.")
+            bloques = exportes.generar(filtros)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if options["salida"]:
+            if filtros["formato"] == "xlsx":
+                destino = open(options["salida"], "wb")
+            else:
+                destino = open(options["salida"], "w", encoding="utf-8", newline="")
+            with destino:
+                for bloque in bloques:
+                    destino.write(bloque)
+            self.stderr.write(self.style.SUCCESS(f"Exporte escrito en {options['salida']}"))
+        else:
+            for bloque in bloques:
+                self.stdout.write(bloque, ending="")
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from core.cupos import liberar_retenciones_vencidas
+
+
+class Command(BaseCommand):
+    help = "Liberar los cupos retenidos por reservas web pendientes cuyo plazo de pago vencio"
+
+    def handle(self, *args, **kwargs):
+        count = liberar_retenciones_vencidas()
+        self.stdout.write(self.style.SUCCESS(f"Se liberaron los cupos de {count} reservas pendientes vencidas."))
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.programacion import materializar
+
+
+class Command(BaseCommand):
+    help = (
+        "Generar las salidas de los turnos de cada tour para los proximos N dias; "
+        "es incremental y se puede correr desde cron cada pocos minutos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", "--dias", dest="dias", type=int, default=None,
+            help="Dias del horizonte desde hoy (por defecto SALIDAS_HORIZONTE_DIAS)",
+        )
+        parser.add_argument("--tour", type=int, action="append", default=[], help="Solo este tour (se puede repetir)")
+        parser.add_argument(
+            "--rellenar", action="store_true",
+            help="Revisar el horizonte completo y reponer las salidas que falten, incluso las borradas",
+        )
+        parser.add_argument("--batch", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        dias = options["dias"] or getattr(settings, "SALIDAS_HORIZONTE_DIAS", 90)
+        if dias < 1:
+            raise CommandError("--days debe ser al menos 1.")
+        creadas = materializar(dias, rellenar=options["rellenar"], tour_ids=options["tour"], batch=options["batch"])
+        if options["verbosity"] > 1:
+            for tour_id, cantidad in creadas.items():
+                self.stdout.write(f"  Tour {tour_id}: {cantidad} salidas")
+        self.stdout.write(self.style.SUCCESS(
+            f"Se crearon {sum(creadas.values())} salidas en {len(creadas)} tours (horizonte de {dias} dias)."
+        ))
@@ -0,0 +1,278 @@
+"""Servidor HTTP que imita a PayPal y Lemon Squeezy para pruebas de carga.
+
+Uso tipico (en otra terminal corre el sitio en :8000):
+
+    manage.py proveedor_simulado --puerto 8090 --latencia-ms 120 --tasa-error 0.02
+
+y el sitio con
+    PAYPAL_API_URL=http://127.0.0.1:8090
+    LEMONSQUEEZY_API_URL=http://127.0.0.1:8090/v1
+    PAYPAL_WEBHOOK_VERIFICACION=remota
+    y credenciales cualesquiera (PAYPAL_CLIENT_ID, LEMONSQUEEZY_API_KEY, ...).
+
+Al capturar una orden de PayPal, o al abrir la URL de un checkout de Lemon
+Squeezy, el simulador manda el webhook correspondiente al sitio. Los de
+Lemon Squeezy van firmados con LEMONSQUEEZY_WEBHOOK_SECRET como espera
+_lemonsqueezy_verify_signature.
+"""
+import hashlib
+import hmac
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Simulador:
+    def __init__(self, opciones, stdout):
+        self.opciones = opciones
+        self.stdout = stdout
+        self.secreto = (opciones["secreto"] or getattr(settings, "LEMONSQUEEZY_WEBHOOK_SECRET", "")).encode("utf-8")
+        self.app_url = opciones["app_url"].rstrip("/")
+        self.ordenes = {}
+        self.checkouts = {}
+        self.contador = Counter()
+        self.ids = itertools.count(1000)
+        self.lock = threading.Lock()
+        self.webhooks = requests.Session()
+
+    def siguiente_id(self):
+        with self.lock:
+            return next(self.ids)
+
+    def contar(self, clave):
+        with self.lock:
+            self.contador[clave] += 1
+
+    # --- webhooks hacia el sitio ---
+
+    def _entregar(self, ruta, cuerpo, encabezados):
+        time.sleep(self.opciones["demora_webhook_ms"] / 1000)
+        for _ in range(self.opciones["copias_webhook"]):
+            try:
+                respuesta = self.webhooks.post(f"{self.app_url}{ruta}", data=cuerpo, headers=encabezados, timeout=30)
+                self.contar(f"webhook {ruta} -> {respuesta.status_code}")
+            except requests.RequestException as exc:
+                self.contar(f"webhook {ruta} -> error")
+                self.stdout.write(f"No se pudo entregar el webhook a {ruta}: {exc}")
+
+    def enviar_webhook(self, ruta, evento, firmar=False):
+        if self.opciones["sin_webhooks"]:
+            return
+        cuerpo = json.dumps(evento).encode("utf-8")
+        encabezados = {"Content-Type": "application/json"}
+        if firmar:
+            encabezados["X-Signature"] = hmac.new(self.secreto, cuerpo, hashlib.sha256).hexdigest()
+        else:
+            encabezados.update({
+                "PAYPAL-TRANSMISSION-ID": str(uuid.uuid4()),
+                "PAYPAL-TRANSMISSION-TIME": timezone.now().isoformat(),
+                "PAYPAL-AUTH-ALGO": "SHA256withRSA",
+                "PAYPAL-CERT-URL": "https://api.sandbox.paypal.com/v1/notifications/certs/SIMULADO",
+                "PAYPAL-TRANSMISSION-SIG": "c2ltdWxhZG8=",
+            })
+        threading.Thread(target=self._entregar, args=(ruta, cuerpo, encabezados), daemon=True).start()
+
+    def webhook_paypal(self, orden):
+        self.enviar_webhook("/webhooks/paypal/", {
+            "id": f"WH-{uuid.uuid4().hex[:17].upper()}",
+            "event_type": "PAYMENT.CAPTURE.COMPLETED",
+            "resource": {
+                "id": orden["captura"],
+                "custom_id": orden["custom_id"],
+                "amount": orden["amount"],
+                "supplementary_data": {"related_ids": {"order_id": orden["id"]}},
+            },
+        })
+
+    def webhook_lemonsqueezy(self, checkout):
+        self.enviar_webhook("/webhooks/lemonsqueezy/", {
+            "meta": {"event_name": "order_created", "custom_data": checkout["custom"]},
+            "data": {
+                "type": "orders",
+                "id": str(self.siguiente_id()),
+                "attributes": {
+                    "status": "paid",
+                    "total": checkout["precio"],
+                    "user_email": "cliente@simulado.local",
+                    "updated_at": timezone.now().isoformat(),
+                },
+            },
+        }, firmar=True)
+
+    # --- respuestas de la API ---
+
+    def paypal_orden(self, cuerpo):
+        unidad = (cuerpo.get("purchase_units") or [{}])[0]
+        orden = {
+            "id": f"SIM{self.siguiente_id()}",
+            "custom_id": unidad.get("custom_id", ""),
+            "amount": unidad.get("amount", {}),
+            "status": "CREATED",
+            "captura": "",
+        }
+        with self.lock:
+            self.ordenes[orden["id"]] = orden
+        return 201, {"id": orden["id"], "status": "CREATED"}
+
+    def paypal_datos_orden(self, orden):
+        datos = {
+            "id": orden["id"],
+            "status": orden["status"],
+            "payer": {"email_address": "cliente@simulado.local"},
+            "purchase_units": [{"custom_id": orden["custom_id"], "amount": orden["amount"]}],
+        }
+        if orden["captura"]:
+            datos["purchase_units"][0]["payments"] = {"captures": [{"id": orden["captura"], "status": "COMPLETED"}]}
+        return datos
+
+    def paypal_captura(self, orden_id):
+        with self.lock:
+            orden = self.ordenes.get(orden_id)
+            if orden is None:
+                return 404, {"name": "RESOURCE_NOT_FOUND"}
+            nueva = not orden["captura"]
+            if nueva:
+                orden["status"] = "COMPLETED"
+                orden["captura"] = f"CAP{next(self.ids)}"
+        if nueva:
+            self.webhook_paypal(orden)
+        return 201, self.paypal_datos_orden(orden)
+
+    def lemonsqueezy_checkout(self, cuerpo, host):
+        atributos = cuerpo.get("data", {}).get("attributes", {})
+        checkout_id = str(uuid.uuid4())
+        checkout = {
+            "custom": atributos.get("checkout_data", {}).get("custom", {}),
+            "precio": atributos.get("custom_price"),
+            "redirect": atributos.get("product_options", {}).get("redirect_url", ""),
+            "pagado": False,
+        }
+        with self.lock:
+            self.checkouts[checkout_id] = checkout
+        url = f"http://{host}/checkout/{checkout_id}"
+        return 201, {"data": {"type": "checkouts", "id": checkout_id, "attributes": {"url": url}}}
+
+    def lemonsqueezy_pagar(self, checkout_id):
+        with self.lock:
+            checkout = self.checkouts.get(checkout_id)
+            nuevo = checkout is not None and not checkout["pagado"]
+            if nuevo:
+                checkout["pagado"] = True
+        if checkout is None:
+            return None
+        if nuevo:
+            self.webhook_lemonsqueezy(checkout)
+        return checkout["redirect"] or "/"
+
+    def responder(self, metodo, ruta, cuerpo, host):
+        """(estado, json) o (302, url) para una peticion."""
+        partes = [p for p in urlsplit(ruta).path.split("/") if p]
+        if metodo == "POST" and partes == ["v1", "oauth2", "token"]:
+            return 200, {"access_token": f"SIM-{uuid.uuid4().hex}", "token_type": "Bearer", "expires_in": 32400}
+        if metodo == "POST" and partes == ["v1", "notifications", "verify-webhook-signature"]:
+            return 200, {"verification_status": "SUCCESS"}
+        if metodo == "POST" and partes == ["v2", "checkout", "orders"]:
+            return self.paypal_orden(cuerpo)
+        if metodo == "POST" and len(partes) == 5 and partes[:3] == ["v2", "checkout", "orders"] and partes[4] == "capture":
+            return self.paypal_captura(partes[3])
+        if metodo == "GET" and len(partes) == 4 and partes[:3] == ["v2", "checkout", "orders"]:
+            orden = self.ordenes.get(partes[3])
+            return (200, self.paypal_datos_orden(orden)) if orden else (404, {"name": "RESOURCE_NOT_FOUND"})
+        if metodo == "POST" and partes == ["v1", "checkouts"]:
+            return self.lemonsqueezy_checkout(cuerpo, host)
+        if metodo == "GET" and len(partes) == 2 and partes[0] == "checkout":
+            destino = self.lemonsqueezy_pagar(partes[1])
+            return (302, destino) if destino else (404, {"error": "checkout desconocido"})
+        return 404, {"error": f"{metodo} {ruta} no simulado"}
+
+
+def crear_handler(simulador):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _atender(self, metodo):
+            largo = int(self.headers.get("Content-Length") or 0)
+            crudo = self.rfile.read(largo) if largo else b""
+            try:
+                cuerpo = json.loads(crudo) if crudo else {}
+            except ValueError:
+                cuerpo = {}
+
+            opciones = simulador.opciones
+            latencia = max(random.gauss(opciones["latencia_ms"], opciones["variacion_ms"]), 0)
+            time.sleep(latencia / 1000)
+            ruta = urlsplit(self.path).path
+            if random.random() < opciones["tasa_error"]:
+                estado, datos = random.choice((500, 502, 503, 429)), {"error": "falla simulada"}
+            else:
+                estado, datos = simulador.responder(metodo, self.path, cuerpo, self.headers.get("Host", ""))
+            simulador.contar(f"{metodo} {re.sub(r'/(SIM[0-9]+|[0-9a-f-]{36})', '/{id}', ruta)} -> {estado}")
+
+            if estado == 302:
+                self.send_response(302)
+                self.send_header("Location", datos)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            salida = json.dumps(datos).encode("utf-8")
+            self.send_response(estado)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(salida)))
+            self.end_headers()
+            self.wfile.write(salida)
+
+        def do_GET(self):
+            self._atender("GET")
+
+        def do_POST(self):
+            self._atender("POST")
+
+        def log_message(self, formato, *args):
+            if simulador.opciones["verbosity"] > 1:
+                simulador.stdout.write(formato % args)
+
+    return Handler
+
+
+class Command(BaseCommand):
+    help = "Servidor local que imita las APIs y webhooks de PayPal y Lemon Squeezy para pruebas de carga"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--puerto", type=int, default=8090)
+        parser.add_argument("--app-url", default="", help="Sitio que recibe los webhooks (por defecto SITE_URL)")
+        parser.add_argument("--latencia-ms", type=float, default=80, help="Latencia media de cada respuesta")
+        parser.add_argument("--variacion-ms", type=float, default=20, help="Desviacion de la latencia")
+        parser.add_argument("--tasa-error", type=float, default=0.0, help="Fraccion de respuestas 429/5xx (0 a 1)")
+        parser.add_argument("--demora-webhook-ms", type=float, default=200, help="Espera antes de mandar cada webhook")
+        parser.add_argument("--copias-webhook", type=int, default=1, help="Entregar cada webhook N veces (reenvios)")
+        parser.add_argument("--sin-webhooks", action="store_true")
+        parser.add_argument("--secreto", default="", help="Secreto HMAC de Lemon Squeezy (por defecto LEMONSQUEEZY_WEBHOOK_SECRET)")
+
+    def handle(self, *args, **options):
+        options["app_url"] = options["app_url"] or getattr(settings, "SITE_URL", "http://127.0.0.1:8000")
+        simulador = Simulador(options, self.stdout)
+        servidor = ThreadingHTTPServer(("127.0.0.1", options["puerto"]), crear_handler(simulador))
+        servidor.daemon_threads = True
+        self.stdout.write(self.style.SUCCESS(
+            f"Proveedor simulado en http://127.0.0.1:{options['puerto']} (webhooks a {simulador.app_url})"
+        ))
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
+            for clave, total in sorted(simulador.contador.items()):
+                self.stdout.write(f"{total:>8}  {clave}")
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from core.models import ActividadDia, Pago, Reserva, SalidaTour
+
+
+class Command(BaseCommand):
+    help = "Reconstruir la agenda diaria (ActividadDia) desde las reservas y salidas existentes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=1000, help="Filas por lote de insercion")
+
+    def handle(self, *args, **options):
+        batch = options["batch"]
+        proveedores = dict(Pago.PROVEEDORES)
+        metodo = dict(
+            (reserva_id, proveedores.get(proveedor, proveedor))
+            for reserva_id, proveedor in Pago.objects.filter(estado="paid").order_by("creado_en").values_list("reserva_id", "proveedor")
+        )
+        total = 0
+        with transaction.atomic():
+            ActividadDia.objects.all().delete()
+            filas = []
+
+            def volcar():
+                nonlocal filas, total
+                ActividadDia.objects.bulk_create(filas)
+                total += len(filas)
+                filas = []
+
+            for reserva in Reserva.objects.select_related("creado_por", "usuario").iterator(chunk_size=batch):
+                if reserva.creado_por_id:
+                    autor_nombre = reserva.creado_por.username
+                elif reserva.usuario_id:
+                    autor_nombre = reserva.usuario.username
+                else:
+                    autor_nombre = "web"
+                filas.append(ActividadDia(
+                    fecha=timezone.localdate(reserva.fecha_reserva),
+                    tipo="reserva",
+                    dt=reserva.fecha_reserva,
+                    reserva_id=reserva.id,
+                    autor_id=reserva.creado_por_id,
+                    autor_nombre=autor_nombre,
+                    metodo_pago=metodo.get(reserva.id, "Pendiente"),
+                ))
+                if len(filas) >= batch:
+                    volcar()
+            for salida in SalidaTour.objects.select_related("creado_por").iterator(chunk_size=batch):
+                fecha, dt = ActividadDia._dt_salida(salida)
+                filas.append(ActividadDia(
+                    fecha=fecha,
+                    tipo="salida",
+                    dt=dt,
+                    salida_id=salida.id,
+                    autor_id=salida.creado_por_id,
+                    autor_nombre=salida.creado_por.username if salida.creado_por_id else "sistema",
+                ))
+                if len(filas) >= batch:
+                    volcar()
+            if filas:
+                volcar()
+
+        self.stdout.write(self.style.SUCCESS(f"Agenda diaria reconstruida: {total} actividades."))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import SalidaTour, DisponibilidadSalida
+
+
+class Command(BaseCommand):
+    help = "Reconstruir el indice de disponibilidad usado por la busqueda de tours"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=1000, help="Filas por lote de insercion")
+
+    def handle(self, *args, **options):
+        batch = options["batch"]
+        total = 0
+        with transaction.atomic():
+            DisponibilidadSalida.objects.all().delete()
+            filas = []
+            for salida in SalidaTour.objects.select_related("tour").iterator(chunk_size=batch):
+                filas.append(DisponibilidadSalida(
+                    salida_id=salida.id,
+                    destino_id=salida.tour.destino_id,
+                    fecha=salida.fecha,
+                    hora=salida.hora,
+                    cupos_disponibles=salida.cupos_disponibles,
+                ))
+                if len(filas) >= batch:
+                    DisponibilidadSalida.objects.bulk_create(filas)
+                    total += len(filas)
+                    filas = []
+            if filas:
+                DisponibilidadSalida.objects.bulk_create(filas)
+                total += len(filas)
+
+        self.stdout.write(self.style.SUCCESS(f"Indice de disponibilidad reconstruido: {total} salidas."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core import resumenes
+
+
+class Command(BaseCommand):
+    help = "Recalcular el resumen diario de ventas por secretaria desde las reservas y pagos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=1000, help="Filas por lote de insercion")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = resumenes.reconstruir(batch=options["batch"])
+        self.stdout.write(self.style.SUCCESS(f"Resumen de secretarias reconstruido: {total} dias."))
+        if not resumenes.resumen_activo():
+            self.stdout.write(self.style.WARNING(
+                "SECRETARIA_RESUMEN_DIARIO esta desactivado: el panel sigue calculando los totales desde las reservas."
+            ))
@@ -0,0 +1,67 @@
+import glob
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import urls as core_urls
+from core.management.datos_prueba import percentil
+
+
+class Command(BaseCommand):
+    help = "Resumir el log de metricas de consultas en p50/p95 por nombre de URL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--archivo", default="", help="Log JSONL a leer (por defecto QUERY_METRICS_LOG y sus rotaciones)")
+        parser.add_argument("--orden", choices=["p95", "consultas", "peticiones"], default="p95")
+        parser.add_argument("--todas", action="store_true", help="Incluir las URLs de core/urls.py sin peticiones registradas")
+
+    def handle(self, *args, **options):
+        base = options["archivo"] or str(settings.QUERY_METRICS_LOG)
+        archivos = sorted(glob.glob(f"{glob.escape(base)}*"))
+        por_vista = {}
+        for archivo in archivos:
+            with open(archivo, encoding="utf-8") as fh:
+                for linea in fh:
+                    try:
+                        fila = json.loads(linea)
+                    except ValueError:
+                        continue
+                    datos = por_vista.setdefault(fila.get("vista") or "(sin nombre)", {"total": [], "consultas": [], "db": []})
+                    datos["total"].append(fila.get("total_ms", 0))
+                    datos["consultas"].append(fila.get("consultas", 0))
+                    datos["db"].append(fila.get("db_ms", 0))
+
+        if options["todas"]:
+            for patron in core_urls.urlpatterns:
+                nombre = getattr(patron, "name", None)
+                if nombre:
+                    por_vista.setdefault(nombre, {"total": [], "consultas": [], "db": []})
+
+        if not por_vista:
+            self.stdout.write(self.style.WARNING(f"No hay metricas en {base}."))
+            return
+
+        filas = []
+        for vista, datos in por_vista.items():
+            total, consultas, db = (datos[k] for k in ("total", "consultas", "db"))
+            filas.append({
+                "vista": vista,
+                "peticiones": len(total),
+                "p50": percentil(total, 50),
+                "p95": percentil(total, 95),
+                "consultas_p50": percentil(consultas, 50),
+                "consultas_p95": percentil(consultas, 95),
+                "db_p95": percentil(db, 95),
+            })
+        clave = {"p95": "p95", "consultas": "consultas_p95", "peticiones": "peticiones"}[options["orden"]]
+        filas.sort(key=lambda f: f[clave], reverse=True)
+
+        self.stdout.write(
+            f"{'vista':<32} {'peticiones':>10} {'p50 ms':>9} {'p95 ms':>9} {'sql p50':>8} {'sql p95':>8} {'db p95 ms':>10}"
+        )
+        for f in filas:
+            self.stdout.write(
+                f"{f['vista']:<32} {f['peticiones']:>10} {f['p50']:>9.1f} {f['p95']:>9.1f} "
+                f"{f['consultas_p50']:>8} {f['consultas_p95']:>8} {f['db_p95']:>10.1f}"
+            )
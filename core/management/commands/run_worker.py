@@ -0,0 +1,53 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.tareas import ejecutar, tomar
+
+
+class Command(BaseCommand):
+    help = "Ejecutar las tareas en segundo plano (webhooks de pago) con N hilos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hilos", type=int, default=2)
+        parser.add_argument("--continuo", action="store_true", help="Seguir esperando tareas hasta detenerlo")
+        parser.add_argument("--intervalo", type=float, default=1, help="Segundos de espera con la cola vacia (--continuo)")
+
+    def _trabajar(self, continuo, intervalo, contador):
+        try:
+            while True:
+                tarea = tomar()
+                if tarea is None:
+                    if not continuo:
+                        return
+                    time.sleep(intervalo)
+                    continue
+                ok = ejecutar(tarea)
+                with contador["lock"]:
+                    contador["ok" if ok else "error"] += 1
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        contador = {"ok": 0, "error": 0, "lock": threading.Lock()}
+        hilos = [
+            threading.Thread(
+                target=self._trabajar,
+                args=(options["continuo"], options["intervalo"], contador),
+                daemon=True,
+            )
+            for _ in range(max(options["hilos"], 1))
+        ]
+        for hilo in hilos:
+            hilo.start()
+        try:
+            for hilo in hilos:
+                hilo.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Deteniendo worker...")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Tareas completadas: {contador['ok']}, con error: {contador['error']}."
+        ))
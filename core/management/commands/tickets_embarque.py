@@ -0,0 +1,50 @@
+import time as time_mod
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import embarque
+from core.models import EmpresaConfig
+
+
+class Command(BaseCommand):
+    help = "Generar el manifiesto y los tickets de una salida o de todas las salidas de un dia (PDF unico o ZIP)"
+
+    def add_arguments(self, parser):
+        destino = parser.add_mutually_exclusive_group(required=True)
+        destino.add_argument("--salida", type=int, help="Id de la SalidaTour")
+        destino.add_argument("--fecha", help="Fecha AAAA-MM-DD: todas las salidas del dia")
+        parser.add_argument("--formato", choices=embarque.FORMATOS, default="pdf")
+        parser.add_argument("--archivo", default="", help="Archivo de salida (por defecto embarque_<salida|dia>.<formato>)")
+        parser.add_argument(
+            "--procesos", type=int, default=None,
+            help="Procesos para los tickets del ZIP (por defecto TICKETS_LOTE_PROCESOS)",
+        )
+
+    def handle(self, *args, **options):
+        fecha = None
+        if options["fecha"]:
+            try:
+                fecha = datetime.strptime(options["fecha"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("Fecha invalida, usa AAAA-MM-DD.")
+
+        inicio = time_mod.perf_counter()
+        empresa = EmpresaConfig.objects.filter(id=1).first()
+        grupos = embarque.lote(salida_id=options["salida"], fecha=fecha)
+        if not grupos:
+            raise CommandError("No hay reservas que embarquen en esa salida o fecha.")
+
+        if options["formato"] == "zip":
+            contenido = embarque.zip_tickets(grupos, empresa, procesos=options["procesos"])
+        else:
+            contenido = embarque.pdf(grupos, empresa)
+        archivo = options["archivo"] or embarque.nombre_archivo(options["formato"], options["salida"], fecha)
+        with open(archivo, "wb") as destino:
+            destino.write(contenido)
+
+        reservas = sum(len(filas) for _, filas in grupos)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(grupos)} salidas, {reservas} tickets -> {archivo} "
+            f"({len(contenido) / 1024:.0f} KB, {time_mod.perf_counter() - inicio:.2f}s)"
+        ))
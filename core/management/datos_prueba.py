@@ -0,0 +1,254 @@
+"""Datos sinteticos para los comandos de benchmark y estres.
+
+Todo se inserta con bulk_create en lotes, por lo que no pasa por los save()
+de los modelos: los indices derivados (DisponibilidadSalida, ActividadDia) y la apertura
+del libro de cupos se llenan aqui mismo.
+"""
+import math
+import random
+from contextlib import contextmanager
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import Group, User
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.utils import timezone
+
+from core.models import Destino, Tour, SalidaTour, DisponibilidadSalida, MovimientoCupo, Reserva, ActividadDia, Pago
+
+GROUP_SECRETARIA = "secretaria"
+GROUP_AGENCIA = "agencia"
+PREFIJO = "bench"
+
+ESTADOS_RESERVA = (
+    ("pagada", 55),
+    ("pendiente", 25),
+    ("confirmada", 8),
+    ("cancelada", 7),
+    ("bloqueada_por_agencia", 5),
+)
+PROVEEDORES = ("lemonsqueezy", "paypal", "efectivo")
+
+
+def percentil(valores, p):
+    """Percentil por rango mas cercano; 0.0 si no hay valores."""
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    k = max(int(math.ceil(p / 100 * len(ordenados))) - 1, 0)
+    return ordenados[k]
+
+
+@contextmanager
+def base_de_datos_aislada(archivo=None, keepdb=False, verbosity=0):
+    """Crea (y luego destruye) una base de pruebas migrada para no tocar datos reales.
+
+    En SQLite la base de pruebas es en memoria salvo que se indique `archivo`;
+    en PostgreSQL es test_<nombre> en el mismo servidor. Las replicas (TEST
+    MIRROR) se apuntan a la base de pruebas para no leer datos reales.
+    """
+    nombre_original = connection.settings_dict["NAME"]
+    if archivo and connection.vendor == "sqlite":
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = archivo
+    nombre = connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False, keepdb=keepdb,
+    )
+    espejos = {}
+    for alias in connections:
+        if alias != DEFAULT_DB_ALIAS and connections[alias].settings_dict.get("TEST", {}).get("MIRROR") == DEFAULT_DB_ALIAS:
+            # Se cambia el dict en su lugar: lo comparten las conexiones de todos los hilos
+            espejos[alias] = dict(connections.settings[alias])
+            connections[alias].close()
+            connections.settings[alias].update(connection.settings_dict)
+    try:
+        yield nombre
+    finally:
+        for alias, original in espejos.items():
+            connections[alias].close()
+            connections.settings[alias].clear()
+            connections.settings[alias].update(original)
+        connection.creation.destroy_test_db(nombre_original, verbosity=verbosity, keepdb=keepdb)
+
+
+def _elegir_estado(rnd):
+    umbral = rnd.uniform(0, 100)
+    acumulado = 0
+    for estado, peso in ESTADOS_RESERVA:
+        acumulado += peso
+        if umbral <= acumulado:
+            return estado
+    return ESTADOS_RESERVA[0][0]
+
+
+def _log(stdout, msg):
+    if stdout is not None:
+        stdout.write(msg)
+
+
+def crear_usuarios(secretarias=10, agencias=5, turistas=200, password=None):
+    """Crea usuarios de prueba por rol y devuelve un dict rol -> lista de User."""
+    group_secretaria, _ = Group.objects.get_or_create(name=GROUP_SECRETARIA)
+    group_agencia, _ = Group.objects.get_or_create(name=GROUP_AGENCIA)
+
+    def _crear(rol, cantidad):
+        usuarios = [
+            User(username=f"{PREFIJO}_{rol}_{i}", email=f"{rol}{i}@{PREFIJO}.local", first_name=rol.title())
+            for i in range(cantidad)
+        ]
+        for u in usuarios:
+            if password:
+                u.set_password(password)
+            else:
+                u.set_unusable_password()
+        User.objects.bulk_create(usuarios, ignore_conflicts=True)
+        return list(User.objects.filter(username__startswith=f"{PREFIJO}_{rol}_").order_by("id"))
+
+    usuarios = {
+        "secretaria": _crear("secretaria", secretarias),
+        "agencia": _crear("agencia", agencias),
+        "turista": _crear("turista", turistas),
+    }
+    group_secretaria.user_set.add(*usuarios["secretaria"])
+    group_agencia.user_set.add(*usuarios["agencia"])
+    return usuarios
+
+
+def crear_catalogo(destinos=3, tours_por_destino=3, dias=365, desde=None, cupo_maximo=16, batch=5000):
+    """Destinos, tours con dos turnos diarios y un rango de salidas por tour."""
+    desde = desde or timezone.localdate()
+    lista_destinos = Destino.objects.bulk_create([
+        Destino(nombre=f"{PREFIJO} destino {i}", imagen_url="https://example.com/destino.jpg")
+        for i in range(destinos)
+    ])
+    tours = []
+    for destino in lista_destinos:
+        for j in range(tours_por_destino):
+            tours.append(Tour(
+                nombre=f"{PREFIJO} tour {destino.id}-{j}",
+                destino=destino,
+                descripcion="Tour generado para pruebas de carga.",
+                precio=Decimal("80.00"),
+                precio_adulto=Decimal("80.00"),
+                precio_nino=Decimal("70.00"),
+                cupo_maximo=cupo_maximo,
+                cupos_disponibles=cupo_maximo,
+                hora_turno_1=time(8, 0),
+                hora_turno_2=time(14, 0),
+            ))
+    tours = Tour.objects.bulk_create(tours)
+
+    salidas = []
+    for tour in tours:
+        for d in range(dias):
+            fecha = desde + timedelta(days=d)
+            for hora in (tour.hora_turno_1, tour.hora_turno_2):
+                salidas.append(SalidaTour(
+                    tour=tour, fecha=fecha, hora=hora,
+                    cupo_maximo=cupo_maximo, cupos_disponibles=cupo_maximo,
+                ))
+    salidas = SalidaTour.objects.bulk_create(salidas, batch_size=batch)
+    destino_por_tour = {t.id: t.destino_id for t in tours}
+    DisponibilidadSalida.objects.bulk_create(
+        [
+            DisponibilidadSalida(
+                salida_id=s.id, destino_id=destino_por_tour[s.tour_id],
+                fecha=s.fecha, hora=s.hora, cupos_disponibles=s.cupos_disponibles,
+            )
+            for s in salidas
+        ],
+        batch_size=batch,
+    )
+    MovimientoCupo.objects.bulk_create(
+        [MovimientoCupo(salida_id=s.id, tipo="apertura", delta=s.cupos_disponibles) for s in salidas],
+        batch_size=batch,
+    )
+    ActividadDia.objects.bulk_create(
+        [
+            ActividadDia(fecha=s.fecha, tipo="salida", dt=ActividadDia._dt_salida(s)[1], salida_id=s.id, autor_nombre="sistema")
+            for s in salidas
+        ],
+        batch_size=batch,
+    )
+    return lista_destinos, tours, salidas
+
+
+def crear_reservas(salidas, usuarios, cantidad, batch=5000, con_pagos=True, seed=42, stdout=None):
+    """Reservas repartidas en salidas y en el ultimo anio, con sus pagos."""
+    rnd = random.Random(seed)
+    ahora = timezone.now()
+    secretarias = usuarios.get("secretaria") or [None]
+    agencias = usuarios.get("agencia") or [None]
+    turistas = usuarios.get("turista") or [None]
+    creadas = 0
+    while creadas < cantidad:
+        lote = []
+        for _ in range(min(batch, cantidad - creadas)):
+            salida = rnd.choice(salidas)
+            estado = _elegir_estado(rnd)
+            adultos = rnd.randint(1, 4)
+            ninos = rnd.randint(0, 2)
+            origen = rnd.random()
+            creado_por = rnd.choice(secretarias) if origen < 0.3 else None
+            usuario = rnd.choice(agencias) if estado == "bloqueada_por_agencia" else (
+                rnd.choice(turistas) if origen >= 0.3 else None
+            )
+            fecha_reserva = ahora - timedelta(minutes=rnd.randint(0, 365 * 24 * 60))
+            lote.append(Reserva(
+                usuario=usuario,
+                salida=salida,
+                adultos=adultos,
+                ninos=ninos,
+                total_pagar=Decimal(adultos * 80 + ninos * 70),
+                estado=estado,
+                fecha_reserva=fecha_reserva,
+                creado_por=creado_por,
+                codigo_agencia=f"V-{rnd.randint(1000, 9999)}" if estado == "bloqueada_por_agencia" else None,
+                limite_pago_agencia=fecha_reserva + timedelta(days=15) if estado == "bloqueada_por_agencia" else None,
+                nombre=f"Cliente {rnd.randint(1, 99999)}",
+                apellidos="Prueba",
+                correo=f"cliente{rnd.randint(1, 99999)}@{PREFIJO}.local",
+                telefono="0990000000",
+                identificacion=str(rnd.randint(1000000000, 1999999999)),
+            ))
+        lote = Reserva.objects.bulk_create(lote, batch_size=batch)
+        nombres = {u.id: u.username for u in (*secretarias, *agencias, *turistas) if u is not None}
+        actividades = {
+            r.id: ActividadDia(
+                fecha=timezone.localdate(r.fecha_reserva), tipo="reserva", dt=r.fecha_reserva, reserva_id=r.id,
+                autor_id=r.creado_por_id,
+                autor_nombre=nombres.get(r.creado_por_id or r.usuario_id, "web"),
+            )
+            for r in lote
+        }
+        if con_pagos:
+            pagos = []
+            for reserva in lote:
+                if reserva.estado == "pagada":
+                    proveedor = "efectivo" if reserva.creado_por_id else rnd.choice(PROVEEDORES[:2])
+                    pagos.append(Pago(
+                        reserva=reserva, proveedor=proveedor, estado="paid",
+                        monto=reserva.total_pagar, external_id=f"{proveedor[:2]}-{reserva.id}",
+                    ))
+                    actividades[reserva.id].metodo_pago = dict(Pago.PROVEEDORES)[proveedor]
+                elif reserva.estado == "pendiente" and rnd.random() < 0.5:
+                    proveedor = rnd.choice(PROVEEDORES[:2])
+                    pagos.append(Pago(
+                        reserva=reserva, proveedor=proveedor, estado="created",
+                        monto=reserva.total_pagar, external_id=f"{proveedor[:2]}-chk-{reserva.id}",
+                    ))
+            Pago.objects.bulk_create(pagos, batch_size=batch)
+        ActividadDia.objects.bulk_create(actividades.values(), batch_size=batch)
+        creadas += len(lote)
+        _log(stdout, f"  reservas: {creadas}/{cantidad}")
+    return creadas
+
+
+def sembrar(reservas=10000, dias=365, destinos=3, tours_por_destino=3, batch=5000, seed=42, stdout=None,
+            password=None):
+    """Carga completa: usuarios, catalogo, salidas y reservas con pagos."""
+    usuarios = crear_usuarios(password=password)
+    _log(stdout, "Usuarios creados.")
+    _, tours, salidas = crear_catalogo(destinos=destinos, tours_por_destino=tours_por_destino, dias=dias, batch=batch)
+    _log(stdout, f"Catalogo creado: {len(tours)} tours, {len(salidas)} salidas.")
+    crear_reservas(salidas, usuarios, reservas, batch=batch, seed=seed, stdout=stdout)
+    return usuarios, tours, salidas
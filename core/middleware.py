@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+import time
+from contextlib import ExitStack
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from . import roles
+
+logger = logging.getLogger(__name__)
+
+_log_consultas = None
+
+
+def _logger_consultas():
+    """Logger propio que escribe una linea JSON por peticion en un archivo rotativo."""
+    global _log_consultas
+    if _log_consultas is None:
+        ruta = str(settings.QUERY_METRICS_LOG)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        handler = RotatingFileHandler(
+            ruta,
+            maxBytes=settings.QUERY_METRICS_MAX_BYTES,
+            backupCount=settings.QUERY_METRICS_BACKUPS,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log = logging.getLogger("core.metricas_consultas")
+        log.setLevel(logging.INFO)
+        log.propagate = False
+        log.addHandler(handler)
+        _log_consultas = log
+    return _log_consultas
+
+
+class _RegistroConsultas:
+    def __init__(self):
+        self.total = 0
+        self.tiempo_ms = 0.0
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            self.total += 1
+            self.tiempo_ms += ms
+            self.consultas.append((ms, sql))
+
+    def mas_lentas(self, n):
+        return sorted(self.consultas, key=lambda c: c[0], reverse=True)[:n]
+
+
+class MetricasConsultasMiddleware:
+    """Cuenta las consultas SQL y su tiempo por peticion.
+
+    Agrega un encabezado Server-Timing (visible en las DevTools del navegador)
+    y escribe una linea en QUERY_METRICS_LOG que resume el comando
+    resumen_consultas.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "QUERY_METRICS_ENABLED", False):
+            return self.get_response(request)
+
+        registro = _RegistroConsultas()
+        inicio = time.perf_counter()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(registro))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - inicio) * 1000
+
+        match = getattr(request, "resolver_match", None)
+        vista = match.url_name if match and match.url_name else ""
+        response["Server-Timing"] = (
+            f'db;dur={registro.tiempo_ms:.1f};desc="{registro.total} consultas", '
+            f"total;dur={total_ms:.1f}"
+        )
+
+        umbral = getattr(settings, "QUERY_METRICS_SLOW_MS", 100)
+        lentas = registro.mas_lentas(getattr(settings, "QUERY_METRICS_TOP", 5))
+        for ms, sql in lentas:
+            if ms >= umbral:
+                logger.warning("Consulta lenta (%.1f ms) en %s: %s", ms, vista or request.path, sql[:500])
+
+        try:
+            _logger_consultas().info(json.dumps({
+                "ts": timezone.now().isoformat(),
+                "metodo": request.method,
+                "ruta": request.path,
+                "vista": vista,
+                "estado": response.status_code,
+                "total_ms": round(total_ms, 2),
+                "consultas": registro.total,
+                "db_ms": round(registro.tiempo_ms, 2),
+                "lentas": [{"ms": round(ms, 2), "sql": sql[:500]} for ms, sql in lentas],
+            }))
+        except OSError:
+            logger.exception("No se pudo escribir el log de consultas")
+        return response
+
+
+class RolesMiddleware:
+    """Con settings.ROLES_CACHE_SESION toma los roles del usuario de la sesion.
+
+    Va despues de AuthenticationMiddleware. Sin el ajuste los roles se cargan
+    igual una sola vez por peticion al primer es_secretaria/es_agencia.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if getattr(settings, "ROLES_CACHE_SESION", False):
+            roles.desde_sesion(request)
+        return self.get_response(request)
@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-17 15:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_disponibilidad(apps, schema_editor):
+    SalidaTour = apps.get_model("core", "SalidaTour")
+    DisponibilidadSalida = apps.get_model("core", "DisponibilidadSalida")
+    filas = [
+        DisponibilidadSalida(
+            salida_id=salida.id,
+            destino_id=salida.tour.destino_id,
+            fecha=salida.fecha,
+            hora=salida.hora,
+            cupos_disponibles=salida.cupos_disponibles,
+        )
+        for salida in SalidaTour.objects.select_related("tour").iterator()
+    ]
+    DisponibilidadSalida.objects.bulk_create(filas, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_reserva_turnos_agencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DisponibilidadSalida',
+            fields=[
+                ('salida', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='disponibilidad', serialize=False, to='core.salidatour')),
+                ('fecha', models.DateField()),
+                ('hora', models.TimeField(blank=True, null=True)),
+                ('cupos_disponibles', models.PositiveIntegerField(default=0)),
+                ('destino', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.destino')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['destino', 'fecha', 'cupos_disponibles'], name='disp_destino_fecha_cupos_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_disponibilidad, migrations.RunPython.noop),
+    ]
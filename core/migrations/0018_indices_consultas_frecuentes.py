@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-17 16:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_disponibilidadsalida'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['reserva', 'proveedor', 'external_id'], name='pago_reserva_prov_ext_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['reserva', 'proveedor', 'estado'], name='pago_reserva_prov_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['creado_por', 'fecha_reserva'], name='reserva_creador_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['estado', 'limite_pago_agencia'], name='reserva_estado_limite_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['usuario', 'estado'], name='reserva_usuario_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salidatour',
+            index=models.Index(fields=['tour', 'fecha', 'hora'], name='salida_tour_fecha_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salidatour',
+            index=models.Index(fields=['fecha', 'cupos_disponibles'], name='salida_fecha_cupos_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2 on 2026-10-17 16:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def abrir_libro(apps, schema_editor):
+    """Una apertura por salida mas una retencion por reserva que ya ocupa cupos.
+
+    La apertura se calcula para que el saldo del libro sea exactamente el
+    cupos_disponibles actual.
+    """
+    SalidaTour = apps.get_model("core", "SalidaTour")
+    Reserva = apps.get_model("core", "Reserva")
+    MovimientoCupo = apps.get_model("core", "MovimientoCupo")
+
+    retenciones = {}
+    for reserva in Reserva.objects.filter(estado__in=["pagada", "bloqueada_por_agencia"]).iterator():
+        personas = reserva.adultos + reserva.ninos
+        if personas:
+            retenciones.setdefault(reserva.salida_id, []).append(
+                MovimientoCupo(salida_id=reserva.salida_id, reserva_id=reserva.id, tipo="retencion",
+                               delta=-personas, motivo="Saldo inicial")
+            )
+
+    filas = []
+    for salida in SalidaTour.objects.iterator():
+        propias = retenciones.get(salida.id, [])
+        filas.append(MovimientoCupo(
+            salida_id=salida.id, tipo="apertura", motivo="Saldo inicial",
+            delta=salida.cupos_disponibles - sum(m.delta for m in propias),
+        ))
+        filas.extend(propias)
+    MovimientoCupo.objects.bulk_create(filas, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_indices_consultas_frecuentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoCupo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('apertura', 'Apertura'), ('retencion', 'Retencion'), ('liberacion', 'Liberacion'), ('ajuste', 'Ajuste manual')], max_length=20)),
+                ('delta', models.IntegerField()),
+                ('motivo', models.CharField(blank=True, default='', max_length=120)),
+                ('creado_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reserva', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_cupo', to='core.reserva')),
+                ('salida', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_cupo', to='core.salidatour')),
+            ],
+        ),
+        migrations.RunPython(abrir_libro, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-17 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_movimientocupo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reserva',
+            name='retencion_hasta',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['estado', 'retencion_hasta'], name='reserva_estado_retencion_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-17 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_reserva_retencion_hasta'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiarioSecretaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('reservas', models.IntegerField(default=0)),
+                ('pasajeros', models.IntegerField(default=0)),
+                ('importe', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('ventas_pagadas', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('efectivo', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'fecha'), name='resumen_secretaria_usuario_fecha_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2 on 2026-10-17 16:55
+
+from datetime import datetime, time
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def poblar_actividad(apps, schema_editor):
+    Reserva = apps.get_model("core", "Reserva")
+    SalidaTour = apps.get_model("core", "SalidaTour")
+    Pago = apps.get_model("core", "Pago")
+    ActividadDia = apps.get_model("core", "ActividadDia")
+    proveedores = {"lemonsqueezy": "Lemon Squeezy", "paypal": "PayPal", "efectivo": "Efectivo"}
+    tz = timezone.get_current_timezone()
+
+    metodo = {}
+    for reserva_id, proveedor in (
+        Pago.objects.filter(estado="paid").order_by("creado_en").values_list("reserva_id", "proveedor").iterator()
+    ):
+        metodo[reserva_id] = proveedores.get(proveedor, proveedor)
+
+    filas = []
+    for reserva in Reserva.objects.select_related("creado_por", "usuario").iterator():
+        if reserva.creado_por_id:
+            autor_nombre = reserva.creado_por.username
+        elif reserva.usuario_id:
+            autor_nombre = reserva.usuario.username
+        else:
+            autor_nombre = "web"
+        filas.append(ActividadDia(
+            fecha=timezone.localdate(reserva.fecha_reserva, tz),
+            tipo="reserva",
+            dt=reserva.fecha_reserva,
+            reserva_id=reserva.id,
+            autor_id=reserva.creado_por_id,
+            autor_nombre=autor_nombre,
+            metodo_pago=metodo.get(reserva.id, "Pendiente"),
+        ))
+    for salida in SalidaTour.objects.select_related("creado_por").iterator():
+        filas.append(ActividadDia(
+            fecha=salida.fecha,
+            tipo="salida",
+            dt=timezone.make_aware(datetime.combine(salida.fecha, salida.hora or time.min), tz),
+            salida_id=salida.id,
+            autor_id=salida.creado_por_id,
+            autor_nombre=salida.creado_por.username if salida.creado_por_id else "sistema",
+        ))
+    ActividadDia.objects.bulk_create(filas, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_resumendiariosecretaria'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActividadDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo', models.CharField(choices=[('reserva', 'Reserva'), ('salida', 'Salida')], max_length=10)),
+                ('dt', models.DateTimeField()),
+                ('autor_nombre', models.CharField(blank=True, default='', max_length=150)),
+                ('metodo_pago', models.CharField(default='Pendiente', max_length=30)),
+                ('autor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('reserva', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='actividad', to='core.reserva')),
+                ('salida', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='actividad', to='core.salidatour')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha', 'autor'], name='actividad_fecha_autor_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_actividad, migrations.RunPython.noop),
+    ]
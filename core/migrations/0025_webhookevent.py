@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-17 17:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_tarea'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('proveedor', models.CharField(choices=[('lemonsqueezy', 'Lemon Squeezy'), ('paypal', 'PayPal'), ('efectivo', 'Efectivo')], max_length=20)),
+                ('event_id', models.CharField(max_length=150)),
+                ('tipo', models.CharField(blank=True, default='', max_length=80)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('estado', models.CharField(choices=[('recibido', 'Recibido'), ('procesado', 'Procesado'), ('ignorado', 'Ignorado'), ('error', 'Error')], default='recibido', max_length=20)),
+                ('resultado', models.TextField(blank=True, default='')),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('duplicados', models.PositiveIntegerField(default=0)),
+                ('duracion_ms', models.FloatField(blank=True, null=True)),
+                ('recibido_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('procesado_en', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('proveedor', 'event_id'), name='webhook_proveedor_evento_uniq')],
+            },
+        ),
+    ]
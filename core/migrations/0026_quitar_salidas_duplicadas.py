@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-17 17:37
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def quitar_duplicadas(apps, schema_editor):
+    """Borra las salidas repetidas (mismo tour, fecha y hora) que no tienen reservas.
+
+    Si dos copias de la misma salida ya tienen reservas no se pueden fusionar
+    sin reacomodar cupos: la migracion se detiene para resolverlo a mano.
+    """
+    SalidaTour = apps.get_model("core", "SalidaTour")
+    Reserva = apps.get_model("core", "Reserva")
+    grupos = (
+        SalidaTour.objects.filter(hora__isnull=False)
+        .values("tour_id", "fecha", "hora")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+    )
+    conflictos = []
+    for grupo in grupos:
+        ids = list(
+            SalidaTour.objects.filter(tour_id=grupo["tour_id"], fecha=grupo["fecha"], hora=grupo["hora"])
+            .order_by("id").values_list("id", flat=True)
+        )
+        con_reservas = set(Reserva.objects.filter(salida_id__in=ids).values_list("salida_id", flat=True))
+        if len(con_reservas) > 1:
+            conflictos.append(sorted(con_reservas))
+            continue
+        conservar = min(con_reservas) if con_reservas else ids[0]
+        SalidaTour.objects.filter(id__in=[i for i in ids if i != conservar]).delete()
+    if conflictos:
+        raise RuntimeError(
+            "Salidas repetidas con reservas en mas de una copia; mover las reservas a una sola y volver a migrar: "
+            + "; ".join(", ".join(str(i) for i in ids) for ids in conflictos)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_webhookevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(quitar_duplicadas, migrations.RunPython.noop),
+    ]
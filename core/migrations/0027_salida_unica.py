@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 17:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Aparte de 0026: en PostgreSQL el borrado deja triggers de FK pendientes
+    # y no se puede alterar la tabla en la misma transaccion
+    dependencies = [
+        ('core', '0026_quitar_salidas_duplicadas'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='salidatour',
+            name='salida_tour_fecha_hora_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='salidatour',
+            constraint=models.UniqueConstraint(fields=('tour', 'fecha', 'hora'), name='salida_tour_fecha_hora_uniq'),
+        ),
+    ]
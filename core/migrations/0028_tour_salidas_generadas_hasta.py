@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_salida_unica'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tour',
+            name='salidas_generadas_hasta',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+    ]
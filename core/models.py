@@ -9,6 +9,8 @@ from django.utils import timezone
 
 from django.db import models
 
+from datetime import date, datetime, time
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -36,10 +38,18 @@ class Tour(models.Model):
     # Horarios automáticos cada día
     hora_turno_1 = models.TimeField(null=True, blank=True, verbose_name="Hora Turno 1")
     hora_turno_2 = models.TimeField(null=True, blank=True, verbose_name="Hora Turno 2")
+    # Hasta donde materialize_salidas ya genero salidas de los turnos; lo que se
+    # borre antes de esta fecha (p. ej. limpiar salidas vacias) no se regenera
+    salidas_generadas_hasta = models.DateField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.nombre} - {self.destino.nombre}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Si el tour cambia de destino, el indice de disponibilidad debe seguirlo
+        DisponibilidadSalida.objects.filter(salida__tour=self).exclude(destino_id=self.destino_id).update(destino_id=self.destino_id)
+
     def precio_adulto_final(self):
         return self.precio_adulto if self.precio_adulto and self.precio_adulto > 0 else self.precio
 
@@ -56,15 +66,99 @@ class SalidaTour(models.Model):
     duracion = models.CharField(max_length=100, blank=True, null=True, verbose_name="Duración", help_text="Ej: Medio día (4 horas)")
     creado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="salidas_creadas")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["fecha", "cupos_disponibles"], name="salida_fecha_cupos_idx"),
+        ]
+        constraints = [
+            # Tambien es el indice de las busquedas por (tour, fecha, hora); core.programacion
+            # inserta en bloque con ignore_conflicts contra ella
+            models.UniqueConstraint(fields=["tour", "fecha", "hora"], name="salida_tour_fecha_hora_uniq"),
+        ]
+
     def __str__(self):
         # Mostramos la hora en el string para identificarla en el admin
         hora_str = self.hora.strftime('%I:%M %p') if self.hora else "Sin hora"
         return f"{self.tour.nombre} - {self.fecha} ({hora_str})"
 
+    def save(self, *args, **kwargs):
+        es_nueva = self._state.adding
+        super().save(*args, **kwargs)
+        DisponibilidadSalida.sincronizar(self, update_fields=kwargs.get("update_fields"))
+        ActividadDia.sincronizar_salida(self, es_nueva)
+        if es_nueva:
+            MovimientoCupo.objects.create(salida=self, tipo="apertura", delta=self.cupos_disponibles)
+
     def hay_cupo(self, adultos, ninos):
         total = adultos + ninos
         return self.cupos_disponibles >= total
 
+
+class DisponibilidadSalida(models.Model):
+    """Indice materializado de cupos por (destino, fecha) para la busqueda publica.
+
+    Se mantiene al dia desde SalidaTour.save(); las actualizaciones masivas
+    (queryset.update) deben llamar a sincronizar() o al comando
+    reconstruir_disponibilidad.
+    """
+    salida = models.OneToOneField(SalidaTour, on_delete=models.CASCADE, primary_key=True, related_name="disponibilidad")
+    destino = models.ForeignKey(Destino, on_delete=models.CASCADE, related_name="+")
+    fecha = models.DateField()
+    hora = models.TimeField(null=True, blank=True)
+    cupos_disponibles = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["destino", "fecha", "cupos_disponibles"], name="disp_destino_fecha_cupos_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.salida_id} - {self.fecha} ({self.cupos_disponibles})"
+
+    @classmethod
+    def sincronizar(cls, salida, update_fields=None):
+        """Copia la salida al indice.
+
+        Si se guardo con update_fields sin cupos_disponibles, el saldo se lee de
+        la base: el de memoria puede ser anterior a un UPDATE con F() de core.cupos.
+        """
+        cupos_disponibles = salida.cupos_disponibles
+        if update_fields is not None and "cupos_disponibles" not in update_fields:
+            cupos_disponibles = SalidaTour.objects.values_list("cupos_disponibles", flat=True).get(pk=salida.pk)
+        cls.objects.update_or_create(
+            salida_id=salida.pk,
+            defaults={
+                "destino_id": salida.tour.destino_id,
+                "fecha": salida.fecha,
+                "hora": salida.hora,
+                "cupos_disponibles": cupos_disponibles,
+            },
+        )
+
+class MovimientoCupo(models.Model):
+    """Libro de solo insercion con cada cambio de cupos de una salida.
+
+    La suma de `delta` por salida debe coincidir con cupos_disponibles; las
+    retenciones son negativas y las liberaciones positivas. Se escribe desde
+    core.cupos, nunca a mano.
+    """
+    TIPOS = (
+        ("apertura", "Apertura"),
+        ("retencion", "Retencion"),
+        ("liberacion", "Liberacion"),
+        ("ajuste", "Ajuste manual"),
+    )
+
+    salida = models.ForeignKey(SalidaTour, on_delete=models.CASCADE, related_name="movimientos_cupo")
+    reserva = models.ForeignKey("Reserva", on_delete=models.SET_NULL, null=True, blank=True, related_name="movimientos_cupo")
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    delta = models.IntegerField()
+    motivo = models.CharField(max_length=120, blank=True, default="")
+    creado_en = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.delta:+d} - Salida {self.salida_id}"
+
 class Reserva(models.Model):
     # --- CAMBIO: Se agrega "pagada" a los ESTADOS ---
     ESTADOS = (
@@ -88,6 +182,8 @@ class Reserva(models.Model):
     archivo_agencia = models.FileField(upload_to='agencia_vouchers/', null=True, blank=True)
     codigo_agencia = models.CharField(max_length=50, null=True, blank=True)
     limite_pago_agencia = models.DateTimeField(null=True, blank=True)
+    # Cupos retenidos mientras la reserva web espera el pago (ver core.cupos)
+    retencion_hasta = models.DateTimeField(null=True, blank=True)
 
     # Datos del cliente
     nombre = models.CharField(max_length=100)
@@ -96,10 +192,126 @@ class Reserva(models.Model):
     telefono = models.CharField(max_length=30)
     identificacion = models.CharField(max_length=50)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["creado_por", "fecha_reserva"], name="reserva_creador_fecha_idx"),
+            models.Index(fields=["estado", "limite_pago_agencia"], name="reserva_estado_limite_idx"),
+            models.Index(fields=["usuario", "estado"], name="reserva_usuario_estado_idx"),
+            models.Index(fields=["estado", "retencion_hasta"], name="reserva_estado_retencion_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        es_nueva = self._state.adding
+        super().save(*args, **kwargs)
+        if es_nueva:
+            ActividadDia.registrar_reserva(self)
+
     def total_personas(self):
         return self.adultos + self.ninos
 
 
+class ActividadDia(models.Model):
+    """Agenda diaria del panel: una fila por reserva creada o salida programada.
+
+    Las reservas cuentan el dia en que se crearon y las salidas el dia en que
+    salen. Estado, monto y cupos se leen en vivo desde la reserva o la salida;
+    aqui solo se guarda lo que cuesta calcular (autor y metodo de pago), asi
+    que el panel lee un solo dia sin recorrer el historial.
+    """
+    TIPOS = (
+        ("reserva", "Reserva"),
+        ("salida", "Salida"),
+    )
+
+    fecha = models.DateField()
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    dt = models.DateTimeField()
+    reserva = models.OneToOneField(Reserva, on_delete=models.CASCADE, null=True, blank=True, related_name="actividad")
+    salida = models.OneToOneField(SalidaTour, on_delete=models.CASCADE, null=True, blank=True, related_name="actividad")
+    # Usuario que la creo desde el panel (creado_por); autor_nombre incluye tambien web/agencias
+    autor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    autor_nombre = models.CharField(max_length=150, blank=True, default="")
+    metodo_pago = models.CharField(max_length=30, default="Pendiente")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["fecha", "autor"], name="actividad_fecha_autor_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.tipo} #{self.reserva_id or self.salida_id}"
+
+    @staticmethod
+    def _dt_salida(salida):
+        fecha, hora = salida.fecha, salida.hora or time.min
+        if isinstance(fecha, str):
+            fecha = date.fromisoformat(fecha)
+        if isinstance(hora, str):
+            hora = time.fromisoformat(hora)
+        return fecha, timezone.make_aware(datetime.combine(fecha, hora), timezone.get_current_timezone())
+
+    @classmethod
+    def registrar_reserva(cls, reserva):
+        if reserva.creado_por_id:
+            autor_nombre = reserva.creado_por.username
+        elif reserva.usuario_id:
+            autor_nombre = reserva.usuario.username
+        else:
+            autor_nombre = "web"
+        cls.objects.create(
+            fecha=timezone.localdate(reserva.fecha_reserva),
+            tipo="reserva",
+            dt=reserva.fecha_reserva,
+            reserva=reserva,
+            autor_id=reserva.creado_por_id,
+            autor_nombre=autor_nombre,
+        )
+
+    @classmethod
+    def sincronizar_salida(cls, salida, es_nueva=False):
+        fecha, dt = cls._dt_salida(salida)
+        if not es_nueva:
+            # La fecha u hora pudieron cambiar al editar la salida
+            if cls.objects.filter(salida_id=salida.pk).update(fecha=fecha, dt=dt):
+                return
+        cls.objects.create(
+            fecha=fecha,
+            tipo="salida",
+            dt=dt,
+            salida=salida,
+            autor_id=salida.creado_por_id,
+            autor_nombre=salida.creado_por.username if salida.creado_por_id else "sistema",
+        )
+
+    @classmethod
+    def registrar_pago(cls, reserva, proveedor):
+        cls.objects.filter(reserva_id=reserva.pk).update(metodo_pago=dict(Pago.PROVEEDORES).get(proveedor, proveedor))
+
+
+class ResumenDiarioSecretaria(models.Model):
+    """Totales por usuario creador y dia de creacion de la reserva.
+
+    Opcional (settings.SECRETARIA_RESUMEN_DIARIO): se actualiza de forma
+    incremental desde core.resumenes y se reconstruye con el comando
+    reconstruir_resumen_secretarias.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    fecha = models.DateField()
+    reservas = models.IntegerField(default=0)
+    pasajeros = models.IntegerField(default=0)
+    importe = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    ventas_pagadas = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    efectivo = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["usuario", "fecha"], name="resumen_secretaria_usuario_fecha_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.usuario_id} - {self.fecha}"
+
+
 class Pago(models.Model):
     PROVEEDORES = (
         ("lemonsqueezy", "Lemon Squeezy"),
@@ -127,10 +339,111 @@ class Pago(models.Model):
 
     class Meta:
         ordering = ("-creado_en",)
+        indexes = [
+            models.Index(fields=["reserva", "proveedor", "external_id"], name="pago_reserva_prov_ext_idx"),
+            models.Index(fields=["reserva", "proveedor", "estado"], name="pago_reserva_prov_estado_idx"),
+        ]
 
     def __str__(self):
         return f"{self.proveedor} #{self.id} - Reserva {self.reserva_id}"
 
+
+class CorreoPendiente(models.Model):
+    """Bandeja de salida: las vistas encolan y enviar_correos los manda por lotes.
+
+    Con `adjuntar_ticket` el PDF de la reserva se adjunta al enviar, no al encolar.
+    """
+    ESTADOS = (
+        ("pendiente", "Pendiente"),
+        ("enviando", "Enviando"),
+        ("enviado", "Enviado"),
+        ("fallido", "Fallido"),
+    )
+
+    asunto = models.CharField(max_length=255)
+    texto = models.TextField(blank=True, default="")
+    html = models.TextField(blank=True, default="")
+    remitente = models.CharField(max_length=255, blank=True, default="")
+    para = models.JSONField(default=list)
+    bcc = models.JSONField(default=list, blank=True)
+    reserva = models.ForeignKey(Reserva, on_delete=models.SET_NULL, null=True, blank=True, related_name="correos")
+    adjuntar_ticket = models.BooleanField(default=False)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default="pendiente")
+    intentos = models.PositiveIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    ultimo_error = models.TextField(blank=True, default="")
+    creado_en = models.DateTimeField(default=timezone.now)
+    enviado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["estado", "proximo_intento"], name="correo_estado_proximo_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.asunto} ({self.get_estado_display()})"
+
+
+class Tarea(models.Model):
+    """Trabajo en segundo plano: run_worker llama a `funcion` (ruta importable) con `datos`."""
+    ESTADOS = (
+        ("pendiente", "Pendiente"),
+        ("ejecutando", "Ejecutando"),
+        ("completada", "Completada"),
+        ("fallida", "Fallida"),
+    )
+
+    funcion = models.CharField(max_length=200)
+    datos = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default="pendiente")
+    intentos = models.PositiveIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    ultimo_error = models.TextField(blank=True, default="")
+    creado_en = models.DateTimeField(default=timezone.now)
+    terminado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["estado", "proximo_intento"], name="tarea_estado_proximo_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.funcion} #{self.id} ({self.get_estado_display()})"
+
+
+class WebhookEvent(models.Model):
+    """Cada entrega de webhook de pago, una sola vez por (proveedor, event_id).
+
+    El indice unico descarta los reenvios del proveedor antes de encolar nada;
+    resultado y duracion_ms quedan para diagnostico y para reprocesar desde el admin.
+    """
+    ESTADOS = (
+        ("recibido", "Recibido"),
+        ("procesado", "Procesado"),
+        ("ignorado", "Ignorado"),
+        ("error", "Error"),
+    )
+
+    proveedor = models.CharField(max_length=20, choices=Pago.PROVEEDORES)
+    event_id = models.CharField(max_length=150)
+    tipo = models.CharField(max_length=80, blank=True, default="")
+    payload = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default="recibido")
+    resultado = models.TextField(blank=True, default="")
+    intentos = models.PositiveIntegerField(default=0)
+    duplicados = models.PositiveIntegerField(default=0)
+    duracion_ms = models.FloatField(null=True, blank=True)
+    recibido_en = models.DateTimeField(default=timezone.now)
+    procesado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["proveedor", "event_id"], name="webhook_proveedor_evento_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.proveedor} {self.tipo} {self.event_id}"
+
 # Los modelos Ticket y Resena se mantienen igual...
 
 class Ticket(models.Model):
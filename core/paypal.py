@@ -0,0 +1,187 @@
+"""Token OAuth y verificacion de webhooks de PayPal.
+
+El token dura horas (`expires_in`), asi que se guarda en memoria del proceso
+y en la cache de Django para que lo reusen todos los workers. Se renueva
+PAYPAL_TOKEN_MARGEN segundos antes de vencer y una sola vez a la vez: una
+clave `add()` en la cache marca quien lo renueva (el lock por proceso solo
+protege las lecturas y esa marca; nadie espera con el lock tomado).
+
+Los webhooks se verifican localmente con el certificado de PAYPAL-CERT-URL
+(solo hosts de PayPal por HTTPS, descargado una vez por URL) y la firma
+SHA256withRSA de "transmission_id|transmission_time|webhook_id|crc32(cuerpo)".
+"""
+import base64
+import hashlib
+import threading
+import time
+import zlib
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import urlsplit
+
+import rsa
+from django.conf import settings
+from django.core.cache import cache
+from pyasn1.codec.der import decoder as der_decoder
+from pyasn1_modules import rfc2459
+
+from . import proveedores
+
+_local = {}
+_lock = threading.Lock()
+
+
+def base_url():
+    if getattr(settings, "PAYPAL_API_URL", ""):
+        return settings.PAYPAL_API_URL.rstrip("/")
+    env = getattr(settings, "PAYPAL_ENV", "sandbox").lower()
+    return "https://api-m.paypal.com" if env == "live" else "https://api-m.sandbox.paypal.com"
+
+
+def _credenciales():
+    client_id = getattr(settings, "PAYPAL_CLIENT_ID", "")
+    client_secret = getattr(settings, "PAYPAL_CLIENT_SECRET", "")
+    if not client_id or not client_secret:
+        raise ValueError("PayPal no esta configurado.")
+    return client_id, client_secret
+
+
+def _clave(client_id):
+    huella = hashlib.sha1(f"{base_url()}|{client_id}".encode("utf-8")).hexdigest()[:16]
+    return f"paypal:token:{huella}"
+
+
+def _vigente(token, margen=0):
+    return bool(token) and token["expira"] - margen > time.time()
+
+
+def _pedir_token(client_id, client_secret):
+    response = proveedores.sesion("paypal").post(
+        f"{base_url()}/v1/oauth2/token",
+        auth=(client_id, client_secret),
+        data={"grant_type": "client_credentials"},
+        timeout=20,
+    )
+    response.raise_for_status()
+    data = response.json()
+    return {"valor": data["access_token"], "expira": time.time() + int(data.get("expires_in", 0))}
+
+
+def token_acceso():
+    client_id, client_secret = _credenciales()
+    clave = _clave(client_id)
+    margen = getattr(settings, "PAYPAL_TOKEN_MARGEN", 300)
+
+    token = _local.get(clave)
+    if _vigente(token, margen):
+        return token["valor"]
+
+    bandera = f"{clave}:renovando"
+    with _lock:
+        token = _local.get(clave)
+        if _vigente(token, margen):
+            return token["valor"]
+        token = cache.get(clave)
+        if _vigente(token, margen):
+            _local[clave] = token
+            return token["valor"]
+        propia = cache.add(bandera, 1, 30)
+
+    # Otro hilo o proceso ya lo esta renovando: usar el actual si aun sirve o
+    # esperarlo fuera del lock; si no llega, pedir uno sin tocar su bandera
+    if not propia:
+        if _vigente(token):
+            return token["valor"]
+        for _ in range(50):
+            time.sleep(0.1)
+            token = cache.get(clave)
+            if _vigente(token, margen):
+                _local[clave] = token
+                return token["valor"]
+
+    try:
+        token = _pedir_token(client_id, client_secret)
+    finally:
+        if propia:
+            cache.delete(bandera)
+    _local[clave] = token
+    cache.set(clave, token, max(int(token["expira"] - time.time()), 1))
+    return token["valor"]
+
+
+def invalidar_token():
+    """Descarta el token guardado, p. ej. si PayPal responde 401."""
+    try:
+        clave = _clave(_credenciales()[0])
+    except ValueError:
+        return
+    with _lock:
+        _local.pop(clave, None)
+    cache.delete(clave)
+
+
+HOSTS_CERTIFICADOS = ("api.paypal.com", "api.sandbox.paypal.com", "api-m.paypal.com", "api-m.sandbox.paypal.com")
+
+_certificados = {}
+
+
+def certificado(url):
+    """PEM del certificado de firma, descargado una vez por URL."""
+    partes = urlsplit(url)
+    if partes.scheme != "https" or partes.hostname not in HOSTS_CERTIFICADOS:
+        raise ValueError(f"URL de certificado no permitida: {url}")
+    pem = _certificados.get(url)
+    if pem is None:
+        clave = f"paypal:cert:{hashlib.sha1(url.encode('utf-8')).hexdigest()}"
+        pem = cache.get(clave)
+        if pem is None:
+            response = proveedores.sesion("paypal").get(url, timeout=10)
+            response.raise_for_status()
+            pem = response.text
+            cache.set(clave, pem, 24 * 3600)
+        _certificados[url] = pem
+    return pem
+
+
+def clave_publica(pem):
+    """rsa.PublicKey de un certificado X.509 o de una clave publica en PEM."""
+    if "BEGIN CERTIFICATE" in pem:
+        der = rsa.pem.load_pem(pem.encode("ascii"), "CERTIFICATE")
+        cert, _ = der_decoder.decode(der, asn1Spec=rfc2459.Certificate())
+        tbs = cert["tbsCertificate"]
+        vence = tbs["validity"]["notAfter"].getComponent().asDateTime
+        if vence < datetime.now(dt_timezone.utc):
+            raise ValueError("El certificado de PayPal esta vencido.")
+        return rsa.PublicKey.load_pkcs1(tbs["subjectPublicKeyInfo"]["subjectPublicKey"].asOctets(), "DER")
+    if "BEGIN PUBLIC KEY" in pem:
+        return rsa.PublicKey.load_pkcs1_openssl_pem(pem.encode("ascii"))
+    return rsa.PublicKey.load_pkcs1(pem.encode("ascii"))
+
+
+def mensaje_firmado(transmission_id, transmission_time, webhook_id, cuerpo):
+    return f"{transmission_id}|{transmission_time}|{webhook_id}|{zlib.crc32(cuerpo) & 0xFFFFFFFF}".encode("utf-8")
+
+
+def verificar_firma(cuerpo, encabezados, webhook_id, pem):
+    """True si la firma del webhook es valida para `pem`.
+
+    `encabezados` es un dict con los encabezados PAYPAL-* de la entrega.
+    Lanza ValueError si el algoritmo no es SHA256withRSA.
+    """
+    algoritmo = encabezados.get("PAYPAL-AUTH-ALGO", "")
+    if algoritmo.upper() != "SHA256WITHRSA":
+        raise ValueError(f"Algoritmo de firma no soportado: {algoritmo}")
+    mensaje = mensaje_firmado(
+        encabezados.get("PAYPAL-TRANSMISSION-ID", ""),
+        encabezados.get("PAYPAL-TRANSMISSION-TIME", ""),
+        webhook_id,
+        cuerpo,
+    )
+    try:
+        firma = base64.b64decode(encabezados.get("PAYPAL-TRANSMISSION-SIG", ""), validate=True)
+        return rsa.verify(mensaje, firma, clave_publica(pem)) == "SHA-256"
+    except (rsa.VerificationError, ValueError):
+        return False
+
+
+def verificar_webhook_local(cuerpo, encabezados, webhook_id):
+    return verificar_firma(cuerpo, encabezados, webhook_id, certificado(encabezados.get("PAYPAL-CERT-URL", "")))
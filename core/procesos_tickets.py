@@ -0,0 +1,63 @@
+"""Procesos hijos del ZIP de tickets de embarque (core.embarque).
+
+Con spawn cada hijo importa este modulo antes de que Django este listo, asi
+que aqui no se importan modelos a nivel de modulo. Las reservas llegan como
+dicts de campos (valores primitivos) y se rearman como instancias sin
+guardar: el hijo dibuja los tickets sin abrir conexiones a la base.
+"""
+from django.db.models import FileField
+
+from . import tickets
+
+_empresa = None
+
+
+def campos(instancia):
+    """Valores de las columnas de `instancia`, listos para pickle."""
+    datos = {}
+    for campo in instancia._meta.concrete_fields:
+        valor = getattr(instancia, campo.attname)
+        datos[campo.attname] = getattr(valor, "name", None) if isinstance(campo, FileField) else valor
+    return datos
+
+
+def datos_reserva(reserva):
+    """Reserva con su salida, tour y destino como dicts de campos."""
+    salida = reserva.salida
+    return {
+        "reserva": campos(reserva),
+        "salida": campos(salida),
+        "tour": campos(salida.tour),
+        "destino": campos(salida.tour.destino),
+    }
+
+
+def _rearmar(datos):
+    from .models import Destino, Reserva, SalidaTour, Tour
+
+    tour = Tour(**datos["tour"])
+    tour.destino = Destino(**datos["destino"])
+    salida = SalidaTour(**datos["salida"])
+    salida.tour = tour
+    reserva = Reserva(**datos["reserva"])
+    reserva.salida = salida
+    return reserva
+
+
+def iniciar(empresa, cache_dir):
+    """Initializer del pool: configura Django con el directorio de cache del padre."""
+    global _empresa
+    import django
+    from django.conf import settings
+
+    django.setup()
+    settings.TICKET_PDF_CACHE_DIR = cache_dir
+    if empresa is not None:
+        from .models import EmpresaConfig
+        empresa = EmpresaConfig(**empresa)
+    _empresa = empresa
+
+
+def ticket(tarea):
+    datos, clave = tarea
+    return tickets.ticket_pdf(_rearmar(datos), _empresa, clave=clave)
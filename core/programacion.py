@@ -0,0 +1,130 @@
+"""Programacion de salidas en bloque.
+
+Una regla (rango de fechas, dias de la semana, horas y fechas excluidas) se
+expande en memoria; las salidas que ya existen se leen con una sola consulta
+y el resto se inserta con bulk_create(ignore_conflicts=True) contra la
+restriccion unica (tour, fecha, hora). Como bulk_create no pasa por
+SalidaTour.save(), aqui mismo se crean la fila de DisponibilidadSalida, la
+apertura del libro de cupos y la entrada de ActividadDia de cada salida nueva.
+
+materializar() mantiene con salidas de los turnos un horizonte de N dias
+desde hoy; la corre "manage.py materialize_salidas" desde cron.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ActividadDia, DisponibilidadSalida, MovimientoCupo, SalidaTour, Tour
+
+DIAS_SEMANA = ("Lun", "Mar", "Mie", "Jue", "Vie", "Sab", "Dom")
+
+
+def horas_del_tour(tour):
+    """Horas de los turnos configurados del tour (hora_turno_1/hora_turno_2)."""
+    return sorted({h for h in (tour.hora_turno_1, tour.hora_turno_2) if h})
+
+
+def expandir(desde, hasta, horas, dias_semana=None, excluir=()):
+    """Pares (fecha, hora) de la regla, en orden.
+
+    `dias_semana` son numeros de date.weekday() (0 = lunes); None son todos.
+    """
+    dias_semana = set(range(7)) if dias_semana is None else set(dias_semana)
+    excluir = set(excluir)
+    horas = sorted(set(horas))
+    pares = []
+    fecha = desde
+    while fecha <= hasta:
+        if fecha.weekday() in dias_semana and fecha not in excluir:
+            pares.extend((fecha, hora) for hora in horas)
+        fecha += timedelta(days=1)
+    return pares
+
+
+def programar(tour, desde, hasta, horas, dias_semana=None, excluir=(), cupo_maximo=None, duracion=None,
+              creado_por=None, batch=1000):
+    """Crea las salidas de la regla que falten; devuelve cuantas se crearon."""
+    pares = expandir(desde, hasta, horas, dias_semana, excluir)
+    if not pares:
+        return 0
+    horas = sorted({h for _, h in pares})
+    cupo = cupo_maximo or tour.cupo_maximo
+    en_rango = SalidaTour.objects.filter(tour=tour, fecha__range=(pares[0][0], pares[-1][0]), hora__in=horas)
+
+    with transaction.atomic():
+        existentes = set(en_rango.values_list("fecha", "hora"))
+        nuevas = [
+            SalidaTour(
+                tour=tour, fecha=fecha, hora=hora, duracion=duracion or tour.duracion,
+                cupo_maximo=cupo, cupos_disponibles=cupo, creado_por=creado_por,
+            )
+            for fecha, hora in pares
+            if (fecha, hora) not in existentes
+        ]
+        if not nuevas:
+            return 0
+        SalidaTour.objects.bulk_create(nuevas, batch_size=batch, ignore_conflicts=True)
+
+        # ignore_conflicts no devuelve los ids: se releen los pares (fecha, hora)
+        # pedidos, sin los que ya traen apertura en el libro (otro proceso gano
+        # la carrera por ellos y creo la suya)
+        pedidas = {(salida.fecha, salida.hora) for salida in nuevas}
+        creadas = [
+            fila
+            for fila in en_rango.filter(movimientos_cupo__isnull=True).values_list("id", "fecha", "hora", "cupos_disponibles")
+            if (fila[1], fila[2]) in pedidas
+        ]
+        autor_nombre = creado_por.username if creado_por else "sistema"
+        DisponibilidadSalida.objects.bulk_create(
+            [
+                DisponibilidadSalida(salida_id=sid, destino_id=tour.destino_id, fecha=fecha, hora=hora, cupos_disponibles=cupos)
+                for sid, fecha, hora, cupos in creadas
+            ],
+            batch_size=batch,
+            ignore_conflicts=True,
+        )
+        MovimientoCupo.objects.bulk_create(
+            [MovimientoCupo(salida_id=sid, tipo="apertura", delta=cupos) for sid, _, _, cupos in creadas],
+            batch_size=batch,
+        )
+        ActividadDia.objects.bulk_create(
+            [
+                ActividadDia(
+                    fecha=fecha, tipo="salida", dt=ActividadDia._dt_salida(SalidaTour(fecha=fecha, hora=hora))[1],
+                    salida_id=sid, autor=creado_por, autor_nombre=autor_nombre,
+                )
+                for sid, fecha, hora, _ in creadas
+            ],
+            batch_size=batch,
+        )
+    return len(creadas)
+
+
+def materializar(dias, hoy=None, rellenar=False, tour_ids=None, batch=1000):
+    """Genera las salidas de los turnos de cada tour hasta hoy + `dias` - 1.
+
+    Es incremental: cada tour avanza desde su salidas_generadas_hasta, asi que
+    una corrida sin dias nuevos no inserta nada y lo borrado a mano no vuelve.
+    `rellenar` recorre el horizonte completo desde hoy y repone los huecos.
+    Devuelve un dict tour_id -> salidas creadas (solo los tours con trabajo).
+    """
+    hoy = hoy or timezone.localdate()
+    horizonte = hoy + timedelta(days=dias - 1)
+    tours = Tour.objects.filter(Q(hora_turno_1__isnull=False) | Q(hora_turno_2__isnull=False))
+    if tour_ids:
+        tours = tours.filter(id__in=tour_ids)
+    pendientes = Q(salidas_generadas_hasta__isnull=True) | Q(salidas_generadas_hasta__lt=horizonte)
+    if not rellenar:
+        tours = tours.filter(pendientes)
+
+    creadas = {}
+    for tour in tours.order_by("id"):
+        desde = hoy
+        if not rellenar and tour.salidas_generadas_hasta:
+            desde = max(hoy, tour.salidas_generadas_hasta + timedelta(days=1))
+        creadas[tour.id] = programar(tour, desde, horizonte, horas_del_tour(tour), batch=batch)
+        # Condicional: una corrida concurrente con horizonte mayor no retrocede
+        Tour.objects.filter(pendientes, id=tour.id).update(salidas_generadas_hasta=horizonte)
+    return creadas
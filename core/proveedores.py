@@ -0,0 +1,55 @@
+"""Sesiones HTTP persistentes para los proveedores de pago.
+
+Una requests.Session por proveedor y proceso reutiliza las conexiones TCP+TLS
+(keep-alive) entre peticiones. El adaptador reintenta con espera exponencial
+los errores de conexion y las respuestas 429/5xx; las llamadas a PayPal que
+crean algo mandan PayPal-Request-Id para que el reintento no las duplique.
+"""
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_sesiones = {}
+_lock = threading.Lock()
+
+
+def _crear_sesion():
+    reintentos = Retry(
+        total=getattr(settings, "PROVEEDORES_REINTENTOS", 2),
+        backoff_factor=getattr(settings, "PROVEEDORES_REINTENTO_BASE", 0.5),
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adaptador = HTTPAdapter(
+        pool_connections=2,
+        pool_maxsize=getattr(settings, "PROVEEDORES_POOL", 10),
+        max_retries=reintentos,
+    )
+    sesion = requests.Session()
+    sesion.mount("https://", adaptador)
+    sesion.mount("http://", adaptador)
+    return sesion
+
+
+def sesion(proveedor):
+    """Session compartida para "paypal" o "lemonsqueezy"."""
+    actual = _sesiones.get(proveedor)
+    if actual is None:
+        with _lock:
+            actual = _sesiones.get(proveedor)
+            if actual is None:
+                actual = _sesiones[proveedor] = _crear_sesion()
+    return actual
+
+
+def cerrar():
+    """Cierra las conexiones abiertas (p. ej. tras cambiar la configuracion)."""
+    with _lock:
+        for actual in _sesiones.values():
+            actual.close()
+        _sesiones.clear()
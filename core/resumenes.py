@@ -0,0 +1,136 @@
+"""KPIs de ventas por secretaria.
+
+Por defecto se calculan con un solo aggregate() sobre Reserva. Con
+settings.SECRETARIA_RESUMEN_DIARIO se leen de ResumenDiarioSecretaria, que
+se mantiene al dia con las funciones registrar_* desde las vistas que crean,
+cobran, cambian de estado o eliminan reservas.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Pago, Reserva, ResumenDiarioSecretaria
+
+CERO = Decimal("0.00")
+
+
+def resumen_activo():
+    return getattr(settings, "SECRETARIA_RESUMEN_DIARIO", False)
+
+
+def _efectivo_por_reserva():
+    return (
+        Pago.objects.filter(reserva=OuterRef("pk"), estado="paid", proveedor="efectivo")
+        .values("reserva")
+        .annotate(total=Sum("monto"))
+        .values("total")
+    )
+
+
+def _agregados_reservas():
+    activas = ~Q(estado="cancelada")
+    return {
+        "reservas": Count("id", filter=activas),
+        "pasajeros": Sum(F("adultos") + F("ninos"), filter=activas),
+        "importe": Sum("total_pagar", filter=activas),
+        "ventas_pagadas": Sum("total_pagar", filter=Q(estado="pagada")),
+        "efectivo": Sum("efectivo_cobrado"),
+    }
+
+
+def kpis_secretaria(usuario):
+    """Total de reservas, pasajeros, importe, ventas pagadas y efectivo cobrado."""
+    if resumen_activo():
+        datos = ResumenDiarioSecretaria.objects.filter(usuario=usuario).aggregate(
+            reservas=Sum("reservas"),
+            pasajeros=Sum("pasajeros"),
+            importe=Sum("importe"),
+            ventas_pagadas=Sum("ventas_pagadas"),
+            efectivo=Sum("efectivo"),
+        )
+    else:
+        datos = (
+            Reserva.objects.filter(creado_por=usuario)
+            .annotate(efectivo_cobrado=Subquery(_efectivo_por_reserva()))
+            .aggregate(**_agregados_reservas())
+        )
+    return {
+        "total_reservas": datos["reservas"] or 0,
+        "total_pasajeros": datos["pasajeros"] or 0,
+        "total_importe": datos["importe"] or CERO,
+        "total_ventas": datos["ventas_pagadas"] or CERO,
+        "total_efectivo": datos["efectivo"] or CERO,
+    }
+
+
+def _acumular(reserva, **deltas):
+    deltas = {campo: F(campo) + valor for campo, valor in deltas.items() if valor}
+    if not deltas or not reserva.creado_por_id or not resumen_activo():
+        return
+    fila, _ = ResumenDiarioSecretaria.objects.get_or_create(
+        usuario_id=reserva.creado_por_id,
+        fecha=timezone.localdate(reserva.fecha_reserva),
+    )
+    ResumenDiarioSecretaria.objects.filter(pk=fila.pk).update(**deltas)
+
+
+def registrar_cambio_estado(reserva, anterior, nuevo):
+    """Aplica al resumen el paso de `anterior` a `nuevo` (None = reserva nueva o eliminada)."""
+    def activa(estado):
+        return int(estado is not None and estado != "cancelada")
+
+    def pagada(estado):
+        return int(estado == "pagada")
+
+    d_activa = activa(nuevo) - activa(anterior)
+    d_pagada = pagada(nuevo) - pagada(anterior)
+    _acumular(
+        reserva,
+        reservas=d_activa,
+        pasajeros=d_activa * (reserva.adultos + reserva.ninos),
+        importe=d_activa * reserva.total_pagar,
+        ventas_pagadas=d_pagada * reserva.total_pagar,
+    )
+
+
+def registrar_efectivo(reserva, monto):
+    _acumular(reserva, efectivo=monto)
+
+
+def registrar_eliminacion(reserva):
+    """Llamar antes de borrar la reserva: sus pagos en efectivo se borran con ella."""
+    if not reserva.creado_por_id or not resumen_activo():
+        return
+    registrar_cambio_estado(reserva, reserva.estado, None)
+    efectivo = reserva.pagos.filter(estado="paid", proveedor="efectivo").aggregate(total=Sum("monto"))["total"]
+    if efectivo:
+        registrar_efectivo(reserva, -efectivo)
+
+
+def reconstruir(batch=1000):
+    """Recalcula todo el resumen desde Reserva y Pago; devuelve las filas creadas."""
+    filas = (
+        Reserva.objects.filter(creado_por__isnull=False)
+        .annotate(efectivo_cobrado=Subquery(_efectivo_por_reserva()), dia=TruncDate("fecha_reserva"))
+        .values("creado_por_id", "dia")
+        .annotate(**_agregados_reservas())
+        .order_by()
+    )
+    ResumenDiarioSecretaria.objects.all().delete()
+    resumenes = [
+        ResumenDiarioSecretaria(
+            usuario_id=fila["creado_por_id"],
+            fecha=fila["dia"],
+            reservas=fila["reservas"] or 0,
+            pasajeros=fila["pasajeros"] or 0,
+            importe=fila["importe"] or CERO,
+            ventas_pagadas=fila["ventas_pagadas"] or CERO,
+            efectivo=fila["efectivo"] or CERO,
+        )
+        for fila in filas
+    ]
+    ResumenDiarioSecretaria.objects.bulk_create(resumenes, batch_size=batch)
+    return len(resumenes)
@@ -0,0 +1,79 @@
+"""Roles del usuario (grupos y bandera de agencia) resueltos una sola vez.
+
+roles_de() carga los nombres de grupo y UserProfile.is_agencia en una sola
+consulta y los deja en el propio objeto usuario, que es el mismo durante toda
+la peticion. Con settings.ROLES_CACHE_SESION, RolesMiddleware los guarda
+ademas en la sesion con una version por usuario en la cache de Django;
+invalidar() sube esa version para que la siguiente peticion los recargue.
+La version vive en la cache, asi que con varios procesos hace falta una cache
+compartida; ROLES_CACHE_SESION_SEGUNDOS acota igual cuanto dura una copia.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+ATRIBUTO = "_roles_cache"
+CLAVE_SESION = "_roles"
+SIN_ROLES = {"grupos": [], "agencia": False}
+
+
+def _cargar(user):
+    filas = User.objects.filter(pk=user.pk).values_list("groups__name", "perfil__is_agencia")
+    return {
+        "grupos": sorted({nombre.lower() for nombre, _ in filas if nombre}),
+        "agencia": any(agencia for _, agencia in filas),
+    }
+
+
+def roles_de(user):
+    """Dict con "grupos" (nombres en minusculas) y "agencia" del usuario."""
+    if not user.is_authenticated:
+        return SIN_ROLES
+    roles = getattr(user, ATRIBUTO, None)
+    if roles is None:
+        roles = _cargar(user)
+        setattr(user, ATRIBUTO, roles)
+    return roles
+
+
+def tiene_grupo(user, nombre):
+    return nombre.lower() in roles_de(user)["grupos"]
+
+
+def _clave_version(user_id):
+    return f"roles:version:{user_id}"
+
+
+def invalidar(user):
+    """Descarta los roles guardados de `user` (objeto o id) en todas sus sesiones."""
+    user_id = getattr(user, "pk", user)
+    clave = _clave_version(user_id)
+    if not cache.add(clave, 1, None):
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.set(clave, 1, None)
+    if isinstance(user, User) and hasattr(user, ATRIBUTO):
+        delattr(user, ATRIBUTO)
+
+
+def desde_sesion(request):
+    """Usa los roles guardados en la sesion si siguen vigentes; si no, los carga y guarda."""
+    user = request.user
+    if not user.is_authenticated:
+        return
+    version = cache.get(_clave_version(user.pk), 0)
+    ahora = time.time()
+    datos = request.session.get(CLAVE_SESION)
+    if datos and datos.get("usuario") == user.pk and datos.get("version") == version and datos.get("hasta", 0) > ahora:
+        setattr(user, ATRIBUTO, {"grupos": datos["grupos"], "agencia": datos["agencia"]})
+        return
+    roles = roles_de(user)
+    request.session[CLAVE_SESION] = {
+        "usuario": user.pk,
+        "version": version,
+        "hasta": ahora + getattr(settings, "ROLES_CACHE_SESION_SEGUNDOS", 300),
+        **roles,
+    }
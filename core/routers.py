@@ -0,0 +1,54 @@
+"""Lecturas de los reportes en la replica de solo lectura.
+
+Con DATABASES["replica"] configurada, las vistas marcadas con
+@lecturas_en_replica (listados del panel, PDFs y exportes) leen de ella; todo
+lo demas, y cualquier escritura, va a default. Fuera de esas vistas el router
+no cambia nada: una reserva nunca se lee de una replica atrasada al cobrarla.
+"""
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA = "replica"
+
+_en_replica = ContextVar("lecturas_en_replica", default=False)
+
+
+@contextmanager
+def replica():
+    """Dirige a la replica las lecturas hechas dentro del bloque."""
+    token = _en_replica.set(True)
+    try:
+        yield
+    finally:
+        _en_replica.reset(token)
+
+
+def lecturas_en_replica(vista):
+    @functools.wraps(vista)
+    def envuelta(*args, **kwargs):
+        with replica():
+            return vista(*args, **kwargs)
+    return envuelta
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _en_replica.get() and REPLICA in settings.DATABASES:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La replica tiene los mismos datos que default
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
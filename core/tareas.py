@@ -0,0 +1,78 @@
+"""Cola de trabajos en la base de datos.
+
+encolar() guarda una Tarea con la ruta de una funcion y sus argumentos;
+`manage.py run_worker` las toma de a una con un UPDATE condicional (asi
+varios hilos o procesos no ejecutan la misma) y reintenta con espera
+exponencial las que lanzan excepcion. Las funciones deben ser idempotentes:
+una tarea puede repetirse si el worker se cae a mitad de camino.
+Solo con settings.TAREAS_EN_SEGUNDO_PLANO = True (y run_worker corriendo); por
+defecto se ejecutan en el momento y, como nadie las reintentaria, si fallan
+quedan como "fallida" y la excepcion sube a quien llamo a encolar().
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+# Si un worker no termina la tarea en este plazo, otro puede retomarla
+RESERVA_TAREA = timedelta(minutes=10)
+
+
+def encolar(funcion, **datos):
+    tarea = Tarea.objects.create(funcion=funcion, datos=datos)
+    if not getattr(settings, "TAREAS_EN_SEGUNDO_PLANO", False):
+        ejecutar(tarea, relanzar=True)
+    return tarea
+
+
+def tomar(ahora=None):
+    """Reserva la tarea vencida mas antigua para este worker, o None si no hay."""
+    ahora = ahora or timezone.now()
+    vencidas = Tarea.objects.filter(
+        Q(estado="pendiente") | Q(estado="ejecutando"), proximo_intento__lte=ahora
+    )
+    for tarea_id in vencidas.order_by("proximo_intento", "id").values_list("id", flat=True)[:10]:
+        if vencidas.filter(id=tarea_id).update(estado="ejecutando", proximo_intento=ahora + RESERVA_TAREA):
+            return Tarea.objects.get(id=tarea_id)
+    return None
+
+
+def _espera(intentos):
+    base = getattr(settings, "TAREAS_REINTENTO_SEGUNDOS", 30)
+    return timedelta(seconds=min(base * 2 ** (intentos - 1), 6 * 3600))
+
+
+def ejecutar(tarea, relanzar=False):
+    """Ejecuta la tarea y guarda el resultado; devuelve True si termino bien.
+
+    Con `relanzar` (ejecucion en el momento) un fallo no queda para reintentar:
+    la tarea se marca "fallida" y se relanza la excepcion.
+    """
+    tarea.intentos += 1
+    try:
+        import_string(tarea.funcion)(**tarea.datos)
+    except Exception as e:
+        logger.exception("Fallo la tarea %s (%s), intento %s", tarea.id, tarea.funcion, tarea.intentos)
+        tarea.ultimo_error = str(e)[:2000]
+        if relanzar or tarea.intentos >= getattr(settings, "TAREAS_MAX_INTENTOS", 8):
+            tarea.estado = "fallida"
+            tarea.terminado_en = timezone.now()
+        else:
+            tarea.estado = "pendiente"
+            tarea.proximo_intento = timezone.now() + _espera(tarea.intentos)
+        tarea.save(update_fields=["intentos", "ultimo_error", "estado", "proximo_intento", "terminado_en"])
+        if relanzar:
+            raise
+        return False
+    tarea.estado = "completada"
+    tarea.ultimo_error = ""
+    tarea.terminado_en = timezone.now()
+    tarea.save(update_fields=["intentos", "ultimo_error", "estado", "terminado_en"])
+    return True
@@ -1,3 +1,557 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import os
+import tempfile
+import zipfile
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+import rsa
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from pyasn1.codec.der import encoder as der_encoder
+from pyasn1.type import univ
+from pyasn1_modules import rfc2459
+
+from . import cupos, embarque, exportes, paypal, programacion, tickets, views
+from .management.datos_prueba import crear_catalogo
+from .models import (
+    ActividadDia, DisponibilidadSalida, EmpresaConfig, MovimientoCupo, Pago, Reserva, SalidaTour, Tarea, WebhookEvent,
+)
+
+CERT_URL = "https://api.sandbox.paypal.com/v1/notifications/certs/CERT-360caa42"
+
+
+def _certificado_pem(publica, vence):
+    """Certificado X.509 minimo (sin firma valida) con la clave y el vencimiento dados."""
+    tbs = rfc2459.TBSCertificate()
+    tbs["version"] = "v3"
+    tbs["serialNumber"] = 1
+    tbs["signature"]["algorithm"] = univ.ObjectIdentifier("1.2.840.113549.1.1.11")
+    tbs["issuer"].setComponentByPosition(0, rfc2459.RDNSequence())
+    tbs["subject"].setComponentByPosition(0, rfc2459.RDNSequence())
+    for campo, fecha in (("notBefore", vence - timedelta(days=365)), ("notAfter", vence)):
+        tbs["validity"][campo]["generalTime"] = fecha.strftime("%Y%m%d%H%M%SZ")
+    tbs["subjectPublicKeyInfo"]["algorithm"]["algorithm"] = univ.ObjectIdentifier("1.2.840.113549.1.1.1")
+    tbs["subjectPublicKeyInfo"]["subjectPublicKey"] = univ.BitString.fromOctetString(publica.save_pkcs1("DER"))
+
+    cert = rfc2459.Certificate()
+    cert["tbsCertificate"] = tbs
+    cert["signatureAlgorithm"]["algorithm"] = univ.ObjectIdentifier("1.2.840.113549.1.1.11")
+    cert["signatureValue"] = univ.BitString.fromOctetString(b"\x00")
+    return rsa.pem.save_pem(der_encoder.encode(cert), "CERTIFICATE").decode("ascii")
+
+
+class VerificacionWebhookPaypalTests(SimpleTestCase):
+    webhook_id = "WH-5GE17361S5370793L"
+    cuerpo = b'{"id":"WH-1","event_type":"PAYMENT.CAPTURE.COMPLETED"}'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.publica, cls.privada = rsa.newkeys(512)
+
+    def setUp(self):
+        cache.clear()
+        paypal._certificados.clear()
+
+    def _encabezados(self, cuerpo=None, **extra):
+        encabezados = {
+            "PAYPAL-AUTH-ALGO": "SHA256withRSA",
+            "PAYPAL-TRANSMISSION-ID": "69cd13f0-d67a-11e5-baa3-778b53f4ae55",
+            "PAYPAL-TRANSMISSION-TIME": "2026-10-17T12:00:00Z",
+            "PAYPAL-CERT-URL": CERT_URL,
+        }
+        mensaje = paypal.mensaje_firmado(
+            encabezados["PAYPAL-TRANSMISSION-ID"], encabezados["PAYPAL-TRANSMISSION-TIME"],
+            self.webhook_id, self.cuerpo if cuerpo is None else cuerpo,
+        )
+        encabezados["PAYPAL-TRANSMISSION-SIG"] = base64.b64encode(rsa.sign(mensaje, self.privada, "SHA-256")).decode()
+        encabezados.update(extra)
+        return encabezados
+
+    def test_firma_valida(self):
+        pem = self.publica.save_pkcs1().decode("ascii")
+        self.assertTrue(paypal.verificar_firma(self.cuerpo, self._encabezados(), self.webhook_id, pem))
+
+    def test_firma_valida_con_certificado(self):
+        pem = _certificado_pem(self.publica, datetime.now(dt_timezone.utc) + timedelta(days=30))
+        self.assertTrue(paypal.verificar_firma(self.cuerpo, self._encabezados(), self.webhook_id, pem))
+
+    def test_cuerpo_alterado(self):
+        pem = self.publica.save_pkcs1().decode("ascii")
+        encabezados = self._encabezados()
+        alterado = self.cuerpo.replace(b"WH-1", b"WH-2")
+        self.assertFalse(paypal.verificar_firma(alterado, encabezados, self.webhook_id, pem))
+
+    def test_otra_clave(self):
+        otra = rsa.newkeys(512)[0].save_pkcs1().decode("ascii")
+        self.assertFalse(paypal.verificar_firma(self.cuerpo, self._encabezados(), self.webhook_id, otra))
+
+    def test_algoritmo_no_soportado(self):
+        pem = self.publica.save_pkcs1().decode("ascii")
+        encabezados = self._encabezados(**{"PAYPAL-AUTH-ALGO": "SHA1withRSA"})
+        with self.assertRaises(ValueError):
+            paypal.verificar_firma(self.cuerpo, encabezados, self.webhook_id, pem)
+
+    def test_certificado_vencido(self):
+        pem = _certificado_pem(self.publica, datetime.now(dt_timezone.utc) - timedelta(days=1))
+        with self.assertRaises(ValueError):
+            paypal.clave_publica(pem)
+        self.assertFalse(paypal.verificar_firma(self.cuerpo, self._encabezados(), self.webhook_id, pem))
+
+    def test_certificado_rechaza_hosts_ajenos(self):
+        with mock.patch.object(paypal.proveedores, "sesion") as sesion:
+            for url in (
+                "https://evil.example.com/cert.pem",
+                "http://api.paypal.com/v1/notifications/certs/CERT",
+                "https://api.paypal.com.evil.example.com/cert.pem",
+                "https://user@evil.example.com/api.paypal.com",
+            ):
+                with self.subTest(url=url), self.assertRaises(ValueError):
+                    paypal.certificado(url)
+        sesion.assert_not_called()
+
+    def test_certificado_se_descarga_una_vez(self):
+        pem = _certificado_pem(self.publica, datetime.now(dt_timezone.utc) + timedelta(days=30))
+        with mock.patch.object(paypal.proveedores, "sesion") as sesion:
+            sesion.return_value.get.return_value.text = pem
+            self.assertEqual(paypal.certificado(CERT_URL), pem)
+            self.assertEqual(paypal.certificado(CERT_URL), pem)
+        sesion.return_value.get.assert_called_once_with(CERT_URL, timeout=10)
+
+    @override_settings(PAYPAL_WEBHOOK_ID=webhook_id, PAYPAL_WEBHOOK_VERIFICACION="local")
+    def test_verificacion_local_en_la_vista(self):
+        pem = self.publica.save_pkcs1().decode("ascii")
+        request = self._request(self._encabezados())
+        with mock.patch.object(paypal, "certificado", return_value=pem), \
+                mock.patch.object(views, "_paypal_access_token") as token:
+            self.assertTrue(views._paypal_verify_webhook(request, json.loads(self.cuerpo)))
+        token.assert_not_called()
+
+    @override_settings(PAYPAL_WEBHOOK_ID=webhook_id, PAYPAL_WEBHOOK_VERIFICACION="local")
+    def test_fallo_local_usa_la_api(self):
+        request = self._request(self._encabezados())
+        with mock.patch.object(paypal, "verificar_webhook_local", side_effect=ValueError("sin certificado")), \
+                mock.patch.object(views, "_paypal_access_token", return_value="token"), \
+                mock.patch.object(views.proveedores, "sesion") as sesion, \
+                self.assertLogs("core.views", level="WARNING"):
+            respuesta = sesion.return_value.post.return_value
+            respuesta.status_code = 200
+            respuesta.json.return_value = {"verification_status": "SUCCESS"}
+            self.assertTrue(views._paypal_verify_webhook(request, json.loads(self.cuerpo)))
+        args, kwargs = sesion.return_value.post.call_args
+        self.assertTrue(args[0].endswith("/v1/notifications/verify-webhook-signature"))
+        self.assertEqual(kwargs["json"]["webhook_id"], self.webhook_id)
+        self.assertEqual(kwargs["json"]["cert_url"], CERT_URL)
+
+    def _request(self, encabezados):
+        return RequestFactory().post(
+            "/paypal/webhook/", data=self.cuerpo, content_type="application/json",
+            headers=encabezados,
+        )
+
+
+def _reserva(salida, estado="pendiente", adultos=1, ninos=0, **extra):
+    return Reserva.objects.create(
+        salida=salida, adultos=adultos, ninos=ninos, total_pagar=50, estado=estado,
+        nombre=extra.pop("nombre", "Ana"), apellidos=extra.pop("apellidos", "Perez"), correo="ana@example.com",
+        telefono="0999999999", identificacion="0102030405", **extra,
+    )
+
+
+@override_settings(TAREAS_EN_SEGUNDO_PLANO=False)
+class WebhookEventTests(TestCase):
+    cuerpo = {"id": "WH-7", "event_type": "PAYMENT.CAPTURE.COMPLETED", "resource": {"custom_id": "1"}}
+
+    def setUp(self):
+        verificar = mock.patch.object(views, "_paypal_verify_webhook", return_value=True)
+        verificar.start()
+        self.addCleanup(verificar.stop)
+        self.procesador = mock.Mock(return_value="pagada")
+        procesadores = mock.patch.dict(views.PROCESADORES_WEBHOOK, {"paypal": self.procesador})
+        procesadores.start()
+        self.addCleanup(procesadores.stop)
+
+    def _entregar(self):
+        return self.client.post("/webhooks/paypal/", data=json.dumps(self.cuerpo), content_type="application/json")
+
+    def test_evento_duplicado_se_procesa_una_vez(self):
+        self.assertEqual(self._entregar().status_code, 200)
+        self.assertEqual(self._entregar().status_code, 200)
+        evento = WebhookEvent.objects.get()
+        self.assertEqual((evento.estado, evento.resultado, evento.intentos, evento.duplicados), ("procesado", "pagada", 1, 1))
+        self.procesador.assert_called_once_with(self.cuerpo)
+
+    def test_registrar_descarta_repetidos(self):
+        self.assertTrue(views._registrar_webhook("lemonsqueezy", "order_created:orders:1:t", "order_created", {}))
+        self.assertFalse(views._registrar_webhook("lemonsqueezy", "order_created:orders:1:t", "order_created", {}))
+        self.assertEqual(WebhookEvent.objects.get().duplicados, 1)
+        self.assertEqual(Tarea.objects.count(), 1)
+
+    def test_fallo_y_reenvio(self):
+        self.procesador.side_effect = RuntimeError("sin conexion")
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(self._entregar().status_code, 500)
+        evento = WebhookEvent.objects.get()
+        self.assertEqual((evento.estado, evento.resultado), ("error", "sin conexion"))
+        # Sin worker nadie la reintenta: queda fallida y el reenvio del proveedor es el reintento
+        self.assertEqual(Tarea.objects.get().estado, "fallida")
+
+        self.procesador.side_effect = None
+        self.assertEqual(self._entregar().status_code, 200)
+        evento.refresh_from_db()
+        self.assertEqual((evento.estado, evento.intentos, evento.duplicados), ("procesado", 2, 1))
+        self.assertEqual(self.procesador.call_count, 2)
+
+        self.assertEqual(self._entregar().status_code, 200)
+        self.assertEqual(self.procesador.call_count, 2)
+
+    def _reprocesar(self, evento):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "clave"))
+        return self.client.post(
+            "/admin/core/webhookevent/", {"action": "reprocesar", "_selected_action": [evento.id]}, follow=True,
+        )
+
+    def test_reprocesar_desde_el_admin(self):
+        self._entregar()
+        evento = WebhookEvent.objects.get()
+        self.procesador.return_value = "ya pagada"
+        respuesta = self._reprocesar(evento)
+        self.assertIn("1 eventos encolados.", _mensajes(respuesta))
+        evento.refresh_from_db()
+        self.assertEqual((evento.estado, evento.resultado, evento.intentos), ("procesado", "ya pagada", 2))
+
+    def test_reprocesar_informa_los_que_fallan(self):
+        self._entregar()
+        evento = WebhookEvent.objects.get()
+        self.procesador.side_effect = RuntimeError("sigue caido")
+        with self.assertLogs("core", level="ERROR"):
+            respuesta = self._reprocesar(evento)
+        self.assertIn("1 eventos volvieron a fallar.", _mensajes(respuesta))
+        evento.refresh_from_db()
+        self.assertEqual((evento.estado, evento.resultado), ("error", "sigue caido"))
+
+
+def _salida(cupo_maximo=10):
+    return crear_catalogo(destinos=1, tours_por_destino=1, dias=1, cupo_maximo=cupo_maximo)[2][0]
+
+
+def _mensajes(respuesta):
+    return [str(m) for m in get_messages(respuesta.wsgi_request)]
+
+
+class CuposTests(TestCase):
+    def setUp(self):
+        self.salida = _salida(cupo_maximo=10)
+
+    def assertCupos(self, esperados):
+        actuales = SalidaTour.objects.values_list("cupos_disponibles", flat=True).get(id=self.salida.id)
+        self.assertEqual(actuales, esperados)
+        self.assertEqual(cupos.saldo_libro([self.salida.id]), {self.salida.id: esperados})
+        self.assertEqual(DisponibilidadSalida.objects.get(salida_id=self.salida.id).cupos_disponibles, esperados)
+
+    def test_retener_y_liberar_reserva(self):
+        reserva = _reserva(self.salida, adultos=3, ninos=1)
+        self.assertEqual(cupos.retener_reserva(reserva), 4)
+        # Idempotente: la reserva ya tiene sus cupos
+        self.assertEqual(cupos.retener_reserva(reserva), 0)
+        self.assertEqual(cupos.cupos_de_reserva(reserva), 4)
+        self.assertCupos(6)
+
+        self.assertEqual(cupos.liberar_reserva(reserva), 4)
+        self.assertEqual(cupos.liberar_reserva(reserva), 0)
+        self.assertCupos(10)
+
+    def test_no_sobrevende(self):
+        cupos.retener(self.salida.id, 8)
+        reserva = _reserva(self.salida, adultos=3)
+        with self.assertRaises(cupos.CuposInsuficientes):
+            cupos.retener_reserva(reserva)
+        self.assertEqual(cupos.cupos_de_reserva(reserva), 0)
+        self.assertEqual(MovimientoCupo.objects.filter(salida_id=self.salida.id).count(), 2)
+        self.assertCupos(2)
+
+    def test_ajustar_y_corregir(self):
+        cupos.retener(self.salida.id, 3)
+        cupos.ajustar(self.salida.id, 5)
+        self.assertCupos(5)
+        self.assertIsNone(cupos.ajustar(self.salida.id, 5))
+        cupos.corregir(self.salida.id, 2)
+        self.assertCupos(7)
+        with self.assertRaises(cupos.CuposInsuficientes):
+            cupos.corregir(self.salida.id, -8)
+        self.assertCupos(7)
+
+
+class DisponibilidadSalidaTests(TestCase):
+    def setUp(self):
+        self.salida = _salida(cupo_maximo=10)
+
+    def _indice(self):
+        return DisponibilidadSalida.objects.get(salida_id=self.salida.id)
+
+    def test_salida_nueva_crea_su_fila(self):
+        nueva = SalidaTour.objects.create(
+            tour=self.salida.tour, fecha=self.salida.fecha, hora=time(6, 0), cupo_maximo=7, cupos_disponibles=7,
+        )
+        indice = DisponibilidadSalida.objects.get(salida_id=nueva.id)
+        self.assertEqual(
+            (indice.destino_id, indice.fecha, indice.hora, indice.cupos_disponibles),
+            (self.salida.tour.destino_id, nueva.fecha, time(6, 0), 7),
+        )
+
+    def test_guardado_completo_copia_fecha_y_hora(self):
+        salida = SalidaTour.objects.get(id=self.salida.id)
+        salida.fecha += timedelta(days=3)
+        salida.hora = time(9, 30)
+        salida.save()
+        indice = self._indice()
+        self.assertEqual((indice.fecha, indice.hora, indice.cupos_disponibles), (salida.fecha, time(9, 30), 10))
+
+    def test_guardado_parcial_no_pisa_cupos(self):
+        # La instancia en memoria quedo con 10 cupos; el libro vende 4 con F()
+        salida = SalidaTour.objects.get(id=self.salida.id)
+        cupos.retener(salida.id, 4)
+        salida.duracion = "Todo el dia"
+        salida.hora = time(7, 15)
+        salida.save(update_fields=["duracion", "hora"])
+        indice = self._indice()
+        self.assertEqual((indice.hora, indice.cupos_disponibles), (time(7, 15), 6))
+        self.assertEqual(SalidaTour.objects.get(id=salida.id).cupos_disponibles, 6)
+
+    def test_retencion_temporal_vence(self):
+        reserva = _reserva(self.salida, adultos=2)
+        vence = cupos.retener_temporal(reserva, minutos=15)
+        self.assertEqual(self._indice().cupos_disponibles, 8)
+        self.assertEqual(cupos.liberar_retenciones_vencidas(ahora=timezone.now()), 0)
+
+        self.assertEqual(cupos.liberar_retenciones_vencidas(ahora=vence + timedelta(seconds=1)), 1)
+        self.assertEqual(self._indice().cupos_disponibles, 10)
+        reserva.refresh_from_db()
+        self.assertEqual((reserva.estado, reserva.retencion_hasta), ("pendiente", None))
+        self.assertEqual(cupos.saldo_libro([self.salida.id]), {self.salida.id: 10})
+
+
+class CuposVistasTests(TestCase):
+    def setUp(self):
+        self.salida = _salida(cupo_maximo=10)
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "clave"))
+
+    def _cupos(self):
+        return SalidaTour.objects.values_list("cupos_disponibles", flat=True).get(id=self.salida.id)
+
+    def _estado(self, reserva, estado):
+        return self.client.post(f"/panel/reservas/{reserva.id}/estado/", {"estado": estado})
+
+    def test_cancelar_y_reactivar(self):
+        reserva = _reserva(self.salida, estado="pagada", adultos=4)
+        cupos.retener_reserva(reserva)
+        self._estado(reserva, "cancelada")
+        self.assertEqual(self._cupos(), 10)
+        self._estado(reserva, "pagada")
+        self.assertEqual(self._cupos(), 6)
+        self.assertEqual(cupos.cupos_de_reserva(reserva), 4)
+        self.assertEqual(cupos.saldo_libro([self.salida.id]), {self.salida.id: 6})
+
+    def test_reactivar_sin_cupos(self):
+        reserva = _reserva(self.salida, estado="pagada", adultos=4)
+        cupos.retener_reserva(reserva)
+        self._estado(reserva, "cancelada")
+        cupos.retener(self.salida.id, 8)
+
+        respuesta = self._estado(reserva, "pagada")
+        self.assertIn("no se puede reactivar", " ".join(_mensajes(respuesta)))
+        reserva.refresh_from_db()
+        self.assertEqual(reserva.estado, "cancelada")
+        self.assertEqual(self._cupos(), 2)
+        self.assertEqual(cupos.saldo_libro([self.salida.id]), {self.salida.id: 2})
+
+    def _editar(self, cupos_disponibles, original=10):
+        return self.client.post(f"/panel/salidas/{self.salida.id}/editar/", {
+            "cupo_maximo": 10, "cupos_disponibles": cupos_disponibles, "cupos_disponibles_original": original,
+            "fecha": self.salida.fecha.isoformat(), "hora": self.salida.hora.strftime("%H:%M"), "duracion": "",
+        })
+
+    def test_editar_salida_respeta_venta_concurrente(self):
+        # El formulario se abrio con 10 cupos y mientras tanto se vendieron 3
+        cupos.retener(self.salida.id, 3)
+        self._editar(10)
+        self.assertEqual(self._cupos(), 7)
+        self._editar(12)
+        self.assertEqual(self._cupos(), 9)
+        self.assertEqual(cupos.saldo_libro([self.salida.id]), {self.salida.id: 9})
+
+    def test_editar_salida_sin_cupos_para_quitar(self):
+        cupos.retener(self.salida.id, 8)
+        respuesta = self._editar(0)
+        self.assertIn("Se vendieron cupos", " ".join(_mensajes(respuesta)))
+        self.assertEqual(self._cupos(), 2)
+
+
+class ProgramacionTests(TestCase):
+    def setUp(self):
+        self.salida = _salida(cupo_maximo=10)
+        self.tour = self.salida.tour
+        self.desde = self.salida.fecha + timedelta(days=30)
+
+    def test_programar_cuenta_solo_los_pares_pedidos(self):
+        # Salida antigua dentro del rango y sin movimientos en el libro
+        antigua = SalidaTour.objects.create(tour=self.tour, fecha=self.desde, hora=time(7, 0), cupos_disponibles=10)
+        MovimientoCupo.objects.filter(salida=antigua).delete()
+
+        hasta = self.desde + timedelta(days=6)
+        excluir = [self.desde + timedelta(days=1)]
+        creadas = programacion.programar(self.tour, self.desde, hasta, [time(7, 0), time(15, 0)], excluir=excluir)
+        self.assertEqual(creadas, 7 * 2 - 2 - 1)
+
+        nuevas = SalidaTour.objects.filter(tour=self.tour, fecha__range=(self.desde, hasta)).exclude(id=antigua.id)
+        self.assertEqual(nuevas.count(), creadas)
+        self.assertFalse(nuevas.filter(fecha__in=excluir).exists())
+        self.assertFalse(MovimientoCupo.objects.filter(salida=antigua).exists())
+        ids = list(nuevas.values_list("id", flat=True))
+        self.assertEqual(MovimientoCupo.objects.filter(salida_id__in=ids, tipo="apertura").count(), creadas)
+        self.assertEqual(DisponibilidadSalida.objects.filter(salida_id__in=ids).count(), creadas)
+        self.assertEqual(ActividadDia.objects.filter(salida_id__in=ids, tipo="salida").count(), creadas)
+        self.assertEqual(set(cupos.saldo_libro(ids).values()), {self.tour.cupo_maximo})
+
+        # Repetir la regla no crea nada
+        self.assertEqual(
+            programacion.programar(self.tour, self.desde, hasta, [time(7, 0), time(15, 0)], excluir=excluir), 0,
+        )
+
+    def test_programar_por_dias_de_la_semana(self):
+        hasta = self.desde + timedelta(days=13)
+        creadas = programacion.programar(self.tour, self.desde, hasta, [time(9, 0)], dias_semana=[5, 6])
+        self.assertEqual(creadas, 4)
+        fechas = SalidaTour.objects.filter(tour=self.tour, hora=time(9, 0)).values_list("fecha", flat=True)
+        self.assertEqual({fecha.weekday() for fecha in fechas}, {5, 6})
+
+
+class SalidasVistasTests(TestCase):
+    def setUp(self):
+        self.salida = _salida(cupo_maximo=10)
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "clave"))
+
+    def test_crear_salida_no_duplica_las_existentes(self):
+        respuesta = self.client.post("/panel/salidas/nueva/", {
+            "tour": self.salida.tour_id, "fecha": self.salida.fecha.isoformat(),
+            "fecha_fin": (self.salida.fecha + timedelta(days=2)).isoformat(),
+            "hora": self.salida.hora.strftime("%H:%M"), "cupo_maximo": 12,
+        }, follow=True)
+        self.assertIn("¡Se han programado 2 salidas correctamente!", _mensajes(respuesta))
+        self.assertEqual(
+            SalidaTour.objects.filter(tour_id=self.salida.tour_id, hora=self.salida.hora).count(), 3,
+        )
+
+    def test_editar_salida_rechaza_choque(self):
+        otra = SalidaTour.objects.create(
+            tour=self.salida.tour, fecha=self.salida.fecha + timedelta(days=1), hora=self.salida.hora,
+            cupo_maximo=10, cupos_disponibles=10,
+        )
+        respuesta = self.client.post(f"/panel/salidas/{otra.id}/editar/", {
+            "cupo_maximo": 10, "cupos_disponibles": 10, "cupos_disponibles_original": 10,
+            "fecha": self.salida.fecha.isoformat(), "hora": self.salida.hora.strftime("%H:%M"), "duracion": "",
+        })
+        self.assertRedirects(respuesta, f"/panel/salidas/{otra.id}/editar/", fetch_redirect_response=False)
+        self.assertIn("Ya existe una salida de este tour", " ".join(_mensajes(respuesta)))
+        otra.refresh_from_db()
+        self.assertEqual(otra.fecha, self.salida.fecha + timedelta(days=1))
+
+
+class TicketsEmbarqueTests(TestCase):
+    def test_zip_con_pool_de_procesos(self):
+        salida = crear_catalogo(destinos=1, tours_por_destino=1, dias=1, cupo_maximo=10)[2][0]
+        reservas = [_reserva(salida, estado="pagada", apellidos=f"Apellido {i}") for i in range(3)]
+        empresa = EmpresaConfig.objects.create(nombre_empresa="Tortugas", ruc="1790000000001")
+        grupos = embarque.lote(salida_id=salida.id)
+
+        with tempfile.TemporaryDirectory() as directorio, \
+                override_settings(TICKETS_LOTE_MIN_PARALELO=1, TICKET_PDF_CACHE_DIR=directorio):
+            self.assertEqual(embarque._procesos(len(reservas), 2), 2)
+            contenido = embarque.zip_tickets(grupos, empresa, procesos=2)
+            # Los hijos escriben en la cache del padre con la misma huella
+            esperados = {f"{r.id}-{tickets.huella(r, empresa)}.pdf" for _, filas in grupos for r in filas}
+            self.assertEqual(set(os.listdir(directorio)), esperados)
+
+        with zipfile.ZipFile(io.BytesIO(contenido)) as archivo:
+            nombres = archivo.namelist()
+            self.assertEqual(nombres[0], "manifiesto.pdf")
+            self.assertEqual(
+                sorted(nombres[1:]), sorted(f"salida_{salida.id}/ticket_{r.id:06d}.pdf" for r in reservas),
+            )
+            for nombre in nombres:
+                self.assertTrue(archivo.read(nombre).startswith(b"%PDF"))
+
+
+class ExportesTests(TestCase):
+    def setUp(self):
+        salida = _salida(cupo_maximo=50)
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "clave")
+        self.reservas = []
+        for i, estado in enumerate(("pagada", "pendiente", "pagada", "cancelada", "confirmada")):
+            reserva = _reserva(salida, estado=estado, adultos=i + 1, nombre=f"Cliente {i}", creado_por=self.admin)
+            if estado == "pagada":
+                Pago.objects.create(
+                    reserva=reserva, proveedor="paypal", estado="paid", monto=reserva.total_pagar,
+                    external_id=f"ORDEN-{i}",
+                )
+            self.reservas.append(reserva)
+        self.client.force_login(self.admin)
+
+    def _exportar(self, **filtros):
+        respuesta = self.client.get("/panel/reservas/exportar/", filtros)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.streaming)
+        return respuesta, b"".join(respuesta.streaming_content)
+
+    def test_csv_coincide_con_la_consulta(self):
+        with mock.patch.object(exportes, "FILAS_POR_BLOQUE", 2):
+            respuesta, contenido = self._exportar(formato="csv")
+        self.assertEqual(respuesta["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn('filename="reservas.csv"', respuesta["Content-Disposition"])
+
+        filas = list(csv.reader(io.StringIO(contenido.decode("utf-8-sig"))))
+        self.assertEqual(filas[0], [encabezado for encabezado, _ in exportes.COLUMNAS["reservas"]])
+        esperadas = [[exportes._texto(v) for v in fila] for fila in exportes.consulta("reservas")]
+        self.assertEqual(filas[1:], esperadas)
+        self.assertEqual([int(fila[0]) for fila in filas[1:]], [r.id for r in self.reservas])
+
+        columnas = filas[0]
+        pagada = dict(zip(columnas, filas[1]))
+        self.assertEqual(
+            (pagada["estado"], pagada["proveedor_pago"], pagada["id_externo_pago"], pagada["creado_por"]),
+            ("pagada", "paypal", "ORDEN-0", "admin"),
+        )
+        self.assertEqual(dict(zip(columnas, filas[2]))["proveedor_pago"], "")
+
+    def test_csv_filtrado_por_estado(self):
+        _, contenido = self._exportar(formato="csv", estado="pagada")
+        filas = list(csv.reader(io.StringIO(contenido.decode("utf-8-sig"))))
+        ids = [int(fila[0]) for fila in filas[1:]]
+        self.assertEqual(ids, list(Reserva.objects.filter(estado="pagada").order_by("id").values_list("id", flat=True)))
+
+    def test_xlsx_de_pagos(self):
+        with mock.patch.object(exportes, "FILAS_POR_BLOQUE", 1):
+            respuesta, contenido = self._exportar(formato="xlsx", tipo="pagos")
+        self.assertIn('filename="pagos.xlsx"', respuesta["Content-Disposition"])
+
+        ns = {"x": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+        with zipfile.ZipFile(io.BytesIO(contenido)) as libro:
+            self.assertIsNone(libro.testzip())
+            hoja = ElementTree.fromstring(libro.read("xl/worksheets/sheet1.xml"))
+        filas = [
+            [celda.findtext("x:is/x:t", namespaces=ns) or celda.findtext("x:v", namespaces=ns) or ""
+             for celda in fila.findall("x:c", ns)]
+            for fila in hoja.iterfind("x:sheetData/x:row", ns)
+        ]
+        self.assertEqual(filas[0], [encabezado for encabezado, _ in exportes.COLUMNAS["pagos"]])
+        esperadas = [[exportes._texto(v) for v in fila] for fila in exportes.consulta("pagos")]
+        self.assertEqual(filas[1:], esperadas)
+        self.assertEqual(len(filas) - 1, Pago.objects.count())
@@ -0,0 +1,68 @@
+"""Cache en disco de los tickets PDF.
+
+El archivo se nombra con el id de la reserva y una huella de todo lo que
+dibuja generar_ticket_pdf (cliente, estado, totales, salida, tour y
+EmpresaConfig), asi que cualquier cambio produce un archivo nuevo y el
+anterior se borra. La misma huella sirve de ETag en ver_ticket_pdf.
+"""
+import glob
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+
+from .utils import generar_ticket_pdf
+
+logger = logging.getLogger(__name__)
+
+
+def huella(reserva, empresa=None):
+    salida = reserva.salida
+    tour = salida.tour
+    partes = [
+        reserva.id, reserva.estado, reserva.nombre, reserva.apellidos, reserva.identificacion,
+        reserva.telefono, reserva.correo, reserva.fecha_reserva.isoformat(),
+        reserva.adultos, reserva.ninos, reserva.total_pagar,
+        salida.id, salida.fecha, salida.hora,
+        tour.nombre, tour.destino.nombre, tour.precio_adulto_final(), tour.precio_nino_final(),
+    ]
+    if empresa is not None:
+        partes += [empresa.nombre_empresa, empresa.ruc, empresa.direccion, empresa.telefono, empresa.correo]
+    return hashlib.sha1("|".join(map(str, partes)).encode("utf-8")).hexdigest()[:24]
+
+
+def _guardar(directorio, reserva_id, ruta, contenido):
+    os.makedirs(directorio, exist_ok=True)
+    for anterior in glob.glob(os.path.join(glob.escape(directorio), f"{reserva_id}-*.pdf")):
+        try:
+            os.remove(anterior)
+        except FileNotFoundError:
+            pass
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "wb") as fh:
+        fh.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def ticket_pdf(reserva, empresa=None, clave=None):
+    """Bytes del ticket; solo se genera con ReportLab si no esta en TICKET_PDF_CACHE_DIR."""
+    directorio = getattr(settings, "TICKET_PDF_CACHE_DIR", "")
+    if not directorio:
+        return generar_ticket_pdf(reserva, empresa).getvalue()
+
+    directorio = str(directorio)
+    clave = clave or huella(reserva, empresa)
+    ruta = os.path.join(directorio, f"{reserva.id}-{clave}.pdf")
+    try:
+        with open(ruta, "rb") as fh:
+            return fh.read()
+    except FileNotFoundError:
+        pass
+
+    contenido = generar_ticket_pdf(reserva, empresa).getvalue()
+    try:
+        _guardar(directorio, reserva.id, ruta, contenido)
+    except OSError:
+        logger.exception("No se pudo guardar el ticket de la reserva %s", reserva.id)
+    return contenido
@@ -18,6 +18,7 @@ urlpatterns = [
 
     path("panel/", views.panel_admin, name="panel_admin"),
     path("panel/reservas/", views.admin_reservas, name="admin_reservas"),
+    path("panel/reservas/exportar/", views.exportar_reservas, name="exportar_reservas"),
     path("panel/reservas/<int:reserva_id>/estado/", views.cambiar_estado_reserva, name="cambiar_estado_reserva"),
     path("panel/reservas/<int:reserva_id>/eliminar/", views.eliminar_reserva, name="eliminar_reserva"),
     path("panel/salidas/", views.admin_salidas, name="admin_salidas"),
@@ -25,6 +26,7 @@ urlpatterns = [
     path("panel/salidas/<int:salida_id>/eliminar/", views.eliminar_salida, name="eliminar_salida"),
     path("panel/salidas/limpiar/", views.limpiar_salidas_vacias, name="limpiar_salidas_vacias"),
     path("panel/salidas/nueva/", views.crear_salida, name="crear_salida"),
+    path("panel/salidas/tickets/", views.tickets_embarque, name="tickets_embarque"),
     
     path('panel/destinos/', views.destinos, name='destinos'),
     path('panel/destinos/editar/<int:pk>/', views.editar_destino, name='editar_destino'),
@@ -4,7 +4,8 @@ from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.graphics.barcode import code128
-from reportlab.platypus import Table, TableStyle
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import Frame, LongTable, SimpleDocTemplate, Table, TableStyle
 
 
 def _fmt_money(value):
@@ -27,18 +28,45 @@ def _access_key(reserva, empresa_ruc):
     return f"{reserva.fecha_reserva.strftime('%Y%m%d')}{digest[:24]}"
 
 
+# Recursos compartidos por todos los tickets (y por los lotes de tickets_embarque)
+_COLOR_PRIMARY = colors.HexColor("#0F172A")
+_COLOR_SECONDARY = colors.HexColor("#0EA5A5")
+_COLOR_LIGHT = colors.HexColor("#F8FAFC")
+_COLOR_BORDER = colors.HexColor("#CBD5E1")
+_COLOR_TEXT = colors.HexColor("#0F172A")
+_COLOR_MUTED = colors.HexColor("#64748B")
+
+_TICKET_ESTILO_DETALLE = TableStyle([
+    ("BACKGROUND", (0, 0), (-1, 0), _COLOR_PRIMARY),
+    ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("FONTSIZE", (0, 0), (-1, 0), 10),
+    ("ALIGN", (0, 0), (0, -1), "CENTER"),
+    ("ALIGN", (2, 0), (2, -1), "CENTER"),
+    ("ALIGN", (3, 0), (4, -1), "RIGHT"),
+    ("ALIGN", (1, 0), (1, -1), "LEFT"),
+    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+    ("GRID", (0, 0), (-1, -2), 0.5, _COLOR_BORDER),
+    ("LINEABOVE", (0, -1), (-1, -1), 1, _COLOR_SECONDARY),
+    ("FONTNAME", (3, -1), (4, -1), "Helvetica-Bold"),
+    ("TEXTCOLOR", (3, -1), (4, -1), _COLOR_PRIMARY),
+    ("BACKGROUND", (0, -1), (-1, -1), _COLOR_LIGHT),
+])
+
+
 def generar_ticket_pdf(reserva, empresa=None):
     buffer = BytesIO()
     p = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
+    dibujar_ticket(p, reserva, empresa)
+    p.showPage()
+    p.save()
+    buffer.seek(0)
+    return buffer
 
-    color_primary = colors.HexColor("#0F172A")
-    color_secondary = colors.HexColor("#0EA5A5")
-    color_light = colors.HexColor("#F8FAFC")
-    color_border = colors.HexColor("#CBD5E1")
-    color_text = colors.HexColor("#0F172A")
-    color_muted = colors.HexColor("#64748B")
 
+def dibujar_ticket(p, reserva, empresa=None):
+    """Dibuja el ticket en la pagina actual de `p` (sin cerrarla)."""
+    width, height = letter
     margin_x = 34
 
     empresa_nombre = "TortugaTur"
@@ -59,7 +87,7 @@ def generar_ticket_pdf(reserva, empresa=None):
     estado_text = (reserva.estado or "pendiente").upper()
 
     # Header
-    p.setFillColor(color_primary)
+    p.setFillColor(_COLOR_PRIMARY)
     p.roundRect(20, height - 128, width - 40, 100, 12, fill=1, stroke=0)
 
     p.setFillColor(colors.white)
@@ -90,17 +118,17 @@ def generar_ticket_pdf(reserva, empresa=None):
     block_h = 150
     top_y = height - 298
 
-    p.setFillColor(color_light)
-    p.setStrokeColor(color_border)
+    p.setFillColor(_COLOR_LIGHT)
+    p.setStrokeColor(_COLOR_BORDER)
     p.roundRect(margin_x, top_y, left_w, block_h, 10, fill=1, stroke=1)
 
-    p.setFillColor(color_primary)
+    p.setFillColor(_COLOR_PRIMARY)
     p.setFont("Helvetica-Bold", 10)
     p.drawString(margin_x + 12, top_y + block_h - 20, "DATOS DE CLIENTE")
-    p.setStrokeColor(color_secondary)
+    p.setStrokeColor(_COLOR_SECONDARY)
     p.line(margin_x + 12, top_y + block_h - 24, margin_x + left_w - 12, top_y + block_h - 24)
 
-    p.setFillColor(color_text)
+    p.setFillColor(_COLOR_TEXT)
     p.setFont("Helvetica", 9.5)
     nombre_cliente = f"{_safe_text(reserva.nombre)} {_safe_text(reserva.apellidos, '')}".strip()
     p.drawString(margin_x + 12, top_y + block_h - 42, f"Nombre: {nombre_cliente}")
@@ -110,14 +138,14 @@ def generar_ticket_pdf(reserva, empresa=None):
     p.drawString(margin_x + 12, top_y + block_h - 102, f"Fecha de reserva: {reserva.fecha_reserva.strftime('%d/%m/%Y')}")
 
     x_right = margin_x + left_w + 14
-    p.setFillColor(color_light)
-    p.setStrokeColor(color_border)
+    p.setFillColor(_COLOR_LIGHT)
+    p.setStrokeColor(_COLOR_BORDER)
     p.roundRect(x_right, top_y, right_w, block_h, 10, fill=1, stroke=1)
 
-    p.setFillColor(color_primary)
+    p.setFillColor(_COLOR_PRIMARY)
     p.setFont("Helvetica-Bold", 10)
     p.drawString(x_right + 10, top_y + block_h - 20, "CLAVE DE ACCESO")
-    p.setStrokeColor(color_secondary)
+    p.setStrokeColor(_COLOR_SECONDARY)
     p.line(x_right + 10, top_y + block_h - 24, x_right + right_w - 10, top_y + block_h - 24)
 
     # Fit barcode to the available width so it never overflows the access box.
@@ -134,11 +162,11 @@ def generar_ticket_pdf(reserva, empresa=None):
         p.restoreState()
     else:
         barcode.drawOn(p, barcode_x, barcode_y)
-    p.setFillColor(color_muted)
+    p.setFillColor(_COLOR_MUTED)
     p.setFont("Helvetica", 7.5)
     p.drawString(x_right + 10, top_y + 64, clave_acceso)
 
-    p.setFillColor(color_text)
+    p.setFillColor(_COLOR_TEXT)
     p.setFont("Helvetica", 9)
     p.drawString(x_right + 10, top_y + 44, f"Tour: {_safe_text(reserva.salida.tour.nombre)}")
     p.drawString(x_right + 10, top_y + 30, f"Destino: {_safe_text(reserva.salida.tour.destino.nombre)}")
@@ -175,23 +203,7 @@ def generar_ticket_pdf(reserva, empresa=None):
 
     row_heights = [24] + [22] * (len(data) - 2) + [26]
     table = Table(data, colWidths=[64, 246, 50, 90, 90], rowHeights=row_heights)
-    style = [
-        ("BACKGROUND", (0, 0), (-1, 0), color_primary),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("FONTSIZE", (0, 0), (-1, 0), 10),
-        ("ALIGN", (0, 0), (0, -1), "CENTER"),
-        ("ALIGN", (2, 0), (2, -1), "CENTER"),
-        ("ALIGN", (3, 0), (4, -1), "RIGHT"),
-        ("ALIGN", (1, 0), (1, -1), "LEFT"),
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("GRID", (0, 0), (-1, -2), 0.5, color_border),
-        ("LINEABOVE", (0, -1), (-1, -1), 1, color_secondary),
-        ("FONTNAME", (3, -1), (4, -1), "Helvetica-Bold"),
-        ("TEXTCOLOR", (3, -1), (4, -1), color_primary),
-        ("BACKGROUND", (0, -1), (-1, -1), color_light),
-    ]
-    table.setStyle(TableStyle(style))
+    table.setStyle(_TICKET_ESTILO_DETALLE)
 
     table_height = sum(row_heights)
     table_y = top_y - 18 - table_height
@@ -200,14 +212,14 @@ def generar_ticket_pdf(reserva, empresa=None):
 
     # Summary box
     summary_y = table_y - 72
-    p.setStrokeColor(color_border)
+    p.setStrokeColor(_COLOR_BORDER)
     p.roundRect(width - margin_x - 210, summary_y, 210, 62, 8, fill=0, stroke=1)
     p.setFont("Helvetica", 9)
-    p.setFillColor(color_muted)
+    p.setFillColor(_COLOR_MUTED)
     p.drawString(width - margin_x - 198, summary_y + 42, "Subtotal")
     p.drawString(width - margin_x - 198, summary_y + 28, "Descuento")
     p.drawString(width - margin_x - 198, summary_y + 14, "Total")
-    p.setFillColor(color_text)
+    p.setFillColor(_COLOR_TEXT)
     total_float = float(reserva.total_pagar)
     p.drawRightString(width - margin_x - 10, summary_y + 42, f"{total_float:.2f} USD")
     p.drawRightString(width - margin_x - 10, summary_y + 28, "0.00 USD")
@@ -215,9 +227,9 @@ def generar_ticket_pdf(reserva, empresa=None):
     p.drawRightString(width - margin_x - 10, summary_y + 14, f"{total_float:.2f} USD")
 
     # Footer
-    p.setStrokeColor(color_border)
+    p.setStrokeColor(_COLOR_BORDER)
     p.line(margin_x, 52, width - margin_x, 52)
-    p.setFillColor(color_muted)
+    p.setFillColor(_COLOR_MUTED)
     p.setFont("Helvetica-Oblique", 8.3)
     p.drawString(
         margin_x,
@@ -227,88 +239,274 @@ def generar_ticket_pdf(reserva, empresa=None):
     p.setFont("Helvetica", 8)
     p.drawRightString(width - margin_x, 40, f"Generado: {fecha_emision}")
 
-    p.showPage()
-    p.save()
-    buffer.seek(0)
-    return buffer
+
+ACTIVIDAD_ENCABEZADO = ["Tipo", "Ref", "Secretaria", "Detalle", "Estado", "Hora", "Monto"]
+ACTIVIDAD_COLUMNAS = [50, 55, 80, 160, 80, 60, 65]
+_ACTIVIDAD_ALTO_ENCABEZADO = 22
+_ACTIVIDAD_ALTO_FILA = 20
+_ACTIVIDAD_ALTO_TOTAL = 24
+_ACTIVIDAD_FUENTE = 8
+# Padding por defecto de Frame y de las celdas de Table en platypus
+_PADDING_MARCO = 6
+_PADDING_CELDA = 6
+
+_ACTIVIDAD_PRIMARY = _COLOR_PRIMARY
+_ACTIVIDAD_BORDER = _COLOR_BORDER
+_ACTIVIDAD_LIGHT = _COLOR_LIGHT
+_ACTIVIDAD_MUTED = _COLOR_MUTED
+
+_ACTIVIDAD_ESTILO = [
+    ("BACKGROUND", (0, 0), (-1, 0), _ACTIVIDAD_PRIMARY),
+    ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("FONTSIZE", (0, 0), (-1, -1), _ACTIVIDAD_FUENTE),
+    ("ALIGN", (0, 0), (2, -1), "CENTER"),
+    ("ALIGN", (5, 0), (6, -1), "RIGHT"),
+    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+]
+_ACTIVIDAD_ESTILO_TOTAL = [
+    ("GRID", (0, 0), (-1, -2), 0.5, _ACTIVIDAD_BORDER),
+    ("FONTNAME", (5, -1), (6, -1), "Helvetica-Bold"),
+    ("BACKGROUND", (0, -1), (-1, -1), _ACTIVIDAD_LIGHT),
+    ("LINEABOVE", (0, -1), (-1, -1), 1, _ACTIVIDAD_PRIMARY),
+]
+
+
+class _FlowablesPerezosos(list):
+    """Lista que build() de platypus consume por delante y que se rellena del generador.
+
+    build() solo mira len(), [0], del [0] e inserta lo que sobra al partir una
+    tabla, asi que en memoria esta la tabla de la pagina en curso y no el reporte
+    entero.
+    """
+
+    def __init__(self, flowables):
+        super().__init__()
+        self._pendientes = iter(flowables)
+
+    def __len__(self):
+        if not super().__len__():
+            siguiente = next(self._pendientes, None)
+            if siguiente is not None:
+                self.append(siguiente)
+        return super().__len__()
+
+
+def _recortar(texto, ancho, fuente="Helvetica", tamano=_ACTIVIDAD_FUENTE):
+    medida = stringWidth(texto, fuente, tamano)
+    if medida <= ancho:
+        return texto
+    # Corte proporcional al ancho y luego unos pocos caracteres de ajuste
+    ancho -= stringWidth("...", fuente, tamano)
+    corte = int(len(texto) * ancho / medida)
+    while corte > 0 and stringWidth(texto[:corte], fuente, tamano) > ancho:
+        corte -= 1
+    return texto[:corte] + "..."
+
+
+def _fila_actividad(item):
+    hora = item["dt"].strftime("%I:%M %p")
+    monto = f"${float(item['monto']):.2f}" if item.get("monto") else "-"
+    ref = f"#{int(item['id']):05d}"
+    detalle = f"{item.get('titulo', '')} | {item.get('tour', '')}"
+    usuario = str(item.get("usuario", "-"))
+    # Filas de alto fijo: el texto se recorta al ancho de la celda para que la
+    # cantidad de filas por pagina sea exacta
+    return [
+        str(item.get("tipo", "")).upper(),
+        ref,
+        _recortar(usuario, ACTIVIDAD_COLUMNAS[2] - 2 * _PADDING_CELDA),
+        _recortar(detalle, ACTIVIDAD_COLUMNAS[3] - 2 * _PADDING_CELDA),
+        _recortar(str(item.get("estado", "")).upper(), ACTIVIDAD_COLUMNAS[4] - 2 * _PADDING_CELDA),
+        hora,
+        monto,
+    ]
+
+
+def _tabla_actividad(filas, total_ventas=None):
+    data = [ACTIVIDAD_ENCABEZADO] + filas
+    alturas = [_ACTIVIDAD_ALTO_ENCABEZADO] + [_ACTIVIDAD_ALTO_FILA] * len(filas)
+    estilo = list(_ACTIVIDAD_ESTILO)
+    if total_ventas is None:
+        estilo.append(("GRID", (0, 0), (-1, -1), 0.5, _ACTIVIDAD_BORDER))
+    else:
+        data.append(["", "", "", "", "", "TOTAL VENTAS", f"${float(total_ventas):,.2f}"])
+        alturas.append(_ACTIVIDAD_ALTO_TOTAL)
+        estilo += _ACTIVIDAD_ESTILO_TOTAL
+    # repeatRows: si una tabla no cabe y se parte, el encabezado se repite en la pagina siguiente
+    return LongTable(data, colWidths=ACTIVIDAD_COLUMNAS, rowHeights=alturas, repeatRows=1, style=TableStyle(estilo))
+
+
+def _tablas_actividad(items, filas_por_pagina, total_ventas):
+    """Una tabla por pagina; la ultima lleva la fila de total."""
+    trozo, anterior = [], None
+    for item in items:
+        trozo.append(_fila_actividad(item))
+        if len(trozo) == filas_por_pagina:
+            if anterior is not None:
+                yield _tabla_actividad(anterior)
+            anterior, trozo = trozo, []
+    if trozo:
+        if anterior is not None:
+            yield _tabla_actividad(anterior)
+        anterior = trozo
+    if anterior is None:
+        anterior = [["-", "-", "-", "No hay actividad para esta fecha.", "-", "-", "-"]]
+    yield _tabla_actividad(anterior, total_ventas)
 
 
 def generar_actividad_dia_pdf(titulo, fecha, items, resumen):
+    """PDF del reporte diario; `items` puede ser un generador y se consume una pagina a la vez.
+
+    `resumen` (total_registros, total_ventas) va en el encabezado y el total,
+    asi que se calcula antes, sin recorrer los items.
+    """
     buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
     width, height = letter
+    margin_x = 34
+    doc = SimpleDocTemplate(
+        buffer, pagesize=letter, title=f"Actividad {fecha.strftime('%d/%m/%Y')}",
+        leftMargin=margin_x - _PADDING_MARCO, rightMargin=margin_x - _PADDING_MARCO,
+        topMargin=130 - _PADDING_MARCO, bottomMargin=62 - _PADDING_MARCO,
+    )
+
+    def _pagina(p, doc):
+        p.saveState()
+        p.setFillColor(_ACTIVIDAD_PRIMARY)
+        p.roundRect(20, height - 118, width - 40, 88, 12, fill=1, stroke=0)
+        p.setFillColor(colors.white)
+        p.setFont("Helvetica-Bold", 18)
+        p.drawString(margin_x, height - 66, "REPORTE DE ACTIVIDAD DIARIA")
+        p.setFont("Helvetica", 11)
+        p.drawString(margin_x, height - 84, str(titulo))
+        p.drawRightString(width - margin_x, height - 84, f"Fecha: {fecha.strftime('%d/%m/%Y')}")
+        p.drawRightString(width - margin_x, height - 100, f"Registros: {resumen.get('total_registros', 0)}")
+
+        p.setStrokeColor(_ACTIVIDAD_BORDER)
+        p.line(margin_x, 52, width - margin_x, 52)
+        p.setFillColor(_ACTIVIDAD_MUTED)
+        p.setFont("Helvetica", 8)
+        p.drawString(margin_x, 40, "Reporte generado desde el panel de gestion.")
+        p.drawCentredString(width / 2, 40, f"Pagina {doc.page}")
+        p.drawRightString(width - margin_x, 40, "TortugaTur")
+        p.restoreState()
 
-    color_primary = colors.HexColor("#0F172A")
-    color_border = colors.HexColor("#CBD5E1")
-    color_light = colors.HexColor("#F8FAFC")
+    alto_util = doc.height - 2 * _PADDING_MARCO
+    filas_por_pagina = max(int((alto_util - _ACTIVIDAD_ALTO_ENCABEZADO) // _ACTIVIDAD_ALTO_FILA), 1)
+    tablas = _tablas_actividad(items, filas_por_pagina, resumen.get("total_ventas", 0))
+    doc.build(_FlowablesPerezosos(tablas), onFirstPage=_pagina, onLaterPages=_pagina)
+    buffer.seek(0)
+    return buffer
+
+
+MANIFIESTO_ENCABEZADO = ["#", "Reserva", "Pasajero", "Identificacion", "Telefono", "Ad.", "Ni.", "Estado", "Pago"]
+MANIFIESTO_COLUMNAS = [22, 46, 120, 78, 76, 28, 28, 80, 66]
 
+_MANIFIESTO_ESTILO = [
+    ("BACKGROUND", (0, 0), (-1, 0), _COLOR_PRIMARY),
+    ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("FONTSIZE", (0, 0), (-1, -1), _ACTIVIDAD_FUENTE),
+    ("ALIGN", (0, 0), (1, -1), "CENTER"),
+    ("ALIGN", (5, 0), (6, -1), "CENTER"),
+    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+    ("GRID", (0, 0), (-1, -2), 0.5, _COLOR_BORDER),
+    ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
+    ("BACKGROUND", (0, -1), (-1, -1), _COLOR_LIGHT),
+    ("LINEABOVE", (0, -1), (-1, -1), 1, _COLOR_PRIMARY),
+]
+
+
+def _encabezado_manifiesto(p, salida, empresa, pagina):
+    width, height = letter
     margin_x = 34
-    y_top = height - 42
+    empresa_nombre = (getattr(empresa, "nombre_empresa", "") if empresa is not None else "") or "TortugaTur"
+    hora_salida = salida.hora.strftime("%I:%M %p") if salida.hora else "Por definir"
 
-    p.setFillColor(color_primary)
+    p.setFillColor(_COLOR_PRIMARY)
     p.roundRect(20, height - 118, width - 40, 88, 12, fill=1, stroke=0)
     p.setFillColor(colors.white)
     p.setFont("Helvetica-Bold", 18)
-    p.drawString(margin_x, height - 66, "REPORTE DE ACTIVIDAD DIARIA")
+    p.drawString(margin_x, height - 62, "MANIFIESTO DE PASAJEROS")
     p.setFont("Helvetica", 11)
-    p.drawString(margin_x, height - 84, str(titulo))
-    p.drawRightString(width - margin_x, height - 84, f"Fecha: {fecha.strftime('%d/%m/%Y')}")
-    p.drawRightString(width - margin_x, height - 100, f"Registros: {resumen.get('total_registros', 0)}")
-
-    data = [["Tipo", "Ref", "Secretaria", "Detalle", "Estado", "Hora", "Monto"]]
-    for item in items:
-        hora = item["dt"].strftime("%I:%M %p")
-        monto = f"${float(item['monto']):.2f}" if item.get("monto") else "-"
-        ref = f"#{int(item['id']):05d}"
-        detalle = f"{item.get('titulo', '')} | {item.get('tour', '')}"
-        usuario = str(item.get("usuario", "-"))
-        data.append([
-            str(item.get("tipo", "")).upper(),
-            ref,
-            usuario,
-            detalle,
-            str(item.get("estado", "")).upper(),
-            hora,
-            monto,
-        ])
-
-    if len(data) == 1:
-        data.append(["-", "-", "-", "No hay actividad para esta fecha.", "-", "-", "-"])
-
-    data.append(["", "", "", "", "", "TOTAL VENTAS", f"${float(resumen.get('total_ventas', 0)):,.2f}"])
-
-    row_heights = [22] + [20] * (len(data) - 2) + [24]
-    table = Table(data, colWidths=[50, 55, 80, 160, 80, 60, 65], rowHeights=row_heights)
-    style = [
-        ("BACKGROUND", (0, 0), (-1, 0), color_primary),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("FONTSIZE", (0, 0), (-1, 0), 8),
-        ("GRID", (0, 0), (-1, -2), 0.5, color_border),
-        ("ALIGN", (0, 0), (2, -1), "CENTER"),
-        ("ALIGN", (5, 0), (6, -1), "RIGHT"),
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("FONTNAME", (5, -1), (6, -1), "Helvetica-Bold"),
-        ("BACKGROUND", (0, -1), (-1, -1), color_light),
-        ("LINEABOVE", (0, -1), (-1, -1), 1, color_primary),
-    ]
-    table.setStyle(TableStyle(style))
-
-    table_h = sum(row_heights)
-    y_table = y_top - 110 - table_h
-    if y_table < 70:
-        y_table = 70
-    table.wrapOn(p, margin_x, y_table)
-    table.drawOn(p, margin_x, y_table)
+    p.drawString(margin_x, height - 80, f"{_safe_text(salida.tour.nombre)} - {_safe_text(salida.tour.destino.nombre)}")
+    p.drawString(margin_x, height - 96, empresa_nombre.upper())
+    p.setFont("Helvetica-Bold", 11)
+    p.drawRightString(width - margin_x, height - 62, f"Salida #{salida.id}")
+    p.setFont("Helvetica", 11)
+    p.drawRightString(width - margin_x, height - 80, f"{salida.fecha.strftime('%d/%m/%Y')} {hora_salida}")
+    p.drawRightString(width - margin_x, height - 96, f"Cupos: {salida.cupos_disponibles}/{salida.cupo_maximo}")
 
-    p.setStrokeColor(color_border)
+    p.setStrokeColor(_COLOR_BORDER)
     p.line(margin_x, 52, width - margin_x, 52)
-    p.setFillColor(colors.HexColor("#64748B"))
+    p.setFillColor(_COLOR_MUTED)
     p.setFont("Helvetica", 8)
-    p.drawString(margin_x, 40, "Reporte generado desde el panel de gestion.")
-    p.drawRightString(width - margin_x, 40, "TortugaTur")
+    p.drawString(margin_x, 40, "Firma del guia: ________________________________")
+    p.drawRightString(width - margin_x, 40, f"Manifiesto - pagina {pagina}")
 
-    p.showPage()
+
+def dibujar_manifiesto(p, salida, reservas, empresa=None):
+    """Paginas del manifiesto de `salida` en `p`, cerradas con showPage().
+
+    `reservas` son las que embarcan, con `proveedor_pago` (nombre del proveedor
+    del pago exitoso o None) ya anotado; no se consulta nada aqui.
+    """
+    width, height = letter
+    margin_x = 34
+    data = [MANIFIESTO_ENCABEZADO]
+    adultos = ninos = cantidad = 0
+    for cantidad, reserva in enumerate(reservas, 1):
+        adultos += reserva.adultos
+        ninos += reserva.ninos
+        pasajero = f"{_safe_text(reserva.apellidos, '')}, {_safe_text(reserva.nombre, '')}".strip(", ")
+        data.append([
+            str(cantidad),
+            f"#{reserva.id:06d}",
+            _recortar(pasajero or "-", MANIFIESTO_COLUMNAS[2] - 2 * _PADDING_CELDA),
+            _recortar(_safe_text(reserva.identificacion), MANIFIESTO_COLUMNAS[3] - 2 * _PADDING_CELDA),
+            _recortar(_safe_text(reserva.telefono), MANIFIESTO_COLUMNAS[4] - 2 * _PADDING_CELDA),
+            str(reserva.adultos),
+            str(reserva.ninos),
+            _recortar(reserva.get_estado_display(), MANIFIESTO_COLUMNAS[7] - 2 * _PADDING_CELDA),
+            _recortar(_safe_text(getattr(reserva, "proveedor_pago", None)), MANIFIESTO_COLUMNAS[8] - 2 * _PADDING_CELDA),
+        ])
+    if len(data) == 1:
+        data.append(["-", "-", "Sin pasajeros confirmados.", "-", "-", "-", "-", "-", "-"])
+    data.append(["", "", f"{cantidad} reservas", "", "TOTAL PAX", str(adultos), str(ninos), f"{adultos + ninos} pax", ""])
+
+    pendiente = LongTable(data, colWidths=MANIFIESTO_COLUMNAS, rowHeights=_ACTIVIDAD_ALTO_FILA,
+                          repeatRows=1, style=TableStyle(_MANIFIESTO_ESTILO))
+    pagina = 0
+    while pendiente is not None:
+        pagina += 1
+        _encabezado_manifiesto(p, salida, empresa, pagina)
+        marco = Frame(margin_x - _PADDING_MARCO, 62 - _PADDING_MARCO,
+                      width - 2 * margin_x + 2 * _PADDING_MARCO, height - 130 - 62 + 2 * _PADDING_MARCO)
+        if marco.add(pendiente, p):
+            pendiente = None
+        else:
+            # La tabla sigue en la pagina siguiente, con el encabezado repetido
+            partes = marco.split(pendiente, p)
+            marco.add(partes[0], p)
+            pendiente = partes[1] if len(partes) > 1 else None
+        p.showPage()
+
+
+def generar_tickets_embarque_pdf(grupos, empresa=None, con_tickets=True):
+    """Un solo PDF para los guias: por cada (salida, reservas), el manifiesto y un ticket por pagina.
+
+    Todo va en un canvas, asi que las fuentes y recursos se escriben una vez
+    en el documento en lugar de una por ticket.
+    """
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+    p.setTitle("Tickets de embarque")
+    for salida, reservas in grupos:
+        dibujar_manifiesto(p, salida, reservas, empresa)
+        if con_tickets:
+            for reserva in reservas:
+                dibujar_ticket(p, reserva, empresa)
+                p.showPage()
     p.save()
     buffer.seek(0)
     return buffer
@@ -2,6 +2,8 @@
 import logging
 import hmac
 import hashlib
+import uuid
+from time import perf_counter
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 
 import requests
@@ -11,21 +13,23 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.models import Group, User
-from django.core.mail import send_mail, EmailMessage, EmailMultiAlternatives
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from datetime import timedelta, datetime, time
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
-from django.db import transaction
-from django.db.models import Q, Sum
-from collections import defaultdict
-from .models import Destino, Tour, SalidaTour, Reserva, Pago, Resena, Ticket, EmpresaConfig
-from .utils import generar_ticket_pdf, generar_actividad_dia_pdf
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum, Exists, OuterRef, Subquery
+from .models import Destino, Tour, SalidaTour, DisponibilidadSalida, Reserva, ActividadDia, Pago, WebhookEvent, Resena, Ticket, EmpresaConfig
+from .utils import generar_actividad_dia_pdf
+from .routers import lecturas_en_replica
+from . import correos, cupos, embarque, exportes, paypal, programacion, proveedores, resumenes, roles, tareas, tickets
 from .forms import DestinoForm, TourForm, RegistroTuristaForm, ContactoForm, TuristaLoginForm, EmpresaConfigForm
 
 logger = logging.getLogger(__name__)
@@ -35,6 +39,10 @@ CHILD_PRICE_3_5 = Decimal("35.00")
 CHILD_PRICE_NORMAL = Decimal("70.00")
 GROUP_SECRETARIA = "secretaria"
 GROUP_AGENCIA = "agencia"
+RESERVAS_POR_PAGINA = 50
+MAX_DIAS_PROGRAMACION = 731
+# Estados en los que la reserva ocupa cupos de la salida
+ESTADOS_CON_CUPO = ("confirmada", "pagada", "bloqueada_por_agencia")
 
 
 def _precio_nino_por_edad(edad_nino):
@@ -47,84 +55,68 @@ def _precio_nino_por_edad(edad_nino):
     return CHILD_PRICE_NORMAL
 
 
-def _agenda_actividad(reservas, salidas):
-    agenda = defaultdict(list)
-
-    for reserva in reservas:
-        fecha_ref = reserva.fecha_reserva.date()
-        agenda[fecha_ref].append({
-            "tipo": "reserva",
-            "dt": reserva.fecha_reserva,
-            "id": reserva.id,
-            "titulo": f"{reserva.nombre} {reserva.apellidos}".strip(),
-            "tour": reserva.salida.tour.nombre,
-            "estado": reserva.estado,
-            "monto": reserva.total_pagar,
-        })
-
-    for salida in salidas:
-        hora_ref = salida.hora if salida.hora else time.min
-        dt_salida = timezone.make_aware(datetime.combine(salida.fecha, hora_ref), timezone.get_current_timezone())
-        agenda[salida.fecha].append({
-            "tipo": "salida",
-            "dt": dt_salida,
-            "id": salida.id,
-            "titulo": salida.tour.nombre,
-            "tour": salida.tour.nombre,
-            "estado": f"{salida.cupos_disponibles}/{salida.cupo_maximo} cupos",
-            "monto": None,
-        })
-
-    resultado = []
-    for fecha, items in sorted(agenda.items(), key=lambda x: x[0], reverse=True):
-        items_sorted = sorted(items, key=lambda x: x["dt"], reverse=True)
-        resultado.append({"fecha": fecha, "eventos": items_sorted})
-    return resultado
-
-
-def _secretaria_actividad_dia(user, fecha):
-    reservas_dia = (
-        Reserva.objects.filter(creado_por=user, fecha_reserva__date=fecha)
-        .exclude(estado="cancelada")
-        .select_related("salida__tour")
-        .prefetch_related("pagos")
-    )
-    salidas_dia = (
-        SalidaTour.objects.filter(creado_por=user, fecha=fecha)
-        .select_related("tour")
+def _filas_actividad_dia(fecha, filtro=None):
+    """ActividadDia de un dia (sin reservas canceladas), del evento mas reciente al mas antiguo."""
+    filas = (
+        ActividadDia.objects.filter(fecha=fecha)
+        .filter(Q(reserva__isnull=True) | ~Q(reserva__estado="cancelada"))
+        .select_related("reserva__salida__tour", "salida__tour")
     )
+    if filtro is not None:
+        filas = filas.filter(filtro)
+    return filas.order_by("-dt", "-id")
+
 
-    items = []
-    for res in reservas_dia:
-        pago_ok = next((p for p in res.pagos.all() if p.estado == "paid"), None)
-        items.append({
+def _item_actividad(act):
+    if act.tipo == "reserva":
+        res = act.reserva
+        return {
             "tipo": "reserva",
-            "dt": res.fecha_reserva,
+            "dt": act.dt,
             "id": res.id,
             "titulo": f"{res.nombre} {res.apellidos}".strip(),
             "tour": res.salida.tour.nombre,
             "estado": res.estado,
             "monto": res.total_pagar,
-            "metodo_pago": pago_ok.get_proveedor_display() if pago_ok else "Pendiente",
-            "usuario": user.username,
-        })
+            "metodo_pago": act.metodo_pago,
+            "usuario": act.autor_nombre,
+        }
+    sal = act.salida
+    return {
+        "tipo": "salida",
+        "dt": act.dt,
+        "id": sal.id,
+        "titulo": sal.tour.nombre,
+        "tour": sal.tour.nombre,
+        "estado": f"{sal.cupos_disponibles}/{sal.cupo_maximo} cupos",
+        "monto": None,
+        "metodo_pago": "-",
+        "usuario": act.autor_nombre,
+    }
+
+
+def _actividad_dia(fecha, filtro=None):
+    """Eventos de un dia desde ActividadDia: una consulta, sin importar el historial."""
+    return [_item_actividad(act) for act in _filas_actividad_dia(fecha, filtro)]
+
 
-    for sal in salidas_dia:
-        hora_ref = sal.hora if sal.hora else time.min
-        dt_salida = timezone.make_aware(datetime.combine(sal.fecha, hora_ref), timezone.get_current_timezone())
-        items.append({
-            "tipo": "salida",
-            "dt": dt_salida,
-            "id": sal.id,
-            "titulo": sal.tour.nombre,
-            "tour": sal.tour.nombre,
-            "estado": f"{sal.cupos_disponibles}/{sal.cupo_maximo} cupos",
-            "monto": None,
-            "metodo_pago": "-",
-            "usuario": user.username,
+def _resumen_actividad(items):
+    """Reservas, salidas y ventas del dia por usuario."""
+    por_usuario = {}
+    for item in items:
+        fila = por_usuario.setdefault(item["usuario"], {
+            "usuario": item["usuario"], "reservas": 0, "salidas": 0, "ventas": Decimal("0.00"),
         })
+        if item["tipo"] == "reserva":
+            fila["reservas"] += 1
+            fila["ventas"] += item["monto"] or Decimal("0.00")
+        else:
+            fila["salidas"] += 1
+    return sorted(por_usuario.values(), key=lambda f: f["ventas"], reverse=True)
+
 
-    return sorted(items, key=lambda x: x["dt"], reverse=True)
+def _secretaria_actividad_dia(user, fecha):
+    return _actividad_dia(fecha, Q(autor=user))
 
 # ============================================
 # VISTAS PÃšBLICAS
@@ -178,32 +170,34 @@ def lista_tours(request):
     if not (destino_id and fecha and personas):
         return render(request, "core/lista_tours.html", {"tours_con_salidas": {}})
         
-    # Eliminada la generaciÃ³n automÃ¡tica para evitar saturaciÃ³n.
-    # Las salidas ahora se crean manualmente o por bulto desde el panel.
-    
-    salidas_brutas = SalidaTour.objects.filter(
-        tour__destino_id=destino_id,
-        fecha=fecha,
-        cupos_disponibles__gte=int(personas)
-    ).select_related('tour').order_by('hora')
+    # Aqui no se generan salidas: las crea el panel o, en bloque y fuera de la
+    # peticion, "manage.py materialize_salidas" desde cron.
 
     ahora = timezone.now()
     fecha_hoy = ahora.date()
     hora_actual = ahora.time()
 
-    # Agrupamos por Tour y filtramos fechas/horas pasadas
+    try:
+        fecha_obj = datetime.strptime(fecha, "%Y-%m-%d").date()
+    except ValueError:
+        fecha_obj = None
+
     tours_con_salidas = {}
-    for s in salidas_brutas:
-        # Invalidar si la fecha de bÃºsqueda ya pasÃ³
-        if s.fecha < fecha_hoy:
-            continue
-        # Invalidar si es hoy y la hora ya pasÃ³
-        if s.fecha == fecha_hoy and s.hora and s.hora < hora_actual:
-            continue
-            
-        if s.tour not in tours_con_salidas:
-            tours_con_salidas[s.tour] = []
-        tours_con_salidas[s.tour].append(s)
+    # Fechas pasadas nunca tienen salidas disponibles
+    if fecha_obj and fecha_obj >= fecha_hoy:
+        # Una sola consulta sobre el indice (destino, fecha, cupos)
+        disponibles = DisponibilidadSalida.objects.filter(
+            destino_id=destino_id,
+            fecha=fecha_obj,
+            cupos_disponibles__gte=int(personas),
+        )
+        if fecha_obj == fecha_hoy:
+            # Invalidar si es hoy y la hora ya pasÃ³
+            disponibles = disponibles.filter(Q(hora__isnull=True) | Q(hora__gte=hora_actual))
+
+        for disp in disponibles.select_related("salida__tour__destino").order_by("hora"):
+            s = disp.salida
+            tours_con_salidas.setdefault(s.tour, []).append(s)
 
     currency_code, currency_rate = _currency_context(request)
     for tour in tours_con_salidas.keys():
@@ -383,10 +377,6 @@ def tour_detalle(request, pk):
 
                 # Crear reserva bloqueada y descontar cupos
                 with transaction.atomic():
-                    salida = SalidaTour.objects.select_for_update().get(id=salida.id)
-                    if salida.cupos_disponibles < total_personas:
-                         raise ValueError("Cupos no disponibles")
-
                     reserva = Reserva.objects.create(
                         usuario=request.user,
                         salida=salida,
@@ -403,9 +393,8 @@ def tour_detalle(request, pk):
                         archivo_agencia=archivo_agencia,
                         limite_pago_agencia=fecha_limite
                     )
-
-                    salida.cupos_disponibles -= total_personas
-                    salida.save(update_fields=["cupos_disponibles"])
+                    # Falla con CuposInsuficientes y revierte la reserva si otro se llevo los cupos
+                    cupos.retener_reserva(reserva, motivo="Bloqueo de agencia")
 
                 msg = "Â¡Bloqueo exitoso! Tienes la responsabilidad de confirmar o cancelar esta reserva antes de la fecha lÃ­mite."
                 if is_ajax:
@@ -425,22 +414,22 @@ def tour_detalle(request, pk):
                 total_ninos = sum(_precio_nino_por_edad(edad) for edad in edades_ninos)
                 total_pagar = (adultos * precio_adulto) + total_ninos
 
-                # Crear la reserva con estado PENDIENTE (hasta que pague)
-                reserva = Reserva.objects.create(
-                    usuario=request.user if request.user.is_authenticated else None,
-                    salida=salida,
-                    adultos=adultos,
-                    ninos=ninos,
-                    total_pagar=total_pagar,
-                    nombre=nombre if nombre else (request.user.first_name if request.user.is_authenticated else ""),
-                    apellidos="",  # Puedes agregar este campo al formulario si quieres
-                    correo=request.user.email if request.user.is_authenticated else "",
-                    telefono=telefono,
-                    identificacion=identificacion,
-                    estado="pendiente"  # IMPORTANTE: Pendiente hasta que pague
-                )
-
-                # NO descontamos cupos aquÃ­, se descontarÃ¡n despuÃ©s del pago
+                # Crear la reserva PENDIENTE y retener sus cupos mientras paga
+                with transaction.atomic():
+                    reserva = Reserva.objects.create(
+                        usuario=request.user if request.user.is_authenticated else None,
+                        salida=salida,
+                        adultos=adultos,
+                        ninos=ninos,
+                        total_pagar=total_pagar,
+                        nombre=nombre if nombre else (request.user.first_name if request.user.is_authenticated else ""),
+                        apellidos="",  # Puedes agregar este campo al formulario si quieres
+                        correo=request.user.email if request.user.is_authenticated else "",
+                        telefono=telefono,
+                        identificacion=identificacion,
+                        estado="pendiente"  # IMPORTANTE: Pendiente hasta que pague
+                    )
+                    cupos.retener_temporal(reserva)
 
                 # Responder con la URL del checkout
                 if is_ajax:
@@ -453,6 +442,12 @@ def tour_detalle(request, pk):
                     messages.success(request, "Reserva iniciada. Completa el pago para confirmar.")
                     return redirect('checkout_reserva', reserva_id=reserva.id)
 
+        except cupos.CuposInsuficientes:
+            error_msg = "No hay suficientes cupos disponibles para esta salida."
+            if is_ajax:
+                return JsonResponse({'error': error_msg}, status=400)
+            messages.error(request, error_msg)
+            return redirect('tour_detalle', pk=pk)
         except Exception as e:
             error_msg = f"Error al procesar la reserva: {str(e)}"
             if is_ajax:
@@ -522,9 +517,16 @@ def ticket_reserva(request, reserva_id):
     return render(request, "core/ticket.html", {"reserva": reserva, "empresa": _empresa_config()})
 
 def ver_ticket_pdf(request, reserva_id):
-    reserva = get_object_or_404(Reserva, id=reserva_id)
-    buffer = generar_ticket_pdf(reserva, _empresa_config())
-    return HttpResponse(buffer.getvalue(), content_type='application/pdf')
+    reserva = get_object_or_404(Reserva.objects.select_related("salida__tour__destino"), id=reserva_id)
+    empresa = _empresa_config()
+    clave = tickets.huella(reserva, empresa)
+    etag = quote_etag(clave)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(tickets.ticket_pdf(reserva, empresa, clave=clave), content_type='application/pdf')
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
 # ============================================
 # CHECKOUT Y PAGO (ACTUALIZADO)
@@ -567,48 +569,39 @@ def procesar_pago(request):
         cvv = request.POST.get('cvv')
         
         try:
-            reserva = get_object_or_404(Reserva, id=reserva_id)
-            
-            # Verificar que la reserva estÃ© pendiente
-            if reserva.estado != 'pendiente':
-                messages.warning(request, 'Esta reserva ya fue procesada.')
-                return redirect('tours')
-            
-            # AquÃ­ irÃ­a la integraciÃ³n con pasarela de pago real
-            # Por ahora, simulamos que el pago fue exitoso
-            
-            # Actualizar la reserva a PAGADA
-            reserva.estado = 'pagada'
-            if email:
-                reserva.correo = email.strip().lower()
-            reserva.save()
-            
-            # AHORA SÃ descontamos los cupos
-            salida = reserva.salida
-            total_personas = reserva.adultos + reserva.ninos
-            salida.cupos_disponibles -= total_personas
-            salida.save()
+            with transaction.atomic():
+                reserva = get_object_or_404(Reserva.objects.select_for_update(), id=reserva_id)
+
+                # Verificar que la reserva estÃ© pendiente
+                if reserva.estado != 'pendiente':
+                    messages.warning(request, 'Esta reserva ya fue procesada.')
+                    return redirect('tours')
+
+                # AquÃ­ irÃ­a la integraciÃ³n con pasarela de pago real
+                # Por ahora, simulamos que el pago fue exitoso
+
+                # Descontar cupos con UPDATE condicional, sin bloquear la salida
+                cupos.retener_reserva(reserva, motivo="Pago simulado")
+
+                # Actualizar la reserva a PAGADA
+                resumenes.registrar_cambio_estado(reserva, reserva.estado, 'pagada')
+                reserva.estado = 'pagada'
+                reserva.retencion_hasta = None
+                if email:
+                    reserva.correo = email.strip().lower()
+                reserva.save()
             
-            # Generar y enviar ticket por email
+            # Encolar el ticket por email; el PDF se adjunta al enviarlo
             try:
-                pdf_buffer = generar_ticket_pdf(reserva, _empresa_config())
-                pdf_content = pdf_buffer.getvalue()
-                pdf_buffer.close()
-                
                 asunto = f"âœ… ConfirmaciÃ³n de Reserva #{reserva.id:06d} - TortugaTur"
                 mensaje_html = render_to_string("core/email_ticket.html", {"reserva": reserva, "empresa": _empresa_config()})
-                
-                # Enviar al cliente
-                email_cliente = EmailMessage(
-                    subject=asunto,
-                    body=mensaje_html,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[reserva.correo if reserva.correo else email],
+                correos.encolar(
+                    asunto,
+                    [reserva.correo if reserva.correo else email],
+                    html=mensaje_html,
+                    reserva=reserva,
+                    adjuntar_ticket=True,
                 )
-                email_cliente.content_subtype = "html"
-                email_cliente.attach(f"Ticket_TortugaTur_{reserva.id}.pdf", pdf_content, "application/pdf")
-                email_cliente.send(fail_silently=True)
-                
             except Exception as e:
                 print(f"Error enviando email: {e}")
             
@@ -630,15 +623,10 @@ def es_admin(user):
     return user.is_staff or user.is_superuser
 
 def es_secretaria(user):
-    return user.is_authenticated and user.groups.filter(name__iexact=GROUP_SECRETARIA).exists()
+    return roles.tiene_grupo(user, GROUP_SECRETARIA)
 
 def es_agencia(user):
-    if not user.is_authenticated:
-        return False
-    if user.groups.filter(name__iexact=GROUP_AGENCIA).exists():
-        return True
-    perfil = getattr(user, "perfil", None)
-    return bool(perfil and getattr(perfil, "is_agencia", False))
+    return roles.tiene_grupo(user, GROUP_AGENCIA) or roles.roles_de(user)["agencia"]
 
 def es_staff_o_secretaria(user):
     return es_admin(user) or es_secretaria(user)
@@ -648,6 +636,7 @@ def es_admin_o_secretaria(user):
 
 @login_required
 @user_passes_test(es_admin_o_secretaria)
+@lecturas_en_replica
 def panel_admin(request):
     actividad_fecha_str = (request.GET.get("actividad_fecha") or "").strip()
     try:
@@ -675,55 +664,15 @@ def panel_admin(request):
                 .distinct()
                 .order_by("-id")[:8]
             )
-            agenda_admin = _agenda_actividad(
-                Reserva.objects.filter(creado_por__groups=secretaria_group)
-                .exclude(estado="cancelada")
-                .select_related("creado_por", "salida__tour")
-                .distinct()
-                .order_by("-fecha_reserva")[:400],
-                SalidaTour.objects.filter(creado_por__groups=secretaria_group)
-                .select_related("creado_por", "tour")
-                .distinct()
-                .order_by("-id")[:400],
-            )
-            agenda_dia = next((g["eventos"] for g in agenda_admin if g["fecha"] == actividad_fecha), [])
+            agenda_dia = _actividad_dia(actividad_fecha, Q(autor__groups=secretaria_group))
             context["agenda_secretarias_dia"] = agenda_dia
+            context["resumen_actividad_dia"] = _resumen_actividad(agenda_dia)
         else:
             context["actividad_reservas"] = []
             context["actividad_salidas"] = []
             context["agenda_secretarias_dia"] = []
     elif context["es_secretaria_panel"]:
-        reservas_secretaria = (
-            Reserva.objects.filter(creado_por=request.user)
-            .exclude(estado="cancelada")
-            .select_related("salida__tour")
-            .prefetch_related("pagos")
-            .order_by("-fecha_reserva")
-        )
-        total_ventas_pagadas = sum((r.total_pagar for r in reservas_secretaria if r.estado == "pagada"), Decimal("0.00"))
-        efectivo_cobrado = (
-            Pago.objects.filter(
-                reserva__creado_por=request.user,
-                estado="paid",
-                proveedor="efectivo",
-            ).aggregate(total=Sum("monto")).get("total") or Decimal("0.00")
-        )
-        historial_ventas = list(reservas_secretaria[:20])
-        for res in historial_ventas:
-            pago_ok = next((p for p in res.pagos.all() if p.estado == "paid"), None)
-            res.metodo_pago = pago_ok.get_proveedor_display() if pago_ok else "Pendiente"
-
-        context["resumen_secretaria"] = {
-            "total_reservas": reservas_secretaria.count(),
-            "total_ventas": total_ventas_pagadas,
-            "total_efectivo": efectivo_cobrado,
-            "total_pasajeros": sum((r.total_personas() for r in reservas_secretaria), 0),
-        }
-        salidas_secretaria = (
-            SalidaTour.objects.filter(creado_por=request.user)
-            .select_related("tour")
-            .order_by("-id")
-        )
+        context["resumen_secretaria"] = resumenes.kpis_secretaria(request.user)
         context["agenda_secretaria_dia"] = _secretaria_actividad_dia(request.user, actividad_fecha)
 
     return render(request, "core/panel/index.html", context)
@@ -731,6 +680,7 @@ def panel_admin(request):
 
 @login_required
 @user_passes_test(es_admin_o_secretaria)
+@lecturas_en_replica
 def descargar_actividad_dia_pdf(request):
     actividad_fecha_str = (request.GET.get("actividad_fecha") or "").strip()
     try:
@@ -740,62 +690,19 @@ def descargar_actividad_dia_pdf(request):
         return redirect("panel_admin")
 
     if es_secretaria(request.user) and not es_admin(request.user):
-        items = _secretaria_actividad_dia(request.user, actividad_fecha)
+        filas = _filas_actividad_dia(actividad_fecha, Q(autor=request.user))
         titulo = f"Actividad del dia - Secretaria {request.user.username}"
     else:
-        reservas_admin = (
-            Reserva.objects.filter(fecha_reserva__date=actividad_fecha)
-            .exclude(estado="cancelada")
-            .select_related("salida__tour", "creado_por", "usuario")
-            .prefetch_related("pagos")
-            .distinct()
-        )
-        salidas_admin = (
-            SalidaTour.objects.filter(fecha=actividad_fecha)
-            .select_related("tour", "creado_por")
-            .distinct()
-        )
-        items = []
-        for res in reservas_admin:
-            pago_ok = next((p for p in res.pagos.all() if p.estado == "paid"), None)
-            if res.creado_por:
-                autor = res.creado_por.username
-            elif res.usuario:
-                autor = res.usuario.username
-            else:
-                autor = "web"
-            items.append({
-                "tipo": "reserva",
-                "dt": res.fecha_reserva,
-                "id": res.id,
-                "titulo": f"{res.nombre} {res.apellidos}".strip(),
-                "tour": res.salida.tour.nombre,
-                "estado": res.estado,
-                "monto": res.total_pagar,
-                "metodo_pago": pago_ok.get_proveedor_display() if pago_ok else "Pendiente",
-                "usuario": autor,
-            })
-        for sal in salidas_admin:
-            hora_ref = sal.hora if sal.hora else time.min
-            dt_salida = timezone.make_aware(datetime.combine(sal.fecha, hora_ref), timezone.get_current_timezone())
-            items.append({
-                "tipo": "salida",
-                "dt": dt_salida,
-                "id": sal.id,
-                "titulo": sal.tour.nombre,
-                "tour": sal.tour.nombre,
-                "estado": f"{sal.cupos_disponibles}/{sal.cupo_maximo} cupos",
-                "monto": None,
-                "metodo_pago": "-",
-                "usuario": sal.creado_por.username if sal.creado_por else "sistema",
-            })
-        items = sorted(items, key=lambda x: x["dt"], reverse=True)
+        filas = _filas_actividad_dia(actividad_fecha)
         titulo = "Actividad general del dia"
 
-    resumen = {
-        "total_registros": len(items),
-        "total_ventas": sum((item["monto"] or Decimal("0.00") for item in items), Decimal("0.00")),
-    }
+    # El resumen sale de un agregado y las filas de un iterador: el PDF se arma
+    # pagina a pagina sin cargar el dia entero en memoria
+    resumen = filas.aggregate(
+        total_registros=Count("id"),
+        total_ventas=Sum("reserva__total_pagar", filter=Q(tipo="reserva"), default=Decimal("0.00")),
+    )
+    items = (_item_actividad(act) for act in filas.iterator(chunk_size=500))
     buffer = generar_actividad_dia_pdf(titulo, actividad_fecha, items, resumen)
     response = HttpResponse(buffer.getvalue(), content_type="application/pdf")
     response["Content-Disposition"] = f'attachment; filename="actividad_{actividad_fecha.strftime("%Y%m%d")}.pdf"'
@@ -820,33 +727,95 @@ def empresa_config(request):
         form = EmpresaConfigForm(instance=empresa)
     return render(request, "core/panel/empresa_config.html", {"form": form})
 
+
+def _pagina_por_id(query, antes=None, despues=None):
+    """Pagina de RESERVAS_POR_PAGINA filas por id (keyset), de la mas nueva a la mas antigua.
+
+    No hay OFFSET que recorra las paginas anteriores. Devuelve
+    (filas, cursor_antes, cursor_despues); los cursores son None en los extremos.
+    """
+    if despues is not None:
+        filas = list(query.filter(id__gt=despues).order_by("id")[:RESERVAS_POR_PAGINA + 1])
+        hay_mas_recientes = len(filas) > RESERVAS_POR_PAGINA
+        filas = filas[:RESERVAS_POR_PAGINA][::-1]
+        hay_mas_antiguas = True
+    else:
+        if antes is not None:
+            query = query.filter(id__lt=antes)
+        filas = list(query.order_by("-id")[:RESERVAS_POR_PAGINA + 1])
+        hay_mas_antiguas = len(filas) > RESERVAS_POR_PAGINA
+        filas = filas[:RESERVAS_POR_PAGINA]
+        hay_mas_recientes = antes is not None
+    return (
+        filas,
+        filas[-1].id if filas and hay_mas_antiguas else None,
+        filas[0].id if filas and hay_mas_recientes else None,
+    )
+
+
 @login_required
 @user_passes_test(es_admin)
+@lecturas_en_replica
 def admin_reservas(request):
-    Reserva.objects.filter(pagos__estado="paid").exclude(estado="pagada").update(estado="pagada")
-    
+    # La conciliacion con los pagos corre aparte (comando conciliar_pagos), no en cada visita
+
     # Filtros
     fecha_filtro = request.GET.get('fecha')
-    
+    antes = _parse_int(request.GET.get('antes'), None)
+    despues = _parse_int(request.GET.get('despues'), None)
+
+    pagos_exitosos = Pago.objects.filter(reserva=OuterRef("pk"), estado="paid").order_by("-creado_en")
     reservas_query = (
-        Reserva.objects.select_related("salida__tour")
-        .prefetch_related("pagos")
+        Reserva.objects.select_related("salida__tour", "creado_por")
         .exclude(estado="pendiente")
+        .annotate(
+            tiene_pago=Exists(pagos_exitosos),
+            proveedor_pago_codigo=Subquery(pagos_exitosos.values("proveedor")[:1]),
+        )
     )
     
     if fecha_filtro:
         reservas_query = reservas_query.filter(salida__fecha=fecha_filtro)
-        
-    reservas = reservas_query.order_by("-id")
-    
+
+    total_ganancias = reservas_query.aggregate(
+        total=Sum("total_pagar", filter=Q(estado="pagada") | Q(tiene_pago=True))
+    )["total"] or 0
+
+    reservas, cursor_antes, cursor_despues = _pagina_por_id(reservas_query, antes, despues)
+
+    nombres_proveedor = dict(Pago.PROVEEDORES)
     for reserva in reservas:
-        reserva.tiene_pago = any(pago.estado == "paid" for pago in reserva.pagos.all())
-        pago_exitoso = next((pago for pago in reserva.pagos.all() if pago.estado == "paid"), None)
-        if pago_exitoso:
-            reserva.proveedor_pago = pago_exitoso.get_proveedor_display()
-        else:
-            reserva.proveedor_pago = None
-    return render(request, "core/panel/reservas.html", {"reservas": reservas})
+        reserva.proveedor_pago = nombres_proveedor.get(reserva.proveedor_pago_codigo)
+    return render(request, "core/panel/reservas.html", {
+        "reservas": reservas,
+        "total_ganancias": total_ganancias,
+        "fecha_filtro": fecha_filtro or "",
+        "cursor_antes": cursor_antes,
+        "cursor_despues": cursor_despues,
+    })
+
+@login_required
+@user_passes_test(es_admin)
+@lecturas_en_replica
+def exportar_reservas(request):
+    try:
+        filtros = exportes.leer_filtros(request.GET)
+        filas = exportes.consulta(**filtros)
+        # El cuerpo se genera despues de que la vista retorna (fuera de
+        # @lecturas_en_replica): se fija aqui la base elegida por el router
+        filas = filas.using(filas.db)
+        bloques = exportes.generar(filtros, filas)
+    except ValueError as exc:
+        messages.error(request, str(exc))
+        return redirect("admin_reservas")
+
+    if filtros["formato"] == "xlsx":
+        content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        content_type = "text/csv; charset=utf-8"
+    response = StreamingHttpResponse(bloques, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{exportes.nombre_archivo(filtros)}"'
+    return response
 
 @login_required
 @user_passes_test(es_admin)
@@ -855,8 +824,26 @@ def cambiar_estado_reserva(request, reserva_id):
     if request.method == "POST":
         nuevo_estado = request.POST.get("estado")
         if nuevo_estado in ["pendiente", "confirmada", "cancelada", "pagada", "bloqueada_por_agencia"]:
-            reserva.estado = nuevo_estado
-            reserva.save()
+            try:
+                with transaction.atomic():
+                    # Bloqueada para que una cancelacion y liberar_retenciones_vencidas no liberen dos veces
+                    reserva = Reserva.objects.select_for_update().get(id=reserva_id)
+                    estado_anterior = reserva.estado
+                    resumenes.registrar_cambio_estado(reserva, estado_anterior, nuevo_estado)
+                    reserva.estado = nuevo_estado
+                    if nuevo_estado == "cancelada":
+                        reserva.retencion_hasta = None
+                    reserva.save()
+                    if nuevo_estado == "cancelada":
+                        cupos.liberar_reserva(reserva, motivo="Reserva cancelada")
+                    elif estado_anterior == "cancelada" and nuevo_estado in ESTADOS_CON_CUPO:
+                        cupos.retener_reserva(reserva, motivo="Reserva reactivada")
+            except cupos.CuposInsuficientes:
+                messages.error(
+                    request,
+                    f"La reserva #{reserva.id} no se puede reactivar: la salida ya no tiene cupos suficientes.",
+                )
+                return redirect("admin_reservas")
             messages.success(request, f"Reserva #{reserva.id} actualizada correctamente.")
     return redirect("admin_reservas")
 
@@ -910,6 +897,7 @@ def crear_agencia(request):
         perfil.is_agencia = True
         perfil.save()
         user.groups.add(group_agencia)
+        roles.invalidar(user)
         messages.success(request, f"Agencia creada. Usuario: {username} | Contrasena: {password}")
     except Exception as e:
         messages.error(request, f"Ocurrio un error al crear la agencia: {e}")
@@ -934,6 +922,7 @@ def toggle_agencia(request, user_id):
 
     perfil.is_agencia = ahora_es_agencia
     perfil.save()
+    roles.invalidar(user)
     if ahora_es_agencia:
         messages.success(request, f"{user.username} ha sido convertida en Agencia.")
     else:
@@ -947,7 +936,10 @@ def eliminar_reserva(request, reserva_id):
     if request.method == "POST":
         reserva_id = reserva.id
         nombre = f"{reserva.nombre} {reserva.apellidos}".strip() or "Cliente"
-        reserva.delete()
+        with transaction.atomic():
+            cupos.liberar_reserva(reserva, motivo=f"Reserva #{reserva_id} eliminada")
+            resumenes.registrar_eliminacion(reserva)
+            reserva.delete()
         messages.success(request, f"Reserva #{reserva_id} de {nombre} eliminada correctamente.")
     return redirect("admin_reservas")
 
@@ -972,6 +964,36 @@ def admin_salidas(request):
         "puede_gestionar_salidas": puede_gestionar_salidas,
     })
 
+@login_required
+@user_passes_test(es_admin_o_secretaria)
+@lecturas_en_replica
+def tickets_embarque(request):
+    salida_id = _parse_int(request.GET.get("salida"), None)
+    fecha_str = (request.GET.get("fecha") or "").strip()
+    formato = request.GET.get("formato") or "pdf"
+    try:
+        fecha = datetime.strptime(fecha_str, "%Y-%m-%d").date() if fecha_str else None
+    except ValueError:
+        fecha = None
+    if formato not in embarque.FORMATOS or (salida_id is None and fecha is None):
+        messages.error(request, "Indica una salida o una fecha valida para generar los tickets.")
+        return redirect("admin_salidas")
+
+    empresa = _empresa_config()
+    grupos = embarque.lote(salida_id=salida_id, fecha=fecha)
+    if not grupos:
+        messages.error(request, "No hay reservas que embarquen en esa salida o fecha.")
+        return redirect("admin_salidas")
+
+    if formato == "zip":
+        # En el request no se levanta el pool de procesos: eso queda para el comando
+        response = HttpResponse(embarque.zip_tickets(grupos, empresa, procesos=1), content_type="application/zip")
+    else:
+        response = HttpResponse(embarque.pdf(grupos, empresa), content_type="application/pdf")
+    nombre = embarque.nombre_archivo(formato, salida_id=salida_id, fecha=fecha)
+    response["Content-Disposition"] = f'attachment; filename="{nombre}"'
+    return response
+
 @login_required
 @user_passes_test(es_admin)
 def eliminar_salida(request, salida_id):
@@ -1002,12 +1024,30 @@ def editar_salida(request, salida_id):
     salida = get_object_or_404(SalidaTour, id=salida_id)
     if request.method == "POST":
         salida.cupo_maximo = int(request.POST.get("cupo_maximo"))
-        salida.cupos_disponibles = int(request.POST.get("cupos_disponibles"))
+        cupos_nuevos = int(request.POST.get("cupos_disponibles"))
+        # Solo se aplica lo que cambio en el formulario: lo vendido mientras tanto se respeta
+        cupos_originales = int(request.POST.get("cupos_disponibles_original") or salida.cupos_disponibles)
         salida.fecha = request.POST.get("fecha")
         hora = request.POST.get("hora")
         salida.hora = hora if hora else None
         salida.duracion = request.POST.get("duracion") or salida.tour.duracion
-        salida.save()
+        mensaje_duplicada = f"Ya existe una salida de este tour el {salida.fecha} a esa hora."
+        if salida.hora and SalidaTour.objects.filter(
+            tour_id=salida.tour_id, fecha=salida.fecha, hora=salida.hora,
+        ).exclude(id=salida.id).exists():
+            messages.error(request, mensaje_duplicada)
+            return redirect("editar_salida", salida_id=salida.id)
+        try:
+            with transaction.atomic():
+                cupos.corregir(salida.id, cupos_nuevos - cupos_originales, motivo=f"Editada por {request.user.username}")
+                salida.save(update_fields=["cupo_maximo", "fecha", "hora", "duracion"])
+        except IntegrityError:
+            # Otra edicion o la programacion la ocupo entre la consulta y el guardado
+            messages.error(request, mensaje_duplicada)
+            return redirect("editar_salida", salida_id=salida.id)
+        except cupos.CuposInsuficientes:
+            messages.error(request, "Se vendieron cupos mientras editabas: ya no quedan los que querias quitar.")
+            return redirect("editar_salida", salida_id=salida.id)
         messages.success(request, f"La salida del {salida.fecha} ha sido actualizada.")
         return redirect("admin_salidas")
     return render(request, "core/panel/editar_salida.html", {"salida": salida})
@@ -1015,57 +1055,56 @@ def editar_salida(request, salida_id):
 @login_required
 @user_passes_test(es_admin_o_secretaria)
 def crear_salida(request):
-    tours = Tour.objects.all()
+    tours = Tour.objects.select_related("destino")
     
     if request.method == "POST":
-        tour_id = request.POST.get("tour")
-        fecha_inicio_str = request.POST.get("fecha")
-        fecha_fin_str = request.POST.get("fecha_fin")
+        tour = get_object_or_404(Tour, id=request.POST.get("tour"))
         hora_post = request.POST.get("hora")
         ambos_turnos = request.POST.get("ambos_turnos") == "on"
-        cupo_maximo = int(request.POST.get("cupo_maximo"))
         duracion = request.POST.get("duracion")
+
+        try:
+            cupo_maximo = int(request.POST.get("cupo_maximo"))
+            fecha_inicio = datetime.strptime(request.POST.get("fecha", ""), "%Y-%m-%d").date()
+            fecha_fin_str = request.POST.get("fecha_fin")
+            fecha_fin = datetime.strptime(fecha_fin_str, "%Y-%m-%d").date() if fecha_fin_str else fecha_inicio
+            dias_semana = [int(d) for d in request.POST.getlist("dias_semana")] or None
+            excluir = [
+                datetime.strptime(f, "%Y-%m-%d").date()
+                for f in (request.POST.get("excluir") or "").replace(",", " ").split()
+            ]
+            hora_manual = datetime.strptime(hora_post, "%H:%M").time() if hora_post else None
+        except (TypeError, ValueError):
+            messages.error(request, "Revisa las fechas, la hora y el cupo de la programacion.")
+            return redirect("crear_salida")
+
+        if fecha_fin < fecha_inicio or (fecha_fin - fecha_inicio).days > MAX_DIAS_PROGRAMACION:
+            messages.error(request, f"El rango debe ir hacia adelante y cubrir como maximo {MAX_DIAS_PROGRAMACION} dias.")
+            return redirect("crear_salida")
+
+        # Turnos a crear
+        if ambos_turnos:
+            horas = programacion.horas_del_tour(tour)
+        else:
+            horas = [hora_manual] if hora_manual else []
+
+        # Regla expandida en memoria: una consulta para las existentes y una insercion en bloque
+        salidas_creadas = programacion.programar(
+            tour, fecha_inicio, fecha_fin, horas,
+            dias_semana=dias_semana,
+            excluir=excluir,
+            cupo_maximo=cupo_maximo,
+            duracion=duracion,
+            creado_por=request.user,
+        )
         
-        tour = get_object_or_404(Tour, id=tour_id)
-        
-        from datetime import datetime
-        fecha_inicio = datetime.strptime(fecha_inicio_str, '%Y-%m-%d').date()
-        
-        fechas = [fecha_inicio]
-        if fecha_fin_str:
-            fecha_fin = datetime.strptime(fecha_fin_str, '%Y-%m-%d').date()
-            dias = (fecha_fin - fecha_inicio).days
-            for d in range(1, dias + 1):
-                fechas.append(fecha_inicio + timedelta(days=d))
-        
-        salidas_creadas = 0
-        for f in fechas:
-            # Turnos a crear
-            horas = []
-            if ambos_turnos:
-                if tour.hora_turno_1: horas.append(tour.hora_turno_1)
-                if tour.hora_turno_2: horas.append(tour.hora_turno_2)
-            elif hora_post:
-                horas.append(hora_post)
-            
-            for h in horas:
-                # Evitar duplicados exactos
-                if not SalidaTour.objects.filter(tour=tour, fecha=f, hora=h).exists():
-                    SalidaTour.objects.create(
-                        tour=tour,
-                        fecha=f,
-                        hora=h,
-                        duracion=duracion or tour.duracion,
-                        cupo_maximo=cupo_maximo,
-                        cupos_disponibles=cupo_maximo,
-                        creado_por=request.user
-                    )
-                    salidas_creadas += 1
-        
-        messages.success(request, f"Â¡Se han programado {salidas_creadas} salidas correctamente!")
+        messages.success(request, f"¡Se han programado {salidas_creadas} salidas correctamente!")
         return redirect("admin_salidas")
 
-    return render(request, "core/panel/crear_salida.html", {"tours": tours})
+    return render(request, "core/panel/crear_salida.html", {
+        "tours": tours,
+        "dias_semana": list(enumerate(programacion.DIAS_SEMANA)),
+    })
 
 @login_required
 @user_passes_test(es_admin)
@@ -1259,14 +1298,7 @@ def contacto(request):
             text_content = strip_tags(html_content)
 
             try:
-                msg = EmailMultiAlternatives(
-                    subject, 
-                    text_content, 
-                    settings.DEFAULT_FROM_EMAIL, 
-                    ['tu-correo@gmail.com']
-                )
-                msg.attach_alternative(html_content, "text/html")
-                msg.send()
+                correos.encolar(subject, ['tu-correo@gmail.com'], texto=text_content, html=html_content)
 
                 messages.success(request, "Â¡Mensaje enviado con Ã©xito!")
                 return redirect('contacto')
@@ -1322,16 +1354,15 @@ def _amount_minor_units(amount):
 
 
 def _send_ticket_email(reserva):
+    """Encola el ticket de la reserva; enviar_correos genera el PDF y lo manda."""
     try:
-        pdf_buffer = generar_ticket_pdf(reserva, _empresa_config())
-        pdf_content = pdf_buffer.getvalue()
-        pdf_buffer.close()
+        empresa = _empresa_config()
         subject = f"Confirmacion de Reserva #{reserva.id:06d} - TortugaTur"
         html_body = render_to_string(
             "core/email_ticket.html",
             {
                 "reserva": reserva,
-                "empresa": _empresa_config(),
+                "empresa": empresa,
                 "site_url": _site_url(request=None),
                 "whatsapp_number": getattr(settings, "WHATSAPP_NUMBER", ""),
                 "agencia_email": getattr(settings, "AGENCIA_EMAIL", ""),
@@ -1345,16 +1376,14 @@ def _send_ticket_email(reserva):
         to_list = [recipient] if recipient else []
         bcc_list = [agencia_email] if agencia_email and agencia_email != recipient else []
 
-        email_cliente = EmailMessage(
-            subject=subject,
-            body=html_body,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=to_list or [agencia_email],
+        correos.encolar(
+            subject,
+            to_list or [agencia_email],
+            html=html_body,
             bcc=bcc_list,
+            reserva=reserva,
+            adjuntar_ticket=True,
         )
-        email_cliente.content_subtype = "html"
-        email_cliente.attach(f"Ticket_TortugaTur_{reserva.id}.pdf", pdf_content, "application/pdf")
-        email_cliente.send(fail_silently=True)
     except Exception:
         logger.exception("No se pudo enviar ticket para la reserva %s", reserva.id)
 
@@ -1377,8 +1406,7 @@ def _extract_customer_email(proveedor, payload):
 
 def _mark_reserva_paid(reserva_id, proveedor, external_id="", payload=None):
     with transaction.atomic():
-        reserva = Reserva.objects.select_for_update().select_related("salida").get(id=reserva_id)
-        salida = SalidaTour.objects.select_for_update().get(id=reserva.salida_id)
+        reserva = Reserva.objects.select_for_update().get(id=reserva_id)
         customer_email = _extract_customer_email(proveedor, payload or {})
         pago = None
         if external_id:
@@ -1412,22 +1440,24 @@ def _mark_reserva_paid(reserva_id, proveedor, external_id="", payload=None):
 
         estado_anterior = reserva.estado
 
-        personas = reserva.adultos + reserva.ninos
-        # IMPORTANTE: No restar cupos si ya se restaron cuando la agencia bloqueÃ³
-        if estado_anterior != "bloqueada_por_agencia":
-            if salida.cupos_disponibles < personas:
-                raise ValueError("No hay cupos suficientes al confirmar el pago.")
+        # Solo se retienen los cupos que falten: los bloqueos de agencia ya los tienen
+        try:
+            cupos.retener_reserva(reserva, motivo=f"Pago {proveedor}")
+        except cupos.CuposInsuficientes:
+            raise ValueError("No hay cupos suficientes al confirmar el pago.")
 
         reserva.estado = "pagada"
+        reserva.retencion_hasta = None
         if customer_email:
             reserva.correo = customer_email
-            reserva.save(update_fields=["estado", "correo"])
+            reserva.save(update_fields=["estado", "retencion_hasta", "correo"])
         else:
-            reserva.save(update_fields=["estado"])
+            reserva.save(update_fields=["estado", "retencion_hasta"])
 
-        if estado_anterior != "bloqueada_por_agencia":
-            salida.cupos_disponibles -= personas
-            salida.save(update_fields=["cupos_disponibles"])
+        resumenes.registrar_cambio_estado(reserva, estado_anterior, "pagada")
+        ActividadDia.registrar_pago(reserva, proveedor)
+        if proveedor == "efectivo":
+            resumenes.registrar_efectivo(reserva, reserva.total_pagar)
 
         if pago:
             pago.estado = "paid"
@@ -1452,40 +1482,25 @@ def _mark_reserva_paid(reserva_id, proveedor, external_id="", payload=None):
     
     # Enviar correo adicional confirmando que el valor bloqueado fue cancelado si era agencia
     if estado_anterior == "bloqueada_por_agencia" and reserva.usuario and reserva.usuario.email:
-        from django.core.mail import send_mail
-        from django.template.loader import render_to_string
         subject = f"ConfirmaciÃ³n de Pago a Agencia - Reserva #{reserva.id:06d}"
         msg_plain = f"Gracias por su pago. La reserva del cÃ³digo {reserva.codigo_agencia} ha sido procesada."
-        send_mail(
-            subject=subject,
-            message=msg_plain,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[reserva.usuario.email],
-            fail_silently=True
-        )
+        correos.encolar(subject, [reserva.usuario.email], texto=msg_plain)
 
     return reserva, True
 
 
 def _paypal_base_url():
-    env = getattr(settings, "PAYPAL_ENV", "sandbox").lower()
-    return "https://api-m.paypal.com" if env == "live" else "https://api-m.sandbox.paypal.com"
+    return paypal.base_url()
 
 
 def _paypal_access_token():
-    client_id = getattr(settings, "PAYPAL_CLIENT_ID", "")
-    client_secret = getattr(settings, "PAYPAL_CLIENT_SECRET", "")
-    if not client_id or not client_secret:
-        raise ValueError("PayPal no esta configurado.")
-
-    response = requests.post(
-        f"{_paypal_base_url()}/v1/oauth2/token",
-        auth=(client_id, client_secret),
-        data={"grant_type": "client_credentials"},
-        timeout=20,
-    )
-    response.raise_for_status()
-    return response.json()["access_token"]
+    return paypal.token_acceso()
+
+
+def _paypal_revisar_token(response):
+    # Token revocado o vencido antes de tiempo: pedir uno nuevo la proxima vez
+    if response.status_code == 401:
+        paypal.invalidar_token()
 
 
 def _paypal_verify_webhook(request, event_body):
@@ -1493,6 +1508,13 @@ def _paypal_verify_webhook(request, event_body):
     if not webhook_id:
         return False
 
+    if getattr(settings, "PAYPAL_WEBHOOK_VERIFICACION", "local") == "local":
+        try:
+            return paypal.verificar_webhook_local(request.body, request.headers, webhook_id)
+        except Exception:
+            # Certificado no disponible o algoritmo desconocido: lo decide la API de PayPal
+            logger.warning("No se pudo verificar localmente el webhook PayPal; se usa la API", exc_info=True)
+
     token = _paypal_access_token()
     verify_payload = {
         "transmission_id": request.headers.get("PAYPAL-TRANSMISSION-ID", ""),
@@ -1503,18 +1525,19 @@ def _paypal_verify_webhook(request, event_body):
         "webhook_id": webhook_id,
         "webhook_event": event_body,
     }
-    response = requests.post(
+    response = proveedores.sesion("paypal").post(
         f"{_paypal_base_url()}/v1/notifications/verify-webhook-signature",
         headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
         json=verify_payload,
         timeout=20,
     )
+    _paypal_revisar_token(response)
     response.raise_for_status()
     return response.json().get("verification_status") == "SUCCESS"
 
 
 def _lemonsqueezy_api_base_url():
-    return "https://api.lemonsqueezy.com/v1"
+    return (getattr(settings, "LEMONSQUEEZY_API_URL", "") or "https://api.lemonsqueezy.com/v1").rstrip("/")
 
 
 def _lemonsqueezy_headers():
@@ -1560,12 +1583,31 @@ def checkout_pago(request, reserva_id):
     return render(request, "core/checkout.html", context)
 
 
+def _asegurar_retencion(reserva):
+    """Antes de ir al proveedor de pago, una reserva pendiente debe tener sus cupos.
+
+    Si su retencion vencio se intenta tomar de nuevo; devuelve False si ya no hay cupos.
+    """
+    if reserva.estado != "pendiente":
+        return True
+    try:
+        with transaction.atomic():
+            reserva = Reserva.objects.select_for_update().get(id=reserva.id)
+            cupos.retener_temporal(reserva)
+    except cupos.CuposInsuficientes:
+        return False
+    return True
+
+
 @require_POST
 def create_lemonsqueezy_checkout(request, reserva_id):
     reserva = get_object_or_404(Reserva, id=reserva_id)
     if reserva.estado not in ["pendiente", "bloqueada_por_agencia"]:
         messages.warning(request, "Esta reserva ya no esta pendiente de pago.")
         return redirect("tours")
+    if not _asegurar_retencion(reserva):
+        messages.error(request, "Se agoto el tiempo de tu reserva y ya no quedan cupos en esta salida.")
+        return redirect("checkout_reserva", reserva_id=reserva.id)
 
     store_id = getattr(settings, "LEMONSQUEEZY_STORE_ID", "")
     variant_id = reserva.salida.tour.lemonsqueezy_variant_id or getattr(settings, "LEMONSQUEEZY_VARIANT_ID", "")
@@ -1602,7 +1644,7 @@ def create_lemonsqueezy_checkout(request, reserva_id):
         }
     }
     try:
-        response = requests.post(
+        response = proveedores.sesion("lemonsqueezy").post(
             f"{_lemonsqueezy_api_base_url()}/checkouts",
             headers=_lemonsqueezy_headers(),
             json=checkout_payload,
@@ -1660,6 +1702,8 @@ def create_paypal_order(request, reserva_id):
     reserva = get_object_or_404(Reserva, id=reserva_id)
     if reserva.estado not in ["pendiente", "bloqueada_por_agencia"]:
         return JsonResponse({"error": "La reserva ya no esta pendiente de pago."}, status=400)
+    if not _asegurar_retencion(reserva):
+        return JsonResponse({"error": "Se agoto el tiempo de tu reserva y ya no quedan cupos en esta salida."}, status=409)
 
     currency = _currency()
     token = _paypal_access_token()
@@ -1680,12 +1724,17 @@ def create_paypal_order(request, reserva_id):
             "user_action": "PAY_NOW",
         },
     }
-    response = requests.post(
+    response = proveedores.sesion("paypal").post(
         f"{_paypal_base_url()}/v2/checkout/orders",
-        headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "PayPal-Request-Id": f"orden-{reserva.id}-{uuid.uuid4().hex}",
+        },
         json=payload,
         timeout=20,
     )
+    _paypal_revisar_token(response)
     body = response.json()
     if response.status_code >= 400:
         return JsonResponse({"error": "No se pudo crear la orden de PayPal.", "details": body}, status=400)
@@ -1718,11 +1767,16 @@ def capture_paypal_order(request, reserva_id):
         return JsonResponse({"error": "orderID es requerido."}, status=400)
 
     token = _paypal_access_token()
-    response = requests.post(
+    response = proveedores.sesion("paypal").post(
         f"{_paypal_base_url()}/v2/checkout/orders/{order_id}/capture",
-        headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "PayPal-Request-Id": f"captura-{order_id}",
+        },
         timeout=20,
     )
+    _paypal_revisar_token(response)
     data = response.json()
     if response.status_code >= 400:
         return JsonResponse({"error": "No se pudo capturar la orden.", "details": data}, status=400)
@@ -1738,6 +1792,131 @@ def capture_paypal_order(request, reserva_id):
     return JsonResponse({"ok": True, "redirect_url": reverse("home")})
 
 
+def procesar_webhook_lemonsqueezy(event):
+    """Aplica un evento de Lemon Squeezy ya verificado; devuelve el resultado."""
+    event_name = event.get("meta", {}).get("event_name", "")
+    if event_name not in ("order_created", "order_refunded"):
+        return "ignorado"
+    data = event.get("data", {})
+    custom = event.get("meta", {}).get("custom_data", {}) or {}
+    reserva_id = custom.get("reserva_id")
+    order_id = str(data.get("id", ""))
+    if not reserva_id:
+        return "ignorado: sin reserva_id"
+
+    if event_name == "order_created":
+        try:
+            _, aplicado = _mark_reserva_paid(
+                int(reserva_id),
+                "lemonsqueezy",
+                external_id=order_id,
+                payload=event,
+            )
+        except ValueError as exc:
+            # Reserva cancelada o sin cupos: reintentar no cambia nada
+            logger.warning("Pago Lemon Squeezy no aplicado a reserva %s: %s", reserva_id, exc)
+            return f"rechazado: {exc}"
+        return "pagada" if aplicado else "ya pagada"
+
+    pagos = Pago.objects.filter(reserva_id=int(reserva_id), proveedor="lemonsqueezy")
+    if order_id:
+        pagos = pagos.filter(external_id=order_id)
+    actualizados = pagos.exclude(estado="failed").update(estado="failed", payload=event)
+    return f"reembolso: {actualizados} pagos"
+
+
+def procesar_webhook_paypal(body):
+    """Aplica un evento de PayPal ya verificado; devuelve el resultado."""
+    if body.get("event_type") != "PAYMENT.CAPTURE.COMPLETED":
+        return "ignorado"
+    resource = body.get("resource", {})
+    order_id = resource.get("supplementary_data", {}).get("related_ids", {}).get("order_id", "")
+    reserva_id = resource.get("custom_id", "")
+
+    if not reserva_id and order_id:
+        token = _paypal_access_token()
+        order_response = proveedores.sesion("paypal").get(
+            f"{_paypal_base_url()}/v2/checkout/orders/{order_id}",
+            headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+            timeout=20,
+        )
+        _paypal_revisar_token(order_response)
+        order_response.raise_for_status()
+        purchase_units = order_response.json().get("purchase_units", [])
+        if purchase_units:
+            reserva_id = purchase_units[0].get("custom_id", "")
+
+    if not reserva_id:
+        logger.warning("Webhook PayPal sin reserva asociada (orden %s)", order_id)
+        return "ignorado: sin custom_id"
+    try:
+        _, aplicado = _mark_reserva_paid(int(reserva_id), "paypal", external_id=order_id or resource.get("id", ""), payload=body)
+    except ValueError as exc:
+        logger.warning("Pago PayPal no aplicado a reserva %s: %s", reserva_id, exc)
+        return f"rechazado: {exc}"
+    return "pagada" if aplicado else "ya pagada"
+
+
+PROCESADORES_WEBHOOK = {
+    "lemonsqueezy": procesar_webhook_lemonsqueezy,
+    "paypal": procesar_webhook_paypal,
+}
+
+
+def procesar_webhook(evento_id):
+    """Tarea de run_worker: procesa un WebhookEvent y guarda resultado y duracion."""
+    evento = WebhookEvent.objects.get(id=evento_id)
+    if evento.estado in ("procesado", "ignorado"):
+        return
+    inicio = perf_counter()
+    evento.intentos += 1
+    try:
+        resultado = PROCESADORES_WEBHOOK[evento.proveedor](evento.payload) or ""
+    except Exception as exc:
+        evento.estado = "error"
+        evento.resultado = str(exc)[:2000]
+        raise
+    else:
+        evento.estado = "ignorado" if resultado.startswith("ignorado") else "procesado"
+        evento.resultado = resultado
+    finally:
+        evento.duracion_ms = round((perf_counter() - inicio) * 1000, 2)
+        evento.procesado_en = timezone.now()
+        evento.save(update_fields=["estado", "resultado", "intentos", "duracion_ms", "procesado_en"])
+
+
+def _registrar_webhook(proveedor, event_id, tipo, payload):
+    """Guarda el evento y lo encola; False si (proveedor, event_id) ya se habia recibido.
+
+    El reenvio de un evento cuyo ultimo intento fallo (estado "error") se vuelve
+    a tomar: sin run_worker el reenvio del proveedor es el unico reintento.
+    """
+    event_id = event_id[:150]
+    try:
+        with transaction.atomic():
+            evento = WebhookEvent.objects.create(proveedor=proveedor, event_id=event_id, tipo=tipo[:80], payload=payload)
+    except IntegrityError:
+        previos = WebhookEvent.objects.filter(proveedor=proveedor, event_id=event_id)
+        if not previos.filter(estado="error").update(estado="recibido", duplicados=F("duplicados") + 1):
+            previos.update(duplicados=F("duplicados") + 1)
+            return False
+        evento = previos.get()
+    # Con TAREAS_EN_SEGUNDO_PLANO el pago se aplica en run_worker; si no, aqui
+    # mismo, y un fallo sube a la vista para que responda 500 y el proveedor reenvie
+    tareas.encolar("core.views.procesar_webhook", evento_id=evento.id)
+    return True
+
+
+def _lemonsqueezy_event_id(request, event):
+    """Lemon Squeezy no manda id de entrega: se usa evento + orden + updated_at."""
+    data = event.get("data", {})
+    event_name = event.get("meta", {}).get("event_name", "")
+    updated_at = (data.get("attributes", {}) or {}).get("updated_at", "")
+    if data.get("id"):
+        return f"{event_name}:{data.get('type', '')}:{data['id']}:{updated_at}"
+    return hashlib.sha256(request.body).hexdigest()
+
+
 @csrf_exempt
 def lemonsqueezy_webhook(request):
     if request.method != "POST":
@@ -1751,29 +1930,12 @@ def lemonsqueezy_webhook(request):
         return HttpResponse(status=400)
 
     event_name = event.get("meta", {}).get("event_name", "")
-    if event_name in ("order_created", "order_refunded"):
-        data = event.get("data", {})
-        attributes = data.get("attributes", {})
-        custom = event.get("meta", {}).get("custom_data", {}) or {}
-        reserva_id = custom.get("reserva_id")
-        order_id = str(data.get("id", ""))
-
-        if reserva_id and event_name == "order_created":
-            try:
-                _mark_reserva_paid(
-                    int(reserva_id),
-                    "lemonsqueezy",
-                    external_id=order_id,
-                    payload=event,
-                )
-            except Exception:
-                logger.exception("Fallo confirmando pago Lemon Squeezy para reserva %s", reserva_id)
-                return HttpResponse(status=500)
-        elif reserva_id and event_name == "order_refunded":
-            Pago.objects.filter(
-                reserva_id=int(reserva_id),
-                proveedor="lemonsqueezy",
-            ).update(estado="failed", payload=event)
+    try:
+        _registrar_webhook("lemonsqueezy", _lemonsqueezy_event_id(request, event), event_name, event)
+    except Exception:
+        # El evento queda en "error" y el reenvio de Lemon Squeezy lo vuelve a procesar
+        logger.exception("Error procesando webhook Lemon Squeezy")
+        return HttpResponse(status=500)
     return HttpResponse(status=200)
 
 
@@ -1786,6 +1948,13 @@ def paypal_webhook(request):
     except json.JSONDecodeError:
         return HttpResponse(status=400)
 
+    event_id = body.get("id") or hashlib.sha256(request.body).hexdigest()
+    previos = WebhookEvent.objects.filter(proveedor="paypal", event_id=event_id).exclude(estado="error")
+    if previos.exists():
+        # Reenvio de un evento ya verificado: no hace falta volver a llamar a PayPal
+        previos.update(duplicados=F("duplicados") + 1)
+        return HttpResponse(status=200)
+
     try:
         if not _paypal_verify_webhook(request, body):
             return HttpResponse(status=400)
@@ -1793,33 +1962,12 @@ def paypal_webhook(request):
         logger.exception("Error verificando webhook PayPal")
         return HttpResponse(status=400)
 
-    if body.get("event_type") == "PAYMENT.CAPTURE.COMPLETED":
-        resource = body.get("resource", {})
-        order_id = resource.get("supplementary_data", {}).get("related_ids", {}).get("order_id", "")
-        reserva_id = resource.get("custom_id", "")
-
-        if not reserva_id and order_id:
-            try:
-                token = _paypal_access_token()
-                order_response = requests.get(
-                    f"{_paypal_base_url()}/v2/checkout/orders/{order_id}",
-                    headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
-                    timeout=20,
-                )
-                order_response.raise_for_status()
-                order_data = order_response.json()
-                purchase_units = order_data.get("purchase_units", [])
-                if purchase_units:
-                    reserva_id = purchase_units[0].get("custom_id", "")
-            except Exception:
-                logger.exception("No se pudo resolver custom_id desde orden %s", order_id)
-
-        if reserva_id:
-            try:
-                _mark_reserva_paid(int(reserva_id), "paypal", external_id=order_id or resource.get("id", ""), payload=body)
-            except Exception:
-                logger.exception("Fallo confirmando webhook PayPal para reserva %s", reserva_id)
-                return HttpResponse(status=500)
+    try:
+        _registrar_webhook("paypal", event_id, body.get("event_type", ""), body)
+    except Exception:
+        # El evento queda en "error" y el reenvio de PayPal lo vuelve a procesar
+        logger.exception("Error procesando webhook PayPal")
+        return HttpResponse(status=500)
     return HttpResponse(status=200)
 
 def galeria_view(request):
@@ -1875,7 +2023,7 @@ def perfil_admin(request):
     from django.contrib.auth import update_session_auth_hash
     
     # Verificar si el usuario es secretaria
-    is_secretaria = request.user.groups.filter(name__iexact=GROUP_SECRETARIA).exists()
+    is_secretaria = es_secretaria(request.user)
     
     # Si es secretaria y estÃ¡ inactivo, mostrar mensaje
     if is_secretaria and not request.user.is_active:
@@ -1892,15 +2040,20 @@ def perfil_admin(request):
             reserva_id = request.POST.get("reserva_id")
             reserva = get_object_or_404(Reserva, id=reserva_id, creado_por=request.user)
 
+            # Volver a la misma pagina de tickets
+            pagina = request.get_full_path()
             if reserva.estado != "pendiente":
                 messages.error(request, "Solo puedes modificar reservas pendientes.")
-                return redirect("perfil_admin")
+                return redirect(pagina)
 
             if accion == "cancelar_reserva_pendiente":
                 reserva_ref = reserva.id
-                reserva.delete()
+                with transaction.atomic():
+                    cupos.liberar_reserva(reserva, motivo=f"Reserva #{reserva_ref} eliminada")
+                    resumenes.registrar_eliminacion(reserva)
+                    reserva.delete()
                 messages.success(request, f"Reserva #{reserva_ref:06d} eliminada correctamente.")
-                return redirect("perfil_admin")
+                return redirect(pagina)
 
             # Editar datos del cliente en reserva pendiente
             nombre = (request.POST.get("nombre") or "").strip()
@@ -1911,7 +2064,7 @@ def perfil_admin(request):
 
             if not all([nombre, apellidos, correo, telefono, identificacion]):
                 messages.error(request, "Completa todos los campos para editar la reserva.")
-                return redirect("perfil_admin")
+                return redirect(pagina)
 
             reserva.nombre = nombre
             reserva.apellidos = apellidos
@@ -1920,7 +2073,7 @@ def perfil_admin(request):
             reserva.identificacion = identificacion
             reserva.save(update_fields=["nombre", "apellidos", "correo", "telefono", "identificacion"])
             messages.success(request, f"Reserva #{reserva.id:06d} actualizada correctamente.")
-            return redirect("perfil_admin")
+            return redirect(pagina)
 
         # Info Basica
         request.user.first_name = request.POST.get('first_name', request.user.first_name)
@@ -1959,26 +2112,30 @@ def perfil_admin(request):
 
     # Si es secretaria, obtener sus reservas
     reservas_creadas = []
-    total_ventas = Decimal('0.00')
-    total_personas = 0
+    cursor_antes = cursor_despues = None
+    kpis = {}
     
     if is_secretaria:
-        reservas_creadas = (
+        # Tickets por paginas (mismo keyset que admin_reservas); los totales salen de una consulta agregada
+        reservas_creadas, cursor_antes, cursor_despues = _pagina_por_id(
             Reserva.objects
             .filter(creado_por=request.user)
             .exclude(estado="cancelada")
-            .select_related('salida__tour')
-            .order_by('-fecha_reserva')
+            .select_related('salida__tour'),
+            _parse_int(request.GET.get('antes'), None),
+            _parse_int(request.GET.get('despues'), None),
         )
-        total_ventas = sum(r.total_pagar for r in reservas_creadas)
-        total_personas = sum(r.total_personas() for r in reservas_creadas)
+        kpis = resumenes.kpis_secretaria(request.user)
     
     return render(request, 'core/perfil_admin.html', {
         'perfil': perfil,
         'is_secretaria': is_secretaria,
         'reservas_creadas': reservas_creadas,
-        'total_ventas': total_ventas,
-        'total_personas': total_personas,
+        'cursor_antes': cursor_antes,
+        'cursor_despues': cursor_despues,
+        'total_reservas': kpis.get('total_reservas', 0),
+        'total_ventas': kpis.get('total_importe', Decimal('0.00')),
+        'total_personas': kpis.get('total_pasajeros', 0),
     })
 
 #secretaria
@@ -2091,6 +2248,7 @@ def secretaria_reservar(request):
             estado="pendiente",
             creado_por=request.user,
         )
+        resumenes.registrar_cambio_estado(reserva, None, reserva.estado)
 
         messages.success(
             request,
@@ -2193,6 +2351,7 @@ def toggle_secretaria_estado(request, user_id):
 
     secretaria.is_active = not secretaria.is_active
     secretaria.save(update_fields=["is_active"])
+    roles.invalidar(secretaria)
     estado = "activada" if secretaria.is_active else "desactivada"
     messages.success(request, f"Cuenta de '{secretaria.username}' {estado} correctamente.")
     return redirect("admin_secretarias")